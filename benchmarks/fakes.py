@@ -0,0 +1,382 @@
+"""
+Local stand-ins for the services the bot talks to, for load tests:
+
+    FakeBinance    /fapi/v1/* and /futures/data/* with synthetic data, latency, 5xx errors,
+                   a used-weight budget (X-MBX-USED-WEIGHT-1M, 429 + Retry-After) and invalid symbols
+    FakeTelegram   Bot API methods the bot uses; records every call and answers flood-wait 429s
+    FakeLLM        OpenRouter/OpenAI-compatible /chat/completions and /models
+
+All three are plain asyncio HTTP/1.1 servers on 127.0.0.1 (port 0 = any free port).
+"""
+import asyncio
+import json
+import random
+import re
+import time
+import zlib
+from collections import Counter, defaultdict, deque
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from benchmarks.synthetic import INTERVAL_MS, FUNDING_MS, make_ohlcv_arrays
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 418: "I'm a teapot", 429: "Too Many Requests",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class _Response:
+    __slots__ = ("status", "body", "headers")
+
+    def __init__(self, status: int, body, headers: Optional[dict] = None):
+        self.status = status
+        self.body = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.headers = headers or {}
+
+
+class FakeServer:
+    """Minimal keep-alive HTTP/1.1 server; subclasses implement handle(method, path, query, headers, body)."""
+
+    def __init__(self, latency_ms: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = Counter()
+        self.statuses = Counter()
+        self._server = None
+        self._conns = set()
+        self.port = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self, port: int = 0):
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # keep-alive 连接还挂在 readline 上, 主动关闭让处理协程退出
+            for writer in list(self._conns):
+                writer.close()
+            await asyncio.sleep(0)
+            await self._server.wait_closed()
+
+    async def _delay(self):
+        if self.latency_ms:
+            # 指数分布的长尾延迟, 均值为 latency_ms
+            await asyncio.sleep(self.rng.expovariate(1000.0 / self.latency_ms))
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._conns.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+
+                parts = urlsplit(target)
+                query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+                await self._delay()
+                try:
+                    resp = await self.handle(method, parts.path, query, headers, body)
+                except Exception as e:
+                    resp = _Response(500, {"error": str(e)})
+                self.requests[self.route(parts.path)] += 1
+                self.statuses[resp.status] += 1
+
+                head = [f"HTTP/1.1 {resp.status} {_REASONS.get(resp.status, 'Unknown')}",
+                        "Content-Type: application/json", f"Content-Length: {len(resp.body)}"]
+                head += [f"{k}: {v}" for k, v in resp.headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + resp.body)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # 事件循环关闭时取消挂起的连接, 不算错误
+            pass
+        finally:
+            self._conns.discard(writer)
+            writer.close()
+
+    def route(self, path: str) -> str:
+        return path
+
+    async def handle(self, method, path, query, headers, body) -> _Response:
+        raise NotImplementedError
+
+
+# ================== Binance ==================
+
+# 近似 Binance 的请求权重
+_WEIGHTS = {"/fapi/v1/ticker/24hr": 40, "/fapi/v1/premiumIndex": 10, "/fapi/v1/exchangeInfo": 1}
+
+
+class FakeBinance(FakeServer):
+    def __init__(self, symbols, latency_ms: float = 30.0, error_rate: float = 0.0, weight_limit: int = 2400,
+                 invalid_symbols=(), bars: int = 1500, seed: int = 0):
+        super().__init__(latency_ms, error_rate, seed)
+        self.symbols = list(dict.fromkeys(["BTCUSDT", *symbols]))
+        self._known = set(self.symbols)
+        self.invalid = set(invalid_symbols)
+        self.weight_limit = weight_limit
+        self.bars = bars
+        self.rate_limited = 0
+        self._weights = deque()  # (t, weight) 最近 60s
+        self._used = 0
+        self._series: Dict[tuple, Dict[str, np.ndarray]] = {}
+
+    def _series_for(self, symbol: str, interval: str) -> Dict[str, np.ndarray]:
+        """Synthetic market ending at the current bar (generated once per symbol/interval)."""
+        key = (symbol, interval)
+        cols = self._series.get(key)
+        if cols is None:
+            step = INTERVAL_MS[interval]
+            start_ms = (int(time.time() * 1000) // step - (self.bars - 1)) * step
+            seed = zlib.crc32(f"{symbol}:{interval}".encode())
+            price = 0.5 + (seed % 100_000) / 10.0
+            cols = self._series[key] = make_ohlcv_arrays(self.bars, interval, seed, start_price=price, start_ms=start_ms)
+        return cols
+
+    def _charge(self, weight: int) -> Optional[_Response]:
+        now = time.monotonic()
+        while self._weights and now - self._weights[0][0] > 60:
+            self._used -= self._weights.popleft()[1]
+        if self.weight_limit and self._used + weight > self.weight_limit:
+            self.rate_limited += 1
+            retry = max(1, int(60 - (now - self._weights[0][0]))) if self._weights else 1
+            return _Response(429, {"code": -1003, "msg": "Too many requests; current limit is exceeded."},
+                             {"Retry-After": retry, "X-MBX-USED-WEIGHT-1M": self._used})
+        self._weights.append((now, weight))
+        self._used += weight
+        return None
+
+    async def handle(self, method, path, query, headers, body) -> _Response:
+        limit = int(query.get("limit", 100))
+        weight = _WEIGHTS.get(path, 1 if limit <= 100 else 2 if limit <= 500 else 5)
+        if path == "/fapi/v1/premiumIndex" and "symbol" in query:
+            weight = 1
+        if path == "/fapi/v1/ticker/24hr" and "symbol" in query:
+            weight = 1
+        limited = self._charge(weight)
+        if limited is not None:
+            return limited
+        used = {"X-MBX-USED-WEIGHT-1M": self._used}
+
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return _Response(503, {"code": -1001, "msg": "Internal error; unable to process your request."}, used)
+        symbol = query.get("symbol")
+        if symbol is not None and (symbol in self.invalid or symbol not in self._known):
+            return _Response(400, {"code": -1121, "msg": "Invalid symbol."}, used)
+
+        if path == "/fapi/v1/exchangeInfo":
+            return _Response(200, {"symbols": [
+                {"symbol": s, "contractType": "PERPETUAL", "status": "TRADING"} for s in self._listed()
+            ]}, used)
+        if path == "/fapi/v1/premiumIndex":
+            rows = [self._premium(s) for s in ([symbol] if symbol else self._listed())]
+            return _Response(200, rows[0] if symbol else rows, used)
+        if path == "/fapi/v1/ticker/24hr":
+            rows = [self._ticker(s) for s in ([symbol] if symbol else self._listed())]
+            return _Response(200, rows[0] if symbol else rows, used)
+        if path == "/fapi/v1/openInterest":
+            cols = self._series_for(symbol, "1h")
+            return _Response(200, {"symbol": symbol, "openInterest": f"{cols['oi'][-1]:.3f}",
+                                   "time": int(time.time() * 1000)}, used)
+        if path == "/fapi/v1/klines":
+            return _Response(200, self._klines(symbol, query["interval"], limit), used)
+        if path == "/futures/data/openInterestHist":
+            cols = self._series_for(symbol, query["period"])
+            return _Response(200, [
+                {"symbol": symbol, "sumOpenInterest": f"{oi:.3f}", "sumOpenInterestValue": f"{oi * c:.2f}", "timestamp": t}
+                for t, oi, c in zip(cols["open_time"][-limit:].tolist(), cols["oi"][-limit:].tolist(),
+                                    cols["close"][-limit:].tolist())
+            ], used)
+        if path == "/futures/data/topLongShortAccountRatio":
+            cols = self._series_for(symbol, query["period"])
+            return _Response(200, [
+                {"symbol": symbol, "longShortRatio": f"{lr / (1 - lr):.4f}", "longAccount": f"{lr:.4f}",
+                 "shortAccount": f"{1 - lr:.4f}", "timestamp": t}
+                for t, lr in zip(cols["open_time"][-limit:].tolist(), cols["long_ratio"][-limit:].tolist())
+            ], used)
+        if path == "/fapi/v1/fundingRate":
+            cols = self._series_for(symbol, "1h")
+            slots, first = np.unique(cols["open_time"] // FUNDING_MS, return_index=True)
+            return _Response(200, [
+                {"symbol": symbol, "fundingTime": int(slot * FUNDING_MS), "fundingRate": f"{cols['funding'][i]:.8f}"}
+                for slot, i in zip(slots[-limit:].tolist(), first[-limit:].tolist())
+            ], used)
+        return _Response(404, {"code": -1, "msg": f"unknown path {path}"}, used)
+
+    def _listed(self):
+        return [s for s in self.symbols if s not in self.invalid]
+
+    def _klines(self, symbol, interval, limit):
+        cols = self._series_for(symbol, interval)
+        step = INTERVAL_MS[interval]
+        rows = []
+        for t, o, h, l, c, v in zip(cols["open_time"][-limit:].tolist(), cols["open"][-limit:].tolist(),
+                                    cols["high"][-limit:].tolist(), cols["low"][-limit:].tolist(),
+                                    cols["close"][-limit:].tolist(), cols["volume"][-limit:].tolist()):
+            rows.append([t, f"{o:.4f}", f"{h:.4f}", f"{l:.4f}", f"{c:.4f}", f"{v:.3f}", t + step - 1,
+                         f"{v * c:.2f}", 1000, f"{v / 2:.3f}", f"{v * c / 2:.2f}", "0"])
+        return rows
+
+    def _premium(self, symbol):
+        cols = self._series_for(symbol, "1h")
+        return {"symbol": symbol, "markPrice": f"{cols['close'][-1]:.4f}", "indexPrice": f"{cols['close'][-1]:.4f}",
+                "lastFundingRate": f"{cols['funding'][-1]:.8f}", "nextFundingTime": (int(time.time() * 1000) // FUNDING_MS + 1) * FUNDING_MS}
+
+    def _ticker(self, symbol):
+        cols = self._series_for(symbol, "1h")
+        close, day = cols["close"][-1], cols["close"][-24]
+        return {"symbol": symbol, "lastPrice": f"{close:.4f}", "priceChangePercent": f"{(close / day - 1) * 100:.3f}",
+                "highPrice": f"{cols['high'][-24:].max():.4f}", "lowPrice": f"{cols['low'][-24:].min():.4f}",
+                "volume": f"{cols['volume'][-24:].sum():.3f}",
+                "quoteVolume": f"{(cols['volume'][-24:] * cols['close'][-24:]).sum():.2f}", "count": 24000}
+
+
+# ================== Telegram Bot API ==================
+
+_MULTIPART_FIELD = re.compile(rb'name="([^"]+)"(?:; filename="[^"]*")?\r\n(?:[^\r\n]*\r\n)*?\r\n(.*?)\r\n--', re.DOTALL)
+
+
+class FakeTelegram(FakeServer):
+    """
+    Records every Bot API call as (method, chat_id, monotonic time).
+    chat_rate > 0 enforces a per-chat token bucket (chat_rate msgs/s, bursts of chat_burst), answering
+    429 retry_after like Telegram does; flood_rate additionally rejects that fraction of sends at random.
+    """
+
+    SEND_METHODS = {"sendMessage", "sendPhoto", "sendDocument", "editMessageText", "editMessageCaption"}
+
+    def __init__(self, latency_ms: float = 20.0, chat_rate: float = 1.0, flood_rate: float = 0.0,
+                 retry_after: int = 1, chat_burst: int = 3, seed: int = 0):
+        super().__init__(latency_ms, 0.0, seed)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.calls = []
+        self.flood_waits = 0
+        self._buckets: Dict[str, list] = {}  # chat_id -> [tokens, last refill]
+        self._message_id = 0
+
+    def route(self, path: str) -> str:
+        return path.rsplit("/", 1)[-1]
+
+    @staticmethod
+    def _params(headers, body) -> dict:
+        ctype = headers.get("content-type", "")
+        if ctype.startswith("multipart/form-data"):
+            return {k.decode(): v[:200].decode("utf-8", "replace") for k, v in _MULTIPART_FIELD.findall(body)}
+        if ctype.startswith("application/json"):
+            return json.loads(body or b"{}")
+        return {k: v[-1] for k, v in parse_qs(body.decode("utf-8")).items()}
+
+    def _flood_wait(self) -> _Response:
+        self.flood_waits += 1
+        return _Response(429, {"ok": False, "error_code": 429,
+                               "description": f"Too Many Requests: retry after {self.retry_after}",
+                               "parameters": {"retry_after": self.retry_after}})
+
+    async def handle(self, method, path, query, headers, body) -> _Response:
+        api_method = self.route(path)
+        params = self._params(headers, body)
+        chat_id = str(params.get("chat_id", ""))
+        now = time.monotonic()
+
+        if api_method in self.SEND_METHODS and chat_id:
+            if self.chat_rate:
+                bucket = self._buckets.setdefault(chat_id, [float(self.chat_burst), now])
+                bucket[0] = min(self.chat_burst, bucket[0] + (now - bucket[1]) * self.chat_rate)
+                bucket[1] = now
+                if bucket[0] < 1:
+                    return self._flood_wait()
+                bucket[0] -= 1
+            if self.flood_rate and self.rng.random() < self.flood_rate:
+                return self._flood_wait()
+        self.calls.append((api_method, chat_id, now))
+
+        if api_method == "getMe":
+            return _Response(200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "LoadTest",
+                                                          "username": "loadtest_bot"}})
+        if api_method in ("sendMessage", "sendPhoto", "sendDocument", "editMessageText", "editMessageCaption"):
+            self._message_id += 1
+            message = {"message_id": int(params.get("message_id") or self._message_id), "date": int(time.time()),
+                       "chat": {"id": int(chat_id or 0), "type": "private"}}
+            if api_method == "sendPhoto":
+                message["photo"] = [{"file_id": "p", "file_unique_id": "p", "width": 1, "height": 1}]
+                message["caption"] = params.get("caption", "")
+            elif api_method == "sendDocument":
+                message["document"] = {"file_id": "d", "file_unique_id": "d"}
+            else:
+                message["text"] = params.get("text", "")
+            return _Response(200, {"ok": True, "result": message})
+        # deleteMessage / answerCallbackQuery / sendChatAction / setMyCommands ...
+        return _Response(200, {"ok": True, "result": True})
+
+    def sent(self) -> Counter:
+        return Counter(m for m, _, _ in self.calls if m in self.SEND_METHODS)
+
+    def per_chat(self) -> Dict[str, int]:
+        counts = defaultdict(int)
+        for method, chat_id, _ in self.calls:
+            if method in self.SEND_METHODS:
+                counts[chat_id] += 1
+        return dict(counts)
+
+
+# ================== OpenRouter (OpenAI 兼容) ==================
+
+class FakeLLM(FakeServer):
+    """Answers /chat/completions with a fixed trade plan in a ```json block after `latency_ms` (mean)."""
+
+    def __init__(self, latency_ms: float = 800.0, error_rate: float = 0.0, seed: int = 0):
+        super().__init__(latency_ms, error_rate, seed)
+        self.prompt_chars = 0
+
+    def route(self, path: str) -> str:
+        return path.rsplit("/", 1)[-1]
+
+    async def handle(self, method, path, query, headers, body) -> _Response:
+        if path.endswith("/models"):
+            return _Response(200, {"data": [
+                {"id": f"fake/model-{i}", "name": f"Fake Model {i}", "context_length": 128000,
+                 "pricing": {"prompt": "0.000001", "completion": "0.000002"}} for i in range(20)
+            ]})
+        if not path.endswith("/chat/completions"):
+            return _Response(404, {"error": {"message": f"unknown path {path}"}})
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return _Response(503, {"error": {"message": "upstream overloaded", "code": 503}})
+
+        request = json.loads(body or b"{}")
+        prompt = sum(len(m.get("content") or "") if isinstance(m.get("content"), str) else 0
+                     for m in request.get("messages", []))
+        self.prompt_chars += prompt
+        plan = {"analysis_process": "load test", "decision": self.rng.choice(["LONG", "SHORT", "HOLD"]),
+                "confidence": 55, "reasoning": "synthetic", "next_watch_levels": {"resistance": [1.1], "support": [0.9]},
+                "position_size_usd": 100, "leverage": 3, "stop_loss": 0.95, "take_profit": 1.1}
+        content = "Synthetic reasoning.\n```json\n" + json.dumps(plan) + "\n```"
+        return _Response(200, {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (prompt + len(content)) // 4},
+        })
@@ -0,0 +1,325 @@
+"""
+End-to-end load test: the real bot (handlers, monitor, send queue, storage) against local fakes
+of Binance, the Telegram Bot API and OpenRouter (benchmarks/fakes.py).
+
+    python -m benchmarks.loadtest --pairs 500 --users 50 --cycles 3
+    python -m benchmarks.loadtest --pairs 200 --binance-latency-ms 80 --binance-error-rate 0.02 \\
+        --tg-flood-rate 0.05 --commands 300 --json loadtest.json
+
+Watchlists, the SQLite DB and the model catalog live in a temp dir; nothing touches data/.
+Reports monitor cycle latency percentiles and pair throughput, per-command latency and error counts,
+and request / error / rate-limit counts seen by each fake.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.fakes import FakeBinance, FakeTelegram, FakeLLM
+
+# 命令权重 (相对频率) 与参数模板; {sym} / {iv} 取自被监控的币对
+COMMAND_MIX = {
+    "/start": (3, "/start"),
+    "/list": (4, "/list"),
+    "/help": (1, "/help"),
+    "/add": (2, "/add {base} {iv}"),
+    "/ai": (1, "/ai {base} {iv}"),
+    "/scan": (0.2, "/scan {iv}"),
+}
+
+
+def _pct(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def _summary(samples) -> dict:
+    return {
+        "count": len(samples),
+        "p50": _pct(samples, 50),
+        "p95": _pct(samples, 95),
+        "p99": _pct(samples, 99),
+        "max": max(samples) if samples else None,
+        "mean": statistics.fmean(samples) if samples else None,
+    }
+
+
+def make_pairs(n_pairs, intervals, n_users, max_watchers, rng):
+    """[(symbol, interval)] plus {uid: [(symbol, interval)]}; a user watches one interval per symbol."""
+    n_symbols = -(-n_pairs // len(intervals))
+    symbols = [f"LT{i:04d}USDT" for i in range(n_symbols)]
+    pairs = [(s, iv) for s in symbols for iv in intervals][:n_pairs]
+    users = [100_000 + i for i in range(n_users)]
+    watch = defaultdict(list)
+    taken = defaultdict(set)  # symbol -> users already watching it
+    for sym, iv in pairs:
+        free = [u for u in users if u not in taken[sym]] or users
+        for uid in rng.sample(free, min(len(free), rng.randint(1, max_watchers))):
+            watch[uid].append((sym, iv))
+            taken[sym].add(uid)
+    return pairs, users, watch
+
+
+def _update(update_id, uid, text):
+    command = text.split()[0]
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": uid, "type": "private"},
+            "from": {"id": uid, "is_bot": False, "first_name": f"user{uid}"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+        },
+    }
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    intervals = args.intervals.split(",")
+    pairs, users, watch = make_pairs(args.pairs, intervals, args.users, args.max_watchers, rng)
+    symbols = sorted({s for s, _ in pairs})
+    invalid = set(rng.sample(symbols, int(len(symbols) * args.invalid_rate)))
+
+    binance = await FakeBinance(symbols, args.binance_latency_ms, args.binance_error_rate, args.weight_limit,
+                                invalid, seed=args.seed).start()
+    telegram = await FakeTelegram(args.tg_latency_ms, args.tg_chat_rate, args.tg_flood_rate,
+                                  chat_burst=args.tg_chat_burst, seed=args.seed).start()
+    llm = await FakeLLM(args.llm_latency_ms, args.llm_error_rate, seed=args.seed).start()
+
+    tmp = tempfile.mkdtemp(prefix="loadtest-")
+    # config.settings 在导入时读取环境变量, 所以先启动 fake 再导入 bot 模块
+    os.environ.update({
+        "BINANCE_BASE_URL": binance.url,
+        "OPENROUTER_BASE_URL": f"{llm.url}/api/v1",
+        "OPENROUTER_API_KEY": "loadtest",
+        "BOT_TOKEN": "123456:LOADTEST",
+        "ALLOWED_USER_IDS": ",".join(map(str, users)),
+        "ADMIN_USER_IDS": str(users[0]),
+        "DB_FILE": os.path.join(tmp, "bot.db"),
+        "MODEL_CATALOG_FILE": os.path.join(tmp, "models.json"),
+        "MONITOR_SOCKET": os.path.join(tmp, "monitor.sock"),
+        "MONITOR_SHARDS": str(args.shards),
+        "METRICS_PORT": "0",
+        "PREWARM_IMPORTS": "0",
+    })
+    if args.compute:
+        os.environ["COMPUTE_BACKEND"] = args.compute
+
+    from telegram import Update
+    from telegram.ext import ApplicationBuilder, CallbackContext
+    import main as bot
+    from services.storage import load_data, add_to_watchlist
+    from services.telegram_sender import telegram_sender
+    from services.breakers import breakers
+    from services.metrics import FETCH_FAILURES, FETCH_SHORT_CIRCUITS
+    from tasks.monitor import monitor_task
+
+    load_data()
+    for uid, watched in watch.items():
+        for sym, iv in watched:
+            add_to_watchlist(uid, sym, iv)
+
+    from services.update_processor import update_processor
+    app = (ApplicationBuilder().token(os.environ["BOT_TOKEN"]).concurrent_updates(update_processor)
+           .base_url(f"{telegram.url}/bot").base_file_url(f"{telegram.url}/file/bot").build())
+    bot.register_handlers(app)
+    handler_errors, command_of = [], {}
+    command_errors = defaultdict(int)
+
+    async def on_error(update, context):
+        handler_errors.append(repr(context.error))
+        name = command_of.get(getattr(update, "update_id", None))
+        if name is not None:
+            command_errors[name] += 1
+
+    app.add_error_handler(on_error)
+    await app.initialize()
+    await bot.post_init(app)
+
+    cycle_times, command_times = [], defaultdict(list)
+    started = time.perf_counter()
+
+    async def drive_monitor():
+        context = CallbackContext(app)
+        for i in range(args.cycles):
+            t0 = time.perf_counter()
+            await monitor_task(context)
+            cycle_times.append(time.perf_counter() - t0)
+            logging.info(f"Cycle {i + 1}/{args.cycles}: {cycle_times[-1]:.2f}s")
+            if args.cycle_interval:
+                await asyncio.sleep(args.cycle_interval)
+
+    async def drive_commands():
+        names = list(COMMAND_MIX)
+        weights = [COMMAND_MIX[n][0] for n in names]
+        sem = asyncio.Semaphore(args.command_concurrency)
+
+        async def one(update_id):
+            uid = rng.choice(users)
+            name = rng.choices(names, weights)[0]
+            sym, iv = rng.choice(watch.get(uid) or pairs)
+            text = COMMAND_MIX[name][1].format(base=sym[:-4], iv=iv)
+            command_of[update_id] = name
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    update = Update.de_json(_update(update_id, uid, text), app.bot)
+                    # 与轮询相同的路径: 经过更新处理器 (通道 + 同聊天排序)
+                    await app.update_processor.process_update(update, app.process_update(update))
+                except Exception as e:
+                    handler_errors.append(repr(e))
+                    command_errors[name] += 1
+                command_times[name].append(time.perf_counter() - t0)
+
+        # 泊松到达, 与监控周期并行
+        tasks = []
+        for i in range(args.commands):
+            tasks.append(asyncio.ensure_future(one(i + 1)))
+            await asyncio.sleep(rng.expovariate(args.command_rate))
+        await asyncio.gather(*tasks)
+
+    await asyncio.gather(drive_monitor(), drive_commands())
+
+    # 等待发送队列清空
+    deadline = time.monotonic() + args.drain_timeout
+    while telegram_sender.stats()["depth"] and time.monotonic() < deadline:
+        await asyncio.sleep(0.2)
+    elapsed = time.perf_counter() - started
+    open_breakers = breakers.open_count()
+
+    await bot.post_shutdown(app)
+    await app.shutdown()
+    for fake in (binance, telegram, llm):
+        await fake.stop()
+
+    binance_total = sum(binance.statuses.values())
+    per_chat = telegram.per_chat()
+    return {
+        "config": vars(args),
+        "elapsed_seconds": elapsed,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "monitor": {
+            **_summary(cycle_times),
+            "pairs": len(pairs),
+            "pairs_per_second": len(pairs) / statistics.fmean(cycle_times) if cycle_times else None,
+        },
+        "commands": {
+            name: {**_summary(times), "errors": command_errors.get(name, 0)}
+            for name, times in sorted(command_times.items())
+        },
+        "handler_errors": handler_errors[:20],
+        "binance": {
+            "requests": binance_total,
+            "by_endpoint": dict(binance.requests.most_common()),
+            "statuses": {str(k): v for k, v in sorted(binance.statuses.items())},
+            "rate_limited": binance.rate_limited,
+            "error_rate": 1 - binance.statuses.get(200, 0) / binance_total if binance_total else 0.0,
+            "fetch_failures": FETCH_FAILURES.total(),
+            "short_circuited": FETCH_SHORT_CIRCUITS.total(),
+            "open_breakers": open_breakers,
+            "invalid_symbols": len(invalid),
+        },
+        "telegram": {
+            "sent": dict(telegram.sent()),
+            "flood_waits": telegram.flood_waits,
+            "chats": len(per_chat),
+            "max_per_chat": max(per_chat.values()) if per_chat else 0,
+            "undelivered": telegram_sender.stats()["depth"],
+        },
+        "llm": {
+            "requests": dict(llm.requests),
+            "statuses": {str(k): v for k, v in sorted(llm.statuses.items())},
+            "prompt_chars": llm.prompt_chars,
+        },
+    }
+
+
+def _ms(value):
+    return "-" if value is None else f"{value * 1000:8.1f}"
+
+
+def print_report(report: dict):
+    m = report["monitor"]
+    print(f"\nMonitor: {m['count']} cycles x {m['pairs']} pairs | "
+          f"p50 {m['p50'] or 0:.2f}s  p95 {m['p95'] or 0:.2f}s  max {m['max'] or 0:.2f}s | "
+          f"{m['pairs_per_second'] or 0:.1f} pairs/s")
+    print(f"\n{'command':<8} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for name, c in report["commands"].items():
+        print(f"{name:<8} {c['count']:>5} {_ms(c['p50']):>9} {_ms(c['p95']):>9} {_ms(c['p99']):>9} "
+              f"{_ms(c['max']):>9} {c['errors']:>7}")
+    b, t, l = report["binance"], report["telegram"], report["llm"]
+    print(f"\nBinance: {b['requests']} requests, error rate {b['error_rate']:.1%}, {b['rate_limited']} rate-limited, "
+          f"{b['fetch_failures']:.0f} fetch failures, {b['short_circuited']:.0f} short-circuited, "
+          f"{b['open_breakers']} open breakers")
+    print(f"Telegram: sent {t['sent']}, {t['flood_waits']} flood waits, {t['chats']} chats "
+          f"(max {t['max_per_chat']}/chat), {t['undelivered']} undelivered")
+    print(f"LLM: {l['requests']} statuses {l['statuses']}")
+    print(f"\nWall {report['elapsed_seconds']:.1f}s, max RSS {report['max_rss_mb']:.0f} MB")
+    if report["handler_errors"]:
+        print(f"Handler errors (first {len(report['handler_errors'])}): {report['handler_errors'][:3]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end load test against local Binance/Telegram/LLM fakes")
+    parser.add_argument("--pairs", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--max-watchers", type=int, default=3, help="users per pair (1..N)")
+    parser.add_argument("--intervals", default="15m,1h,4h")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--cycle-interval", type=float, default=0.0, help="pause between monitor cycles (s)")
+    parser.add_argument("--commands", type=int, default=200, help="command updates sent during the run")
+    parser.add_argument("--command-rate", type=float, default=5.0, help="mean command arrivals per second")
+    parser.add_argument("--command-concurrency", type=int, default=20)
+    parser.add_argument("--shards", type=int, default=0, help="MONITOR_SHARDS for the run")
+    parser.add_argument("--compute", choices=("process", "thread"), help="COMPUTE_BACKEND for the run")
+    parser.add_argument("--binance-latency-ms", type=float, default=30.0)
+    parser.add_argument("--binance-error-rate", type=float, default=0.0)
+    parser.add_argument("--weight-limit", type=int, default=2400, help="Binance used-weight per minute (0 = off)")
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="fraction of symbols answering -1121")
+    parser.add_argument("--tg-latency-ms", type=float, default=20.0)
+    parser.add_argument("--tg-chat-rate", type=float, default=1.0, help="per-chat msgs/s before 429 (0 = off)")
+    parser.add_argument("--tg-chat-burst", type=int, default=3)
+    parser.add_argument("--tg-flood-rate", type=float, default=0.0, help="random fraction of sends answered 429")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="max wait for the send queue to empty")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="write the report to this path")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s",
+                        level=logging.INFO if args.verbose else logging.WARNING)
+    if not args.verbose:
+        # 每个币对的 "Fetching merged data" 等日志会淹没报告
+        logging.getLogger().setLevel(logging.ERROR)
+
+    if args.verbose:
+        report = asyncio.run(run(args))
+    else:
+        # 监控/形态识别里的逐币对 print 也一样
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Report written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+Benchmark runner.
+
+    python -m benchmarks.run --bars 100,1000,10000 --symbols 1,10 --repeat 5
+    python -m benchmarks.run --bars 1000 --compare benchmarks/results/<previous>.json --fail-on-regression 1.2
+
+Results are written as JSON (one record per case x size) so runs can be diffed.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.synthetic import (
+    make_merged_frame,
+    make_kline_frame,
+    make_kline_payload,
+    make_oi_payload,
+    make_long_short_payload,
+    make_funding_payload,
+    make_universe,
+)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+# ================== 工具 ==================
+
+def _timeit(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def _payload_fetcher(n, interval):
+    """DataFetcher whose HTTP layer returns pre-built synthetic payloads (measures parsing/merging only)."""
+    from services.data_fetcher import DataFetcher
+
+    payloads = {
+        "/fapi/v1/klines": make_kline_payload(n, interval),
+        "/futures/data/openInterestHist": make_oi_payload(n, interval),
+        "/futures/data/topLongShortAccountRatio": make_long_short_payload(n, interval),
+        "/fapi/v1/fundingRate": make_funding_payload(n, interval),
+    }
+
+    class PayloadFetcher(DataFetcher):
+        async def _fetch_json(self, url, params):
+            for path, payload in payloads.items():
+                if url.endswith(path):
+                    return payload
+            return None
+
+    return PayloadFetcher()
+
+
+# ================== 用例 ==================
+
+def case_get_klines(n, symbols, interval):
+    fetcher = _payload_fetcher(n, interval)
+
+    async def _all():
+        for _ in range(symbols):
+            await fetcher.get_klines("BTCUSDT", interval, n)
+    return lambda: asyncio.run(_all())
+
+
+def case_get_merged_data(n, symbols, interval):
+    fetcher = _payload_fetcher(n, interval)
+
+    async def _all():
+        for _ in range(symbols):
+            await fetcher.get_merged_data("BTCUSDT", interval, n)
+    return lambda: asyncio.run(_all())
+
+
+def _indicator_case(func):
+    def factory(n, symbols, interval):
+        frames = list(make_universe(symbols, n, interval).values())
+        return lambda: [func(df) for df in frames]
+    return factory
+
+
+def _indicator_cases():
+    from services import indicators as ind
+    return {
+        "calc_rsi": _indicator_case(lambda df: ind.calc_rsi(df["close"])),
+        "calc_macd": _indicator_case(lambda df: ind.calc_macd(df["close"])),
+        "calc_ema": _indicator_case(lambda df: ind.calc_ema(df["close"], 20)),
+        "calc_ma": _indicator_case(lambda df: ind.calc_ma(df["close"], 20)),
+        "calc_bollinger_bands": _indicator_case(lambda df: ind.calc_bollinger_bands(df["close"])),
+        "calc_kdj": _indicator_case(lambda df: ind.calc_kdj(df["high"], df["low"], df["close"])),
+    }
+
+
+def case_processor_indicators(n, symbols, interval):
+    from services.data_processor import CryptoDataProcessor
+    processor = CryptoDataProcessor()
+    frames = [make_kline_frame(n, interval, seed=k) for k in range(symbols)]
+    return lambda: [processor.calculate_target_indicators(df.copy()) for df in frames]
+
+
+def case_model_init(n, symbols, interval):
+    from services.model import ReversalModel
+    frames = list(make_universe(symbols, n, interval).values())
+    return lambda: [ReversalModel(df) for df in frames]
+
+
+def case_model_init_bars(n, symbols, interval):
+    from services.bar_buffer import BarBuffer
+    from services.model import ReversalModel
+    buffers = [BarBuffer.from_frame(df) for df in make_universe(symbols, n, interval).values()]
+    return lambda: [ReversalModel(b) for b in buffers]
+
+
+def case_model_evaluate(n, symbols, interval):
+    from services.model import ReversalModel
+    models = [ReversalModel(df) for df in make_universe(symbols, n, interval).values()]
+    return lambda: [m.evaluate(index=-1) for m in models]
+
+
+def case_rules_history(n, symbols, interval):
+    """Score every bar of every symbol at once with the default rule set (features precomputed)."""
+    from services.model import ReversalModel
+    from services.rules import load_rules, stack_features
+    rules = load_rules()
+    models = [ReversalModel(df, rules) for df in make_universe(symbols, n, interval).values()]
+    features = stack_features([m.features for m in models], rules.names)
+    return lambda: rules.score(features)
+
+
+def case_detect_patterns(n, symbols, interval):
+    from services.patterns import CandlePatternDetector
+    frames = [make_kline_frame(n, interval, seed=k) for k in range(symbols)]
+    return lambda: [CandlePatternDetector(df.copy()).detect_patterns() for df in frames]
+
+
+def case_format_for_ai(n, symbols, interval):
+    from services.data_processor import CryptoDataProcessor
+    processor = CryptoDataProcessor()
+    btc = processor.calculate_indicators(make_kline_frame(n, interval, seed=0))
+    targets = [processor.calculate_target_indicators(make_kline_frame(n, interval, seed=k + 1)) for k in range(symbols)]
+    return lambda: [processor.format_for_ai(df, btc, symbol="SYNUSDT") for df in targets]
+
+
+def _chart_case(chart_type):
+    def factory(n, symbols, interval):
+        from services import charting
+        frames = [make_merged_frame(n, interval, seed=k) for k in range(symbols)]
+        if chart_type == "full":
+            return lambda: [charting.generate_chart_image(df, "SYNUSDT", interval) for df in frames]
+        return lambda: [charting.generate_thumbnail_image(df, "SYNUSDT", interval, score=85) for df in frames]
+    return factory
+
+
+def all_cases():
+    cases = {
+        "get_klines": case_get_klines,
+        "get_merged_data": case_get_merged_data,
+    }
+    cases.update(_indicator_cases())
+    cases.update({
+        "processor_indicators": case_processor_indicators,
+        "model_init": case_model_init,
+        "model_init_bars": case_model_init_bars,
+        "model_evaluate": case_model_evaluate,
+        "rules_history": case_rules_history,
+        "detect_patterns": case_detect_patterns,
+        "format_for_ai": case_format_for_ai,
+        "chart_full": _chart_case("full"),
+        "chart_thumb": _chart_case("thumb"),
+    })
+    return cases
+
+
+# ================== 运行 / 对比 ==================
+
+def run(case_names, bars, symbols, repeat, interval):
+    cases = all_cases()
+    records = []
+    for name in case_names:
+        factory = cases[name]
+        for n in bars:
+            for s in symbols:
+                try:
+                    fn = factory(n, s, interval)
+                    fn()  # warm-up (imports, caches)
+                    samples = _timeit(fn, repeat)
+                except ImportError as e:
+                    print(f"{name:24s} skipped: {e}")
+                    break
+                except Exception as e:
+                    print(f"{name:24s} bars={n:<9d} symbols={s:<5d} FAILED: {e}")
+                    records.append({"case": name, "bars": n, "symbols": s, "error": str(e)})
+                    continue
+                rec = {
+                    "case": name,
+                    "bars": n,
+                    "symbols": s,
+                    "repeat": repeat,
+                    "min": min(samples),
+                    "median": statistics.median(samples),
+                    "mean": statistics.fmean(samples),
+                }
+                records.append(rec)
+                print(f"{name:24s} bars={n:<9d} symbols={s:<5d} median={rec['median'] * 1000:10.3f} ms")
+    return records
+
+
+def compare(current, baseline_path, threshold):
+    """Print median ratios vs a baseline file; return the list of regressed keys."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    base = {(r["case"], r["bars"], r["symbols"]): r for r in baseline["results"] if "median" in r}
+    regressions = []
+    print(f"\nComparison vs {baseline_path} (rev {baseline['meta'].get('git_rev')}):")
+    for rec in current:
+        key = (rec["case"], rec["bars"], rec["symbols"])
+        if "median" not in rec or key not in base:
+            continue
+        ratio = rec["median"] / base[key]["median"] if base[key]["median"] else float("inf")
+        flag = "REGRESSION" if ratio > threshold else ("faster" if ratio < 1 / threshold else "")
+        print(f"  {key[0]:24s} bars={key[1]:<9d} symbols={key[2]:<5d} x{ratio:6.2f} {flag}")
+        if ratio > threshold:
+            regressions.append(key)
+    return regressions
+
+
+def _int_list(text):
+    return [int(x) for x in text.split(",") if x]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic data")
+    parser.add_argument("--bars", type=_int_list, default=[100, 1000, 10000], help="comma separated bar counts")
+    parser.add_argument("--symbols", type=_int_list, default=[1], help="comma separated symbol counts")
+    parser.add_argument("--interval", default="1h")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cases", default=None, help="comma separated case names (default: all)")
+    parser.add_argument("--list", action="store_true", help="list case names and exit")
+    parser.add_argument("--out", default=None, help="result JSON path (default: benchmarks/results/<utc>.json)")
+    parser.add_argument("--compare", default=None, help="baseline result JSON to compare against")
+    parser.add_argument("--fail-on-regression", type=float, default=None, metavar="RATIO",
+                        help="exit 1 if any median is slower than baseline by more than RATIO (e.g. 1.2)")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)  # 各模块的 info 日志会淹没输出
+
+    if args.list:
+        print("\n".join(all_cases()))
+        return 0
+
+    case_names = args.cases.split(",") if args.cases else list(all_cases())
+    records = run(case_names, args.bars, args.symbols, args.repeat, args.interval)
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    out = args.out or os.path.join(RESULTS_DIR, f"{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    payload = {
+        "meta": {
+            "timestamp": stamp,
+            "git_rev": _git_rev(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "interval": args.interval,
+        },
+        "results": records,
+    }
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"\nResults written to {out}")
+
+    if args.compare:
+        threshold = args.fail_on_regression or 1.2
+        regressions = compare(records, args.compare, threshold)
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
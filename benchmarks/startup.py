@@ -0,0 +1,77 @@
+"""
+Cold-start import report.
+
+    python -m benchmarks.startup                  # what `import main` pulls in before polling
+    python -m benchmarks.startup --module services.ai_service --top 30
+    python -m benchmarks.startup --max-ms 800     # exit 1 if startup imports exceed the budget
+
+Runs `python -X importtime` in a fresh interpreter and ranks modules by cumulative import time.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# 这些模块出现在启动路径上即视为回归
+HEAVY = ("pandas", "numpy", "pandas_ta", "matplotlib", "mplfinance", "openai", "PIL")
+
+
+def measure(module: str):
+    """Return [(module, self_us, cumulative_us, depth)] for a fresh `import module`."""
+    env = dict(os.environ)
+    env.setdefault("BOT_TOKEN", "benchmark")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report import time of the bot's startup path")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if total import time exceeds this")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    rows = measure(args.module)
+    total_ms = sum(r[1] for r in rows) / 1000
+    top_level = {r[0] for r in rows}
+    heavy = [name for name in HEAVY if name in top_level]
+    ranked = sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]
+
+    if args.json:
+        print(json.dumps({
+            "module": args.module,
+            "total_ms": total_ms,
+            "heavy_modules": heavy,
+            "top": [{"module": n, "self_ms": s / 1000, "cumulative_ms": c / 1000} for n, s, c, _ in ranked],
+        }, indent=2))
+    else:
+        print(f"import {args.module}: {total_ms:.1f} ms across {len(rows)} modules")
+        print(f"heavy modules on startup path: {', '.join(heavy) or 'none'}\n")
+        print(f"{'cumulative':>12s} {'self':>10s}  module")
+        for name, self_us, cum_us, depth in ranked:
+            print(f"{cum_us / 1000:9.1f} ms {self_us / 1000:7.1f} ms  {'  ' * depth}{name}")
+
+    if args.max_ms is not None and total_ms > args.max_ms:
+        print(f"\nStartup import budget exceeded: {total_ms:.1f} ms > {args.max_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,16 +5,46 @@ load_dotenv()
 
 # Telegram settings
 BOT_TOKEN = os.getenv('BOT_TOKEN')
-ALLOWED_USER_IDS = [7643520392, 8108089944]
+ALLOWED_USER_IDS = [int(x) for x in os.getenv('ALLOWED_USER_IDS', '7643520392,8108089944').split(',') if x.strip()]
+# Admin-only commands (/profile ...); defaults to the first allowed user
+ADMIN_USER_IDS = [int(x) for x in os.getenv('ADMIN_USER_IDS', '').split(',') if x.strip()] or ALLOWED_USER_IDS[:1]
 TELEGRAM_CONNECT_TIMEOUT = 30.0
 TELEGRAM_READ_TIMEOUT = 60.0
 
+# Outbound send queue (Telegram flood limits: ~30 msg/s global, ~1 msg/s per chat)
+TELEGRAM_GLOBAL_RATE = 30.0
+TELEGRAM_CHAT_RATE = 1.0
+TELEGRAM_MESSAGE_LIMIT = 4096
+SEND_QUEUE_MAXSIZE = 1000
+SEND_WORKERS = 4
+SEND_MAX_RETRIES = 3
+
+# Concurrent update handling: heavy updates (data fetch / LLM) and light ones (menus, /list, callbacks) run in
+# separate lanes so cheap interactions never queue behind analyses; one chat's updates stay ordered within a lane
+UPDATE_HEAVY_CONCURRENCY = int(os.getenv('UPDATE_HEAVY_CONCURRENCY', '4'))
+UPDATE_LIGHT_CONCURRENCY = int(os.getenv('UPDATE_LIGHT_CONCURRENCY', '32'))
+UPDATE_MAX_PENDING = int(os.getenv('UPDATE_MAX_PENDING', '256'))  # updates admitted at once (running + waiting)
+HEAVY_COMMANDS = ('ai', 'scan')
+HEAVY_CALLBACKS = ('scan',)
+
 # OpenRouter (Unified Provider)
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
 OPENROUTER_BASE_URL = os.getenv('OPENROUTER_BASE_URL', 'https://openrouter.ai/api/v1')
 OPENROUTER_MODEL = os.getenv('OPENROUTER_MODEL', 'google/gemini-2.5-flash')
 AI_TIMEOUT = 120
 
+# Prompt registry
+PROMPTS_DIR = os.getenv('PROMPTS_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'prompts'))
+DEFAULT_PROMPT = os.getenv('DEFAULT_PROMPT', 'prompt')
+# Per-command prompt mapping (command -> prompt file stem)
+COMMAND_PROMPTS = {
+    'ai': os.getenv('AI_COMMAND_PROMPT', DEFAULT_PROMPT),
+    'monitor': os.getenv('MONITOR_PROMPT', DEFAULT_PROMPT),
+}
+PROMPT_RELOAD_INTERVAL = 2.0  # seconds between mtime checks
+# OpenRouter models that need an explicit cache_control breakpoint for prompt caching
+PROMPT_CACHE_MODEL_PREFIXES = ('anthropic/', 'google/gemini')
+
 # Site info for OpenRouter rankings (optional)
 SITE_URL = os.getenv('SITE_URL', 'https://github.com/your-repo/ai-support-bot')
 SITE_NAME = os.getenv('SITE_NAME', 'AI Crypto Analyst')
@@ -22,6 +52,25 @@ SITE_NAME = os.getenv('SITE_NAME', 'AI Crypto Analyst')
 # Proxy (optional)
 PROXY_URL = os.getenv('PROXY_URL',None)
 
+# Monitor
+MONITOR_INTERVAL = 180  # seconds between scheduled scans
+# Sharded monitor: >0 runs the scan in that many worker processes (consistent-hashed by symbol)
+MONITOR_SHARDS = int(os.getenv('MONITOR_SHARDS', '0'))
+MONITOR_SOCKET = os.getenv('MONITOR_SOCKET', 'data/monitor.sock')  # coordinator <-> worker unix socket
+SHARD_VNODES = 64
+SHARD_CONCURRENCY = int(os.getenv('SHARD_CONCURRENCY', '8'))  # pairs scanned concurrently per worker
+
+# Metrics endpoint (Prometheus text format); METRICS_PORT=0 disables it
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# Cold start: heavy modules are imported in the background once polling has started
+PREWARM_IMPORTS = os.getenv('PREWARM_IMPORTS', '1') != '0'
+
+# Profiling (/profile)
+PROFILE_SAMPLE_INTERVAL = 0.005  # seconds between stack samples in 'sample' mode
+PROFILE_TOP_N = 25
+
 # Strategy params
 RSI_THRESHOLD = 70
 SHADOW_RATIO = 2.0
@@ -29,8 +78,57 @@ DANGER_FUNDING_RATE = -0.05
 
 # Paths / endpoints
 DATA_FILE = 'watchlist.json'
-BASE_URL = "https://fapi.binance.com"
+STATE_FILE = 'bot_state.json'  # risk settings + prompt selections for the json backend
+# Storage backend: 'sqlite' (WAL, row-level upserts) or 'json' (legacy full-file rewrites)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite')
+DB_FILE = os.getenv('DB_FILE', 'data/bot.db')
+# json backend write-behind window: mutations within this many seconds share one snapshot write
+STORAGE_FLUSH_DELAY = float(os.getenv('STORAGE_FLUSH_DELAY', '2.0'))
+# OpenRouter model catalog: refreshed in the background once older than the TTL, persisted for restarts
+MODEL_CATALOG_FILE = os.getenv('MODEL_CATALOG_FILE', 'data/openrouter_models.json')
+MODEL_CATALOG_TTL = int(os.getenv('MODEL_CATALOG_TTL', '3600'))
+BASE_URL = os.getenv('BINANCE_BASE_URL', 'https://fapi.binance.com')  # overridable for the load-test fakes
 KLINE_LIMIT = int(os.getenv('KLINE_LIMIT', '100'))
+SNAPSHOT_TTL = float(os.getenv('SNAPSHOT_TTL', '30'))  # seconds between universe premiumIndex / 24hr ticker refreshes
+EXCHANGE_INFO_TTL = 3600  # seconds to cache the tradable perpetuals list
+VALID_INTERVALS = ["5m", "15m", "30m", "1h", "2h", "4h", "6h", "12h", "1d"]
+
+# Per-(endpoint, symbol) circuit breakers for Binance REST
+BREAKER_THRESHOLD = int(os.getenv('BREAKER_THRESHOLD', '3'))  # consecutive failures before a breaker opens
+BREAKER_COOLDOWN = float(os.getenv('BREAKER_COOLDOWN', '60'))  # first cool-down; doubles on each failed probe
+BREAKER_MAX_COOLDOWN = 3600
+INVALID_SYMBOL_TTL = float(os.getenv('INVALID_SYMBOL_TTL', '21600'))  # negative cache for "Invalid symbol" (code -1121)
+
+# Multi-timeframe bars: coarser intervals are resampled from the finest watched one
+BARS_TTL = float(os.getenv('BARS_TTL', '30'))  # seconds a fetched window is reused before topping up
+BARS_MAX_FINE = 1500  # Binance klines limit; longer histories fall back to a direct fetch
+BARS_CACHE_SIZE = 512  # symbols
+BARS_FLOAT32 = os.getenv('BARS_FLOAT32', '0') == '1'  # store analysis prices/volumes as float32 (half the memory)
+
+# Shared-memory bar store: the bot publishes popular pairs once, monitor workers read them zero-copy
+SHM_BARS = os.getenv('SHM_BARS', '1' if MONITOR_SHARDS else '0') == '1'
+SHM_SYMBOLS = [s.strip().upper() for s in os.getenv('SHM_SYMBOLS', 'BTCUSDT,ETHUSDT').split(',') if s.strip()]
+SHM_ROWS = int(os.getenv('SHM_ROWS', '500'))  # bars kept per (symbol, interval) segment
+
+# Universe screener (/scan)
+SCAN_MAX_SYMBOLS = int(os.getenv('SCAN_MAX_SYMBOLS', '150'))  # /scan ranks only the N most liquid perpetuals by 24h quote volume
+SCAN_CONCURRENCY = int(os.getenv('SCAN_CONCURRENCY', '16'))
+SCAN_TOP_N = 10
+SCAN_CACHE_SIZE = 16  # cached (interval, bar) rankings
+
+# Chart rendering
+CHART_WORKERS = int(os.getenv('CHART_WORKERS', '2'))
+CHART_CACHE_SIZE = 128  # cached PNGs (keyed by symbol/interval/last bar/chart type)
+
+# CPU-bound analysis (indicators / ReversalModel / patterns / AI prompt building)
+COMPUTE_BACKEND = os.getenv('COMPUTE_BACKEND', 'process')  # process | thread
+COMPUTE_WORKERS = int(os.getenv('COMPUTE_WORKERS', '2'))
+COMPUTE_MAX_PENDING = int(os.getenv('COMPUTE_MAX_PENDING', '64'))  # submitters wait beyond this
+# Chart attached per notification type: 'full' (mplfinance), 'thumb' (Pillow thumbnail) or None (text only)
+NOTIFICATION_CHART_TYPES = {
+    'reversal': os.getenv('REVERSAL_CHART_TYPE', 'thumb'),
+    'ai_report': os.getenv('AI_REPORT_CHART_TYPE', 'full'),
+}
 
 # Default risk settings
 DEFAULT_BALANCE = 1000.0
@@ -45,6 +143,31 @@ MACD_FAST = 12
 MACD_SLOW = 26
 MACD_SIGNAL = 9
 
+# ReversalModel scoring rules (JSON, or YAML with PyYAML installed); re-read when the file changes
+SCORING_RULES = os.getenv('SCORING_RULES', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'rules', 'reversal.json'))
+RULES_RELOAD_INTERVAL = 2.0  # seconds between mtime checks
+
+# Reversal monitor: alert when the rule-set score reaches this
+REVERSAL_ALERT_SCORE = int(os.getenv('REVERSAL_ALERT_SCORE', '80'))
+
+# Parameter sweeps (python -m tasks.optimize): stored kline history, <SYMBOL>_<interval>.csv / .parquet
+OPTIMIZE_HISTORY_DIR = os.getenv('OPTIMIZE_HISTORY_DIR', 'data/history')
+
+# CandlePatternDetector defaults
+PATTERN_TREND_LOOKBACK = 5  # EMA20 趋势回看K线数
+PATTERN_TREND_THRESHOLD = 0.002  # EMA20 变化超过 0.2% 才算明显趋势
+PATTERN_MIN_BODY_RATIO = 0.1  # 实体 / 全长 的最小比例 (过滤十字星)
+PATTERN_SHADOW_RATIO = 2.0  # 锤子线等: 长影线 >= 实体 x 该值
+PATTERN_SHORT_SHADOW_RATIO = 0.5  # 锤子线等: 另一侧影线 <= 实体 x 该值
+PATTERN_STAR_BODY_RATIO = 0.5  # 星线实体 < 第一根实体 x 该值
+
+# Swing-pivot divergence (ReversalModel / AI payload)
+DIVERGENCE_PIVOT_LEFT = 5  # 枢轴点左侧K线数
+DIVERGENCE_PIVOT_RIGHT = 2  # 右侧确认K线数 (信号延迟这么多根)
+DIVERGENCE_MAX_GAP = 60  # 配对的两个枢轴点最多相隔多少根
+DIVERGENCE_FRESH_BARS = 3  # 背离从确认那根K线起 (含) 保持有效的K线数
+DIVERGENCE_TOLERANCE = {'rsi': 1.0}  # 指标差值小于此值不算背离
+
 # Volume confirmation params
 VOLUME_LOOKBACK = 20  # 向前看多少根K线
 VOLUME_MULTIPLIER = 1.5  # 成交量放大倍数
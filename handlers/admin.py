@@ -0,0 +1,73 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from services.profiler import profiler, PROFILE_TARGETS, PROFILE_MODES
+from services.breakers import breakers
+from utils.decorators import admin_only
+
+
+@admin_only
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Command: /profile [monitor|ai] [N] [cprofile|sample] | /profile off"""
+    args = context.args
+
+    if not args:
+        await update.message.reply_text(
+            f"{profiler.status()}\n\n"
+            "Usage: `/profile monitor 3` (next 3 monitor cycles)\n"
+            "`/profile ai` (next /ai call)\n"
+            "`/profile monitor 1 sample` (stack sampling, .folded for flamegraphs)\n"
+            "`/profile off`",
+            parse_mode='Markdown'
+        )
+        return
+
+    if args[0].lower() == 'off':
+        profiler.disarm()
+        await update.message.reply_text("Profiler disarmed.")
+        return
+
+    target = args[0].lower()
+    if target not in PROFILE_TARGETS:
+        await update.message.reply_text(f"Target must be one of: {', '.join(PROFILE_TARGETS)}")
+        return
+    try:
+        count = int(args[1]) if len(args) > 1 else 1
+    except ValueError:
+        await update.message.reply_text("N must be an integer.")
+        return
+    mode = args[2].lower() if len(args) > 2 else 'cprofile'
+    if mode not in PROFILE_MODES:
+        await update.message.reply_text(f"Mode must be one of: {', '.join(PROFILE_MODES)}")
+        return
+
+    profiler.arm(target, count, update.effective_chat.id, mode)
+    await update.message.reply_text(f"🔬 {profiler.status()}")
+
+
+@admin_only
+async def breakers_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Command: /breakers | /breakers reset [SYMBOL]"""
+    args = context.args
+    if args and args[0].lower() == 'reset':
+        symbol = args[1].upper() if len(args) > 1 else None
+        cleared = breakers.reset(symbol)
+        await update.message.reply_text(f"Cleared {cleared} breaker(s){' for ' + symbol if symbol else ''}.")
+        return
+
+    rows = breakers.open_breakers()
+    if not rows:
+        await update.message.reply_text("✅ No open circuit breakers.")
+        return
+
+    lines = [f"{'ENDPOINT':<34} {'SYMBOL':<12} {'STATE':<8} {'LEFT':>6}"]
+    for r in rows[:40]:
+        state = 'invalid' if r['invalid'] else f"open×{r['failures']}"
+        lines.append(f"{r['endpoint']:<34} {r['symbol'] or '*':<12} {state:<8} {int(r['remaining']):>5}s")
+    more = f"\n…and {len(rows) - 40} more" if len(rows) > 40 else ""
+    last = rows[0]
+    await update.message.reply_text(
+        f"⚡ {len(rows)} open breaker(s)\n```\n" + "\n".join(lines) + f"\n```{more}\n"
+        f"Last error ({last['symbol'] or '*'}): `{last['error'].replace('`', '')}`\n"
+        "`/breakers reset [SYMBOL]` to close them.",
+        parse_mode='Markdown'
+    )
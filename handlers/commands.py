@@ -1,17 +1,11 @@
-import asyncio
 import logging
-import traceback
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from config.settings import DEFAULT_BALANCE, DEFAULT_RISK_PCT
-from services.storage import add_to_watchlist, get_user_watchlist, user_risk_settings
-from services.data_fetcher import prepare_market_data_for_ai
-from services.charting import generate_chart_image
-from services.ai_service import analyze_with_ai
-from services.notification import NotificationService
+from config.settings import DEFAULT_BALANCE, DEFAULT_RISK_PCT, VALID_INTERVALS, SCAN_TOP_N, SCAN_MAX_SYMBOLS
+from services.storage import add_to_watchlist, get_user_watchlist, user_risk_settings, set_user_risk_settings
+from services.prompt_registry import prompt_registry
+from services.profiler import profiler
 from utils.decorators import restricted
-from services.indicators import calc_rsi, calc_macd, calc_ema, calc_bollinger_bands, calc_kdj
-from services.patterns import CandlePatternDetector
 from tasks.monitor import is_monitor_paused
 
 
@@ -26,7 +20,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "• `/add <SYMBOL> <INTERVAL>` - Track a coin (e.g., `/add BTC 1h`)\n"
         "• `/list` - View your watchlist\n"
         "• `/ai <SYMBOL> <INTERVAL>` - Manual AI analysis\n"
-        "• `/models` - Browse AI models\n"
+        "• `/models [QUERY]` - Browse or search AI models\n"
+        "• `/prompt [NAME]` - Show or switch AI prompt\n"
+        "• `/scan <INTERVAL> [N]` - Rank all USDT-M perpetuals by reversal score\n"
         "• `/set <BALANCE> <RISK>` - Set risk params\n"
         "• `/calc <ENTRY> <SL>` - Calculate position size\n\n"
         "**Features**:\n"
@@ -86,9 +82,8 @@ async def add_coin(update: Update, context: ContextTypes.DEFAULT_TYPE):
             symbol += 'USDT'
         
         interval = args[1].lower()
-        valid_intervals = ["5m","15m","30m","1h","2h","4h","6h","12h","1d"]
-        if interval not in valid_intervals:
-             await update.message.reply_text(f"Invalid interval. Use: {', '.join(valid_intervals)}")
+        if interval not in VALID_INTERVALS:
+             await update.message.reply_text(f"Invalid interval. Use: {', '.join(VALID_INTERVALS)}")
              return
 
         add_to_watchlist(update.effective_user.id, symbol, interval)
@@ -119,7 +114,7 @@ async def set_risk(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         balance = float(context.args[0])
         risk = float(context.args[1])
-        user_risk_settings[update.effective_user.id] = {'balance': balance, 'risk': risk}
+        set_user_risk_settings(update.effective_user.id, balance, risk)
         await update.message.reply_text(f"Risk updated. Balance `{balance}U`, Risk `{risk}%`", parse_mode='Markdown')
     except (IndexError, ValueError):
         await update.message.reply_text("Usage: `/set 1000 2` (Balance Risk%)")
@@ -164,6 +159,11 @@ async def calc_position(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @restricted
 async def manual_ai_analyze(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Command: /ai SYMBOL INTERVAL [MODEL]"""
+    # 重依赖 (pandas / pandas_ta / openai / mplfinance) 延迟到首次使用时加载
+    from services.data_fetcher import prepare_market_data_for_ai
+    from services.ai_service import analyze_with_ai
+    from services.notification import NotificationService
+
     args = context.args
     if len(args) < 2:
         await update.message.reply_text("Format: `/ai SYMBOL INTERVAL [MODEL]` e.g. `/ai ETH 4h` or `/ai ETH 4h google/gemini-flash-1.5`", parse_mode='Markdown')
@@ -179,12 +179,14 @@ async def manual_ai_analyze(update: Update, context: ContextTypes.DEFAULT_TYPE):
     status_msg = await update.message.reply_text(f"Working on {symbol} {interval} ...")
 
     try:
-        df, df_btc = await prepare_market_data_for_ai(symbol, interval)
+        async with profiler.capture('ai', context.bot):
+            df, df_btc = await prepare_market_data_for_ai(symbol, interval)
 
-        if df is None:
-            raise RuntimeError("Data fetch failed (symbol/network)")
+            if df is None:
+                raise RuntimeError("Data fetch failed (symbol/network)")
 
-        result = await analyze_with_ai(symbol, interval, df,df_btc, balance=1000)
+            result = await analyze_with_ai(symbol, interval, df,df_btc, balance=1000, model=model,
+                                           user_id=update.effective_user.id, command='ai')
 
          
         # 6. Format and Send Report
@@ -200,3 +202,76 @@ async def manual_ai_analyze(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await status_msg.edit_text(f"Error: {str(e)[:100]}")
         except Exception:
             pass
+
+
+@restricted
+async def scan_universe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Command: /scan INTERVAL [TOP_N] [patterns]"""
+    from services.screener import scan_universe
+
+    args = context.args
+    if not args or args[0].lower() not in VALID_INTERVALS:
+        await update.message.reply_text(
+            f"Usage: `/scan INTERVAL [TOP_N] [patterns]` e.g. `/scan 1h 10`\nIntervals: {', '.join(VALID_INTERVALS)}",
+            parse_mode='Markdown'
+        )
+        return
+    interval = args[0].lower()
+    top_n = SCAN_TOP_N
+    with_patterns = False
+    for arg in args[1:]:
+        if arg.isdigit():
+            top_n = max(1, min(int(arg), 50))
+        elif arg.lower() in ('p', 'patterns'):
+            with_patterns = True
+
+    status_msg = await update.message.reply_text(f"Scanning the {SCAN_MAX_SYMBOLS} most liquid USDT-M perpetuals on {interval} ...")
+    try:
+        scan = await scan_universe(interval, with_patterns)
+    except Exception as e:
+        logging.exception(f"Scan error: {e}")
+        await status_msg.edit_text(f"Scan failed: {str(e)[:100]}")
+        return
+
+    lines = [f"{'#':>2} {'SYMBOL':<14}{'SCORE':>5} {'SIDE':<5}{'RSI':>5} {'24H%':>7}"]
+    for i, row in enumerate(scan['rows'][:top_n], 1):
+        side = 'LONG' if row['signal_type'] == 'long_reversal' else 'SHORT'
+        change = f"{row['change_24h']:+.1f}" if row['change_24h'] is not None else '-'
+        line = f"{i:>2} {row['symbol']:<14}{row['score']:>5} {side:<5}{row['rsi']:>5.1f} {change:>7}"
+        if row['pattern']:
+            line += f" {row['pattern']}"
+        lines.append(line)
+
+    source = "cached" if scan['cached'] else f"fetched in {scan['fetch_seconds']:.1f}s, total {scan['total_seconds']:.1f}s"
+    header = (
+        f"🔎 *Reversal scan* {interval} — top {min(top_n, len(scan['rows']))} of {scan['scored']} scored "
+        f"({scan['scanned']} most liquid of {scan['universe']} perpetuals, {source}; OI/LS not scored)"
+    )
+    await status_msg.edit_text(header + "\n```\n" + "\n".join(lines) + "\n```", parse_mode='Markdown')
+
+
+@restricted
+async def select_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Command: /prompt [NAME|default]"""
+    user_id = update.effective_user.id
+    args = context.args
+
+    if args:
+        name = args[0]
+        if name.lower() == 'default':
+            prompt_registry.set_user_prompt(user_id, None)
+            await update.message.reply_text("Prompt reset to default.")
+            return
+        if not prompt_registry.set_user_prompt(user_id, name):
+            await update.message.reply_text(f"Unknown prompt: `{name}`", parse_mode='Markdown')
+            return
+        await update.message.reply_text(f"Prompt set to `{name}`", parse_mode='Markdown')
+        return
+
+    current = prompt_registry.resolve(user_id=user_id, command='ai')
+    lines = ["📝 **Prompts**:"]
+    for name, version in sorted(prompt_registry.versions().items()):
+        marker = "✅" if current is not None and current.name == name else "•"
+        lines.append(f"{marker} `{name}` ({version})")
+    lines.append("\nUse `/prompt NAME` to switch, `/prompt default` to reset.")
+    await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
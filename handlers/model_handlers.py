@@ -8,9 +8,26 @@ ITEMS_PER_PAGE = 10
 
 @restricted
 async def models_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Entry point: Show list of providers."""
+    """Entry point: Show list of providers, or `/models QUERY` to search by name."""
+    if getattr(context, 'args', None):
+        await show_search(update, context, " ".join(context.args))
+        return
     await show_providers(update, context, page=0)
 
+async def show_search(update: Update, context: ContextTypes.DEFAULT_TYPE, query):
+    query = query.replace("`", "")
+    models = await OpenRouterService.search_models(query, limit=ITEMS_PER_PAGE)
+
+    keyboard = []
+    for m in models:
+        name = m.get('name', m.get('id'))
+        if len(name) > 30: name = name[:27] + "..."
+        keyboard.append([InlineKeyboardButton(name, callback_data=f"m_info:{m.get('id')}")])
+    keyboard.append([InlineKeyboardButton("🏢 All Providers", callback_data="m_provs:0"), InlineKeyboardButton("❌ Close", callback_data="close")])
+
+    text = f"🔍 **Models matching** `{query}`:" if models else f"No models match `{query}`."
+    await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+
 async def show_providers(update: Update, context: ContextTypes.DEFAULT_TYPE, page=0):
     providers = await OpenRouterService.get_providers()
     total_pages = math.ceil(len(providers) / ITEMS_PER_PAGE)
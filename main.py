@@ -1,22 +1,77 @@
 import logging
+import sys
+from services.startup import mark, prewarm
 from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler
-from config.settings import BOT_TOKEN, PROXY_URL, TELEGRAM_CONNECT_TIMEOUT, TELEGRAM_READ_TIMEOUT
-from services.storage import load_data
-from handlers.commands import start, add_coin, list_coins, set_risk, calc_position, manual_ai_analyze, help_command
+from config.settings import (
+    BOT_TOKEN, PROXY_URL, TELEGRAM_CONNECT_TIMEOUT, TELEGRAM_READ_TIMEOUT,
+    MONITOR_INTERVAL, METRICS_HOST, METRICS_PORT, PREWARM_IMPORTS, MONITOR_SHARDS, SHM_BARS,
+)
+from services.storage import load_data, flush_storage, close_storage, storage_queue_depth
+from handlers.commands import start, add_coin, list_coins, set_risk, calc_position, manual_ai_analyze, help_command, select_prompt, scan_universe_command
 from handlers.model_handlers import models_command, model_callback_handler
 from handlers.callbacks import button_handler
-from tasks.monitor import monitor_task
+from handlers.admin import profile_command, breakers_command
+from tasks.monitor import monitor_task, deliver_alert
+from tasks.shards import coordinator
+from services.telegram_sender import telegram_sender
+from services.compute import shutdown_compute_pool, compute_queue_depth
+from services.metrics import (
+    start_metrics_server, SEND_QUEUE_DEPTH, STORAGE_QUEUE_DEPTH, COMPUTE_QUEUE_DEPTH, FETCH_OPEN_BREAKERS,
+)
+from services.breakers import breakers
+from services.update_processor import update_processor
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 
-if __name__ == '__main__':
-    load_data()
 
-    builder = ApplicationBuilder().token(BOT_TOKEN).connect_timeout(TELEGRAM_CONNECT_TIMEOUT).read_timeout(TELEGRAM_READ_TIMEOUT)
-    if PROXY_URL:
-        builder = builder.proxy_url(PROXY_URL).get_updates_proxy_url(PROXY_URL)
-    app = builder.build()
+_metrics_server = None
+_ingest_task = None
+
+
+async def post_init(application):
+    global _metrics_server, _ingest_task
+    await telegram_sender.start(application.bot)
+
+    SEND_QUEUE_DEPTH.set_function(lambda: telegram_sender.stats()["depth"])
+    STORAGE_QUEUE_DEPTH.set_function(storage_queue_depth)
+    COMPUTE_QUEUE_DEPTH.set_function(compute_queue_depth)
+    FETCH_OPEN_BREAKERS.set_function(breakers.open_count)
+    if METRICS_PORT:
+        try:
+            _metrics_server = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            logging.error(f"Failed to start metrics server on {METRICS_HOST}:{METRICS_PORT}: {e}")
+
+    if SHM_BARS:
+        from services.shm_bars import ingest_loop
+        _ingest_task = application.create_task(ingest_loop())
+    if MONITOR_SHARDS:
+        await coordinator.start(deliver_alert)
+
+    mark("ready to poll")
+    if PREWARM_IMPORTS:
+        # post_init 在轮询开始前执行, 预热放到后台, 不阻塞 /start
+        application.create_task(prewarm())
+
 
+async def post_shutdown(application):
+    if _metrics_server is not None:
+        _metrics_server.close()
+    if MONITOR_SHARDS:
+        await coordinator.stop()
+    if _ingest_task is not None:
+        _ingest_task.cancel()
+    if 'services.shm_bars' in sys.modules:
+        sys.modules['services.shm_bars'].close_all()
+    await telegram_sender.stop()
+    if 'services.charting' in sys.modules:
+        sys.modules['services.charting'].shutdown_chart_pool()
+    shutdown_compute_pool()
+    await flush_storage()
+    close_storage()
+
+
+def register_handlers(app):
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("help", help_command))
     app.add_handler(CommandHandler("back", start))
@@ -26,11 +81,29 @@ if __name__ == '__main__':
     app.add_handler(CommandHandler("calc", calc_position))
     app.add_handler(CommandHandler("ai", manual_ai_analyze))
     app.add_handler(CommandHandler("models", models_command))
+    app.add_handler(CommandHandler("prompt", select_prompt))
+    app.add_handler(CommandHandler("scan", scan_universe_command))
+    app.add_handler(CommandHandler("profile", profile_command))
+    app.add_handler(CommandHandler("breakers", breakers_command))
 
     app.add_handler(CallbackQueryHandler(model_callback_handler, pattern="^m_"))
     app.add_handler(CallbackQueryHandler(button_handler))
 
-    app.job_queue.run_repeating(monitor_task, interval=180, first=5)
+
+if __name__ == '__main__':
+    mark("handlers imported")
+    load_data()
+
+    builder = ApplicationBuilder().token(BOT_TOKEN).connect_timeout(TELEGRAM_CONNECT_TIMEOUT).read_timeout(TELEGRAM_READ_TIMEOUT)
+    if PROXY_URL:
+        builder = builder.proxy_url(PROXY_URL).get_updates_proxy_url(PROXY_URL)
+    # 并发处理更新: 重任务 (/ai, /scan) 与菜单/回调分通道, 同一聊天内保持顺序
+    builder = builder.concurrent_updates(update_processor)
+    builder = builder.post_init(post_init).post_shutdown(post_shutdown)
+    app = builder.build()
+
+    register_handlers(app)
+    app.job_queue.run_repeating(monitor_task, interval=MONITOR_INTERVAL, first=5)
 
     print("🚀 Bot started")
     app.run_polling()
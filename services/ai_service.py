@@ -2,11 +2,12 @@ import asyncio
 import json
 import logging
 import re
-from pathlib import Path
 from typing import Any, Dict
 
-from openai import OpenAI
 from services.data_processor import CryptoDataProcessor
+from services.prompt_registry import prompt_registry
+from services.metrics import LLM_LATENCY, LLM_TOKENS, LLM_FAILURES
+from services.compute import run_job, pack_frame, build_ai_message
 
 from config.settings import (
     OPENROUTER_API_KEY,
@@ -20,14 +21,6 @@ from config.settings import (
 
 _openrouter_client = None
 
-# Load prompt content
-PROMPT_FILE = Path(__file__).parent.parent / "prompts" / "prompt.md"
-try:
-    SYSTEM_PROMPT = PROMPT_FILE.read_text(encoding="utf-8")
-except Exception as e:
-    logging.error(f"Failed to read prompt file: {e}")
-    SYSTEM_PROMPT = "You are a crypto analyst. Reply JSON."
-
 
 def _build_user_message(symbol: str, interval: str, df, df_btc, balance: float) -> str:
     """Build the user message with target + BTC 4h data (no merge)."""
@@ -47,6 +40,7 @@ def _get_openrouter_client():
         return _openrouter_client
     if not OPENROUTER_API_KEY:
         raise RuntimeError("OPENROUTER_API_KEY is not configured")
+    from openai import OpenAI  # ~0.5s import, only pay it on the first LLM call
     _openrouter_client = OpenAI(
         base_url=OPENROUTER_BASE_URL,
         api_key=OPENROUTER_API_KEY,
@@ -55,10 +49,23 @@ def _get_openrouter_client():
     return _openrouter_client
 
 
-def _analyze_openrouter(user_msg: str, model: str = None) -> Dict[str, Any]:
+def _record_usage(model: str, resp):
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return
+    LLM_TOKENS.inc(usage.prompt_tokens or 0, model=model, kind="prompt")
+    LLM_TOKENS.inc(usage.completion_tokens or 0, model=model, kind="completion")
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details else None
+    if cached:
+        LLM_TOKENS.inc(cached, model=model, kind="cached")
+
+
+def _analyze_openrouter(user_msg: str, model: str = None, user_id=None, command: str = None) -> Dict[str, Any]:
     client = _get_openrouter_client()
 
     use_model = model or OPENROUTER_MODEL
+    system_msg, template = prompt_registry.system_message(use_model, user_id=user_id, command=command)
 
     extra_headers = {}
     if SITE_URL:
@@ -66,16 +73,22 @@ def _analyze_openrouter(user_msg: str, model: str = None) -> Dict[str, Any]:
     if SITE_NAME:
         extra_headers["X-Title"] = SITE_NAME
 
-    resp = client.chat.completions.create(
-        model=use_model,
-        extra_headers=extra_headers,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_msg},
-        ],
-        temperature=0.3,
-    )
+    try:
+        with LLM_LATENCY.time(model=use_model):
+            resp = client.chat.completions.create(
+                model=use_model,
+                extra_headers=extra_headers,
+                messages=[
+                    system_msg,
+                    {"role": "user", "content": user_msg},
+                ],
+                temperature=0.3,
+            )
+    except Exception:
+        LLM_FAILURES.inc(model=use_model)
+        raise
     logging.info(f"AI response: {resp}")
+    _record_usage(use_model, resp)
 
     content = resp.choices[0].message.content.strip()
     logging.debug(f"AI raw content: {content}")
@@ -94,6 +107,9 @@ def _analyze_openrouter(user_msg: str, model: str = None) -> Dict[str, Any]:
 
     result = json.loads(json_text)
     result["ai_model"] = use_model
+    if template is not None:
+        result["prompt_name"] = template.name
+        result["prompt_version"] = template.version
     if reasoning_text:
         result.setdefault("analysis_process", reasoning_text)
         result["raw_reasoning"] = reasoning_text
@@ -114,15 +130,18 @@ def _fallback_response(reason: str) -> Dict[str, Any]:
     }
 
 
-async def analyze_with_ai(symbol: str, interval: str, df, df_btc, balance: float, model: str = None) -> Dict[str, Any]:
+async def analyze_with_ai(symbol: str, interval: str, df, df_btc, balance: float, model: str = None,
+                          user_id=None, command: str = "ai") -> Dict[str, Any]:
     """
     Unified entry for AI analysis using OpenRouter.
     model: Optional model override (e.g. "google/gemini-flash-1.5")
+    user_id / command: select the system prompt via the prompt registry
     """
-    user_msg = _build_user_message(symbol, interval, df, df_btc, balance)
+    user_msg = await run_job('ai_message', build_ai_message, symbol, interval, pack_frame(df), pack_frame(df_btc), balance)
     try:
-        return await asyncio.to_thread(_analyze_openrouter, user_msg, model)
+        return await asyncio.to_thread(_analyze_openrouter, user_msg, model, user_id, command)
     except json.JSONDecodeError as exc:
+        LLM_FAILURES.inc(model=model or OPENROUTER_MODEL)
         logging.error(f"AI JSON parse error: {exc}")
         return _fallback_response(f"JSON parse error: {exc}")
     except Exception as exc:
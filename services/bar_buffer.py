@@ -0,0 +1,103 @@
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from config.settings import BARS_FLOAT32
+
+# 热路径 (ReversalModel / 形态识别 / 扫描) 实际用到的列; 其余列只在图表和 AI 格式化时需要
+HOT_COLUMNS = ("open", "high", "low", "close", "volume", "oi", "long_ratio", "funding")
+
+
+class BarBuffer:
+    """
+    Compact bar container for the analysis hot path.
+
+    `values` is one (n_columns, n_bars) array, so every column is a contiguous row; `times` holds the bar
+    open times as int64 ns since the epoch (None if the source frame had no DatetimeIndex).
+    Slicing (`bars[-100:]`) returns views, `bars["close"]` / `bars.close` a column view and `bars[i]` one bar
+    as a dict of floats. Convert with to_frame() only at the edges (charting, AI formatting).
+    """
+
+    __slots__ = ("times", "values", "columns", "index_name", "_pos")
+
+    def __init__(self, times: Optional[np.ndarray], values: np.ndarray, columns: Iterable[str], index_name=None):
+        self.times = times
+        self.values = values
+        self.columns = tuple(columns)
+        self.index_name = index_name
+        self._pos = {c: i for i, c in enumerate(self.columns)}
+
+    @classmethod
+    def from_frame(cls, df, columns: Iterable[str] = HOT_COLUMNS, float32: bool = BARS_FLOAT32) -> "BarBuffer":
+        """Copy the numeric `columns` present in `df` (float32 halves the footprint; times stay int64)."""
+        import pandas as pd
+
+        columns = [c for c in columns if c in df.columns]
+        values = np.empty((len(columns), len(df)), dtype=np.float32 if float32 else np.float64)
+        for i, col in enumerate(columns):
+            values[i] = df[col].to_numpy(dtype=values.dtype)
+        times = None
+        if isinstance(df.index, pd.DatetimeIndex):
+            times = df.index.to_numpy(dtype="datetime64[ns]").view(np.int64).copy()
+        return cls(times, values, columns, df.index.name)
+
+    @classmethod
+    def from_arrays(cls, columns: Dict[str, np.ndarray], times: Optional[np.ndarray] = None,
+                    float32: bool = BARS_FLOAT32) -> "BarBuffer":
+        values = np.vstack([np.asarray(v) for v in columns.values()]).astype(
+            np.float32 if float32 else np.float64, copy=False)
+        return cls(None if times is None else np.asarray(times, dtype=np.int64), values, columns.keys())
+
+    def __len__(self) -> int:
+        return self.values.shape[1]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.values[self._pos[key]]
+        if isinstance(key, slice):
+            times = None if self.times is None else self.times[key]
+            return BarBuffer(times, self.values[:, key], self.columns, self.index_name)
+        # 单根 K 线
+        return dict(zip(self.columns, self.values[:, key].tolist()))
+
+    def __getattr__(self, name):
+        # __slots__ 类在反序列化时会先查 __setstate__ 等属性, 此时 _pos 还不存在
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self.values[self._pos[name]]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __contains__(self, column: str) -> bool:
+        return column in self._pos
+
+    def column(self, name: str, dtype=np.float64) -> np.ndarray:
+        """Column as `dtype` (a view when it already is)."""
+        return self.values[self._pos[name]].astype(dtype, copy=False)
+
+    def tail(self, n: int) -> "BarBuffer":
+        return self[-n:] if n else self[:0]
+
+    def timestamp(self, i: int):
+        """Open time of bar i as a pandas Timestamp, or i itself without a time index."""
+        if self.times is None:
+            return i
+        import pandas as pd
+        return pd.Timestamp(self.times[i])
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + (0 if self.times is None else self.times.nbytes)
+
+    def to_frame(self, extra: Optional[Dict[str, np.ndarray]] = None):
+        """DataFrame with the buffered columns (plus `extra` same-length arrays)."""
+        import pandas as pd
+
+        data = {c: self.values[i] for i, c in enumerate(self.columns)}
+        if extra:
+            data.update(extra)
+        index = None
+        if self.times is not None:
+            index = pd.DatetimeIndex(self.times.view("datetime64[ns]"), name=self.index_name)
+        return pd.DataFrame(data, index=index)
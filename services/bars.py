@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+from config.settings import KLINE_LIMIT, BARS_TTL, BARS_MAX_FINE, BARS_CACHE_SIZE
+from services.storage import get_all_unique_pairs, get_pairs_version
+
+INTERVAL_SECONDS = {
+    "1m": 60, "3m": 180, "5m": 300, "15m": 900, "30m": 1800,
+    "1h": 3600, "2h": 7200, "4h": 14400, "6h": 21600, "8h": 28800, "12h": 43200, "1d": 86400,
+}
+
+# Binance kline 列的聚合方式; close_time 由桶边界重新计算
+_AGG = {
+    "open": "first",
+    "high": "max",
+    "low": "min",
+    "close": "last",
+    "volume": "sum",
+    "quote_asset_volume": "sum",
+    "number_of_trades": "sum",
+    "taker_buy_base_asset_volume": "sum",
+    "taker_buy_quote_asset_volume": "sum",
+    "ignore": "last",
+}
+
+
+def resample_ohlcv(df: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    Aggregate finer klines (open_time index, UTC) into `interval` bars on Binance boundaries
+    (multiples of the interval since the Unix epoch, i.e. 00:00 UTC for 1d).
+    A leading bucket that the fine window only partially covers is dropped; the last (forming) bucket is kept.
+    Only fixed-length intervals (INTERVAL_SECONDS) can be derived; 3d / 1w / 1M raise ValueError.
+    """
+    if interval not in INTERVAL_SECONDS:
+        raise ValueError(f"Cannot resample to {interval}")
+    rule = pd.Timedelta(seconds=INTERVAL_SECONDS[interval])
+    step = df.index.to_series().diff().min() if len(df) > 1 else rule
+    grouped = df.resample(rule, origin="epoch", label="left", closed="left")
+    out = grouped.agg({c: a for c, a in _AGG.items() if c in df.columns})
+    counts = grouped["open"].count()
+
+    out = out[counts > 0]
+    counts = counts[counts > 0]
+    if len(out) > 1 and counts.iloc[0] < rule // step:
+        out = out.iloc[1:]
+    if "close_time" in df.columns:
+        out["close_time"] = out.index + rule - pd.Timedelta(milliseconds=1)
+        out = out[list(df.columns)]
+    out.index.name = df.index.name
+    return out
+
+
+def _need(limit: int, ratio: int) -> int:
+    """Fine bars required for `limit` coarse bars (plus a possibly partial leading bucket)."""
+    return limit * ratio + ratio - 1
+
+
+class BarCache:
+    """
+    Per-(symbol, base interval) window of fine klines; coarser watched intervals are resampled from it,
+    and histories the window can't cover (e.g. 100 x 4h from 5m) use a coarser base. A window is reused for BARS_TTL seconds (one monitor cycle), then topped up with only the new bars.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+        # per-(symbol, base) lock + number of coroutines holding or waiting on it
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._lock_users: Dict[Tuple[str, str], int] = {}
+        self._watched: Dict[str, set] = {}
+        self._watched_version = None
+        self._pinned = False
+
+    def use_pairs(self, pairs):
+        """Take watched intervals from `pairs` instead of storage (monitor shard workers don't load storage)."""
+        watched = {}
+        for sym, interval in pairs:
+            if interval in INTERVAL_SECONDS:
+                watched.setdefault(sym, set()).add(interval)
+        self._watched = watched
+        self._pinned = True
+
+    def _watched_intervals(self, symbol: str) -> set:
+        version = get_pairs_version()
+        if not self._pinned and version != self._watched_version:
+            watched = {}
+            for sym, interval in get_all_unique_pairs():
+                if interval in INTERVAL_SECONDS:
+                    watched.setdefault(sym, set()).add(interval)
+            self._watched = watched
+            self._watched_version = version
+        return self._watched.get(symbol, set())
+
+    def base_interval(self, symbol: str, interval: str, limit: int = KLINE_LIMIT) -> str:
+        """
+        Finest watched interval of `symbol` that evenly divides `interval` and whose window
+        for `limit` coarse bars fits in BARS_MAX_FINE; `interval` itself if there is none.
+        """
+        target = INTERVAL_SECONDS[interval]
+        candidates = [
+            i for i in self._watched_intervals(symbol)
+            if target % INTERVAL_SECONDS[i] == 0 and _need(limit, target // INTERVAL_SECONDS[i]) <= BARS_MAX_FINE
+        ]
+        return min(candidates, key=INTERVAL_SECONDS.get, default=interval)
+
+    def _window(self, symbol: str, base: str, need: int) -> int:
+        """Fine bars to keep so every watched multiple of `base` can be derived from one download."""
+        step = INTERVAL_SECONDS[base]
+        window = need
+        for interval in self._watched_intervals(symbol):
+            ratio, rem = divmod(INTERVAL_SECONDS[interval], step)
+            if rem == 0 and _need(KLINE_LIMIT, ratio) <= BARS_MAX_FINE:
+                window = max(window, _need(KLINE_LIMIT, ratio))
+        return window
+
+    async def _fine_bars(self, fetcher, symbol: str, base: str, need: int) -> Optional[pd.DataFrame]:
+        key = (symbol, base)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                return await self._fill(fetcher, symbol, base, need)
+        finally:
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                if key not in self._entries:
+                    # 驱逐时仍在用 / 首次拉取失败: 没人再等时才丢掉锁
+                    self._locks.pop(key, None)
+
+    async def _fill(self, fetcher, symbol: str, base: str, need: int) -> Optional[pd.DataFrame]:
+        """Serve or (re)download the (symbol, base) window; caller holds that key's lock."""
+        key = (symbol, base)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and entry["window"] >= need:
+            self._entries.move_to_end(key)
+            if now - entry["at"] < BARS_TTL:
+                return entry["df"]
+            df = await self._top_up(fetcher, symbol, base, entry)
+            if df is not None:
+                entry.update(df=df, at=now)
+                return df
+
+        window = self._window(symbol, base, need)
+        df = await fetcher.get_klines(symbol, base, window)
+        if df is None:
+            return None
+        self._entries[key] = {"window": window, "df": df, "at": now}
+        self._entries.move_to_end(key)
+        while len(self._entries) > BARS_CACHE_SIZE:
+            evicted, _ = self._entries.popitem(last=False)
+            if evicted not in self._lock_users:
+                # 有协程持有/等待该锁时保留, 由它们结束时清理, 避免同一窗口被并发重复下载
+                self._locks.pop(evicted, None)
+        return df
+
+    async def _top_up(self, fetcher, symbol: str, base: str, entry: dict) -> Optional[pd.DataFrame]:
+        """Fetch only the bars since the cached window's last (forming) bar and splice them in."""
+        cached = entry["df"]
+        step_ms = INTERVAL_SECONDS[base] * 1000
+        last_open_ms = int(cached.index[-1].value // 1_000_000)
+        missing = int((time.time() * 1000 - last_open_ms) // step_ms) + 1
+        if missing >= entry["window"]:
+            return None  # 断档太久, 整窗重拉
+        fresh = await fetcher.get_klines(symbol, base, missing + 1)
+        if fresh is None:
+            return None
+        df = pd.concat([cached, fresh])
+        df = df[~df.index.duplicated(keep="last")]
+        return df.iloc[-entry["window"]:]
+
+    async def get(self, fetcher, symbol: str, interval: str, limit: int = KLINE_LIMIT) -> Optional[pd.DataFrame]:
+        if limit > BARS_MAX_FINE or interval not in INTERVAL_SECONDS:
+            # 3d / 1w / 1M 等不在表内的周期不做本地推导, 直接按原周期拉取
+            return await fetcher.get_klines(symbol, interval, limit)
+        base = self.base_interval(symbol, interval, limit)
+        ratio = INTERVAL_SECONDS[interval] // INTERVAL_SECONDS[base]
+        need = _need(limit, ratio)
+
+        fine = await self._fine_bars(fetcher, symbol, base, need)
+        if fine is None:
+            return None
+        if ratio == 1:
+            return fine.iloc[-limit:].copy()
+        logging.debug(f"[{symbol}] {interval} bars resampled from {base}")
+        return resample_ohlcv(fine, interval).iloc[-limit:]
+
+
+bar_cache = BarCache()
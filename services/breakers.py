@@ -0,0 +1,93 @@
+import time
+from typing import Dict, Optional, Tuple
+
+from config.settings import BREAKER_THRESHOLD, BREAKER_COOLDOWN, BREAKER_MAX_COOLDOWN, INVALID_SYMBOL_TTL
+
+_PROBE_TIMEOUT = 60  # 试探请求迟迟不回 (被取消) 时允许下一次试探
+
+
+class BreakerBoard:
+    """
+    Circuit breakers keyed by (endpoint, symbol); symbol is None for universe-wide endpoints.
+
+    A key opens after BREAKER_THRESHOLD consecutive failures and short-circuits requests for a cool-down
+    that doubles on every failed probe (capped at BREAKER_MAX_COOLDOWN). When the cool-down expires one
+    probe request is let through: success closes the breaker, failure reopens it.
+    "Invalid symbol" answers are cached negatively for INVALID_SYMBOL_TTL without counting failures.
+    Keys never share state, so an unhealthy pair can't slow down a healthy one.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN,
+                 max_cooldown: float = BREAKER_MAX_COOLDOWN, invalid_ttl: float = INVALID_SYMBOL_TTL):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.invalid_ttl = invalid_ttl
+        self._state: Dict[Tuple[str, Optional[str]], dict] = {}
+
+    def allow(self, endpoint: str, symbol: Optional[str]) -> bool:
+        state = self._state.get((endpoint, symbol))
+        if state is None or state["open_until"] is None:
+            return True
+        now = time.time()
+        if now < state["open_until"]:
+            return False
+        if state["invalid"]:
+            # 负缓存到期, 重新确认一次
+            del self._state[(endpoint, symbol)]
+            return True
+        if state["probe_at"] is not None and now - state["probe_at"] < _PROBE_TIMEOUT:
+            return False  # 半开: 只放行一个试探请求
+        state["probe_at"] = now
+        return True
+
+    def success(self, endpoint: str, symbol: Optional[str]):
+        self._state.pop((endpoint, symbol), None)
+
+    def failure(self, endpoint: str, symbol: Optional[str], error: str):
+        now = time.time()
+        state = self._state.setdefault((endpoint, symbol), {
+            "failures": 0, "cooldown": 0.0, "open_until": None, "probe_at": None, "invalid": False, "error": "",
+        })
+        state["failures"] += 1
+        state["error"] = (error.splitlines() or [""])[0][:200]
+        if state["probe_at"] is not None:
+            state["cooldown"] = min(state["cooldown"] * 2, self.max_cooldown)
+        elif state["failures"] >= self.threshold:
+            state["cooldown"] = self.cooldown
+        else:
+            return
+        state["open_until"] = now + state["cooldown"]
+        state["probe_at"] = None
+
+    def mark_invalid(self, endpoint: str, symbol: str, error: str):
+        self._state[(endpoint, symbol)] = {
+            "failures": 0, "cooldown": self.invalid_ttl, "open_until": time.time() + self.invalid_ttl,
+            "probe_at": None, "invalid": True, "error": error[:200],
+        }
+
+    def open_breakers(self) -> list:
+        """Currently short-circuited keys, longest remaining first."""
+        now = time.time()
+        rows = [
+            {"endpoint": endpoint, "symbol": symbol, "invalid": s["invalid"], "failures": s["failures"],
+             "remaining": s["open_until"] - now, "error": s["error"]}
+            for (endpoint, symbol), s in self._state.items()
+            if s["open_until"] is not None and s["open_until"] > now
+        ]
+        rows.sort(key=lambda r: r["remaining"], reverse=True)
+        return rows
+
+    def open_count(self) -> int:
+        now = time.time()
+        return sum(1 for s in self._state.values() if s["open_until"] is not None and s["open_until"] > now)
+
+    def reset(self, symbol: Optional[str] = None) -> int:
+        """Close every breaker (or only those of `symbol`); returns how many were cleared."""
+        keys = [k for k in self._state if symbol is None or k[1] == symbol]
+        for key in keys:
+            del self._state[key]
+        return len(keys)
+
+
+breakers = BreakerBoard()
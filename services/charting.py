@@ -1,11 +1,56 @@
+import asyncio
 import io
-import mplfinance as mpf
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
+from config.settings import CHART_WORKERS, CHART_CACHE_SIZE
+from services.indicators import calc_macd
+from services.metrics import CHART_LATENCY, CHART_CACHE
+
+CHART_BARS = 100
+THUMB_BARS = 60
+THUMB_SIZE = (480, 240)
+THUMB_STRIP_HEIGHT = 28
+CHART_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'macd', 'macd_signal', 'macd_hist']
+
+_style = None
+_executor = None
+_render_cache = OrderedDict()
+
+
+def _init_worker():
+    """Process pool initializer: load matplotlib with Agg backend and build the style once."""
+    import matplotlib
+    matplotlib.use('Agg')
+    _get_style()
+
+
+def _get_style():
+    global _style
+    if _style is None:
+        import mplfinance as mpf
+        mc = mpf.make_marketcolors(up='green', down='red', edge='i', wick='i', volume='in', inherit=True)
+        _style = mpf.make_mpf_style(base_mpf_style='nightclouds', marketcolors=mc)
+    return _style
+
+
+def _with_macd(df):
+    """Add macd / macd_signal / macd_hist columns if the caller didn't compute them."""
+    if all(c in df.columns for c in ('macd', 'macd_signal', 'macd_hist')):
+        return df
+    df = df.copy()
+    df['macd'], df['macd_signal'], df['macd_hist'] = calc_macd(df['close'])
+    return df
+
+
+def _render_full(plot_df, symbol: str, interval: str, score=None) -> bytes:
+    """Plot candle + MACD + volume and return PNG bytes."""
+    import mplfinance as mpf
 
-def generate_chart_image(df, symbol: str, interval: str):
-    """Plot candle + MACD + volume to BytesIO."""
     buf = io.BytesIO()
-    plot_df = df.tail(100)
 
     # Color MACD bars by sign for quick visual bias
     macd_colors = ['green' if v >= 0 else 'red' for v in plot_df['macd_hist']]
@@ -16,9 +61,6 @@ def generate_chart_image(df, symbol: str, interval: str):
         mpf.make_addplot(plot_df['macd_hist'], panel=1, type='bar', color=macd_colors, alpha=0.5),
     ]
 
-    mc = mpf.make_marketcolors(up='green', down='red', edge='i', wick='i', volume='in', inherit=True)
-    style = mpf.make_mpf_style(base_mpf_style='nightclouds', marketcolors=mc)
-
     mpf.plot(
         plot_df,
         type='candle',
@@ -27,9 +69,182 @@ def generate_chart_image(df, symbol: str, interval: str):
         volume=True,
         volume_panel=2,
         title=f"{symbol} - {interval}",
-        style=style,
+        style=_get_style(),
         panel_ratios=(6, 3, 2),
         savefig=buf,
     )
+    return buf.getvalue()
+
+
+def _render_thumbnail(plot_df, symbol: str, interval: str, score=None) -> bytes:
+    """
+    Small candlestick + score strip drawn directly with Pillow.
+    Used for alerts: a few ms per image instead of a full mplfinance figure.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = THUMB_SIZE
+    chart_h = height - THUMB_STRIP_HEIGHT
+    pad = 6
+
+    img = Image.new('RGB', (width, height), (20, 22, 28))
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default()
+
+    o = plot_df['open'].to_numpy(dtype=float)
+    h = plot_df['high'].to_numpy(dtype=float)
+    l = plot_df['low'].to_numpy(dtype=float)
+    c = plot_df['close'].to_numpy(dtype=float)
+    n = len(c)
+
+    if n:
+        lo, hi = float(l.min()), float(h.max())
+        span = (hi - lo) or 1.0
+        scale = (chart_h - 2 * pad) / span
+        step = (width - 2 * pad) / n
+        body_w = max(1.0, step * 0.6)
+
+        def y(v):
+            return chart_h - pad - (v - lo) * scale
+
+        for i in range(n):
+            color = (38, 166, 91) if c[i] >= o[i] else (214, 69, 65)
+            x = pad + step * i + step / 2
+            draw.line([(x, y(h[i])), (x, y(l[i]))], fill=color, width=1)
+            top, bottom = y(max(o[i], c[i])), y(min(o[i], c[i]))
+            draw.rectangle([x - body_w / 2, top, x + body_w / 2, max(bottom, top + 1)], fill=color)
+
+        draw.text((pad, pad), f"{symbol} {interval}  {c[-1]:g}", fill=(230, 230, 230), font=font)
+
+    # 评分条
+    strip_top = chart_h
+    draw.rectangle([0, strip_top, width, height], fill=(32, 35, 44))
+    if score is not None:
+        value = max(0.0, min(float(score), 100.0))
+        if value >= 80:
+            color = (214, 69, 65)
+        elif value >= 60:
+            color = (230, 162, 60)
+        else:
+            color = (90, 120, 160)
+        bar_w = (width - 2 * pad) * value / 100
+        draw.rectangle([pad, strip_top + 6, pad + bar_w, height - 6], fill=color)
+        draw.text((pad + 4, strip_top + 8), f"Score {value:.0f}/100", fill=(255, 255, 255), font=font)
+
+    buf = io.BytesIO()
+    img.save(buf, format='PNG', optimize=False)
+    return buf.getvalue()
+
+
+_RENDERERS = {
+    'full': _render_full,
+    'thumb': _render_thumbnail,
+}
+# Cheap renderers run on the caller's thread; pickling the frame to a worker would cost more than drawing.
+_INLINE_RENDERERS = {'thumb'}
+_RENDER_BARS = {'full': CHART_BARS, 'thumb': THUMB_BARS}
+
+
+def _render_in_worker(chart_type: str, plot_df, symbol: str, interval: str, score=None) -> bytes:
+    return _RENDERERS[chart_type](plot_df, symbol, interval, score)
+
+
+async def _render(chart_type: str, plot_df, symbol: str, interval: str, score=None) -> bytes:
+    with CHART_LATENCY.time(chart_type=chart_type):
+        if chart_type in _INLINE_RENDERERS:
+            return _render_in_worker(chart_type, plot_df, symbol, interval, score)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), _render_in_worker, chart_type, plot_df, symbol, interval, score)
+
+
+def generate_chart_image(df, symbol: str, interval: str):
+    """Plot candle + MACD + volume to BytesIO (synchronous, runs in the caller's thread)."""
+    buf = io.BytesIO(_render_full(_with_macd(df).tail(CHART_BARS), symbol, interval))
+    buf.seek(0)
+    return buf
+
+
+def generate_thumbnail_image(df, symbol: str, interval: str, score=None):
+    """Compact candlestick + score strip PNG to BytesIO."""
+    buf = io.BytesIO(_render_thumbnail(df.tail(THUMB_BARS), symbol, interval, score))
+    buf.seek(0)
+    return buf
+
+
+# ================== 进程池 + 渲染缓存 ==================
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: don't fork the event loop / bot threads into the workers
+        ctx = multiprocessing.get_context('spawn')
+        _executor = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=ctx, initializer=_init_worker)
+    return _executor
+
+
+def warmup_chart_pool():
+    """Start all chart workers now so the first render doesn't pay the matplotlib import."""
+    executor = _get_executor()
+    for _ in range(CHART_WORKERS):
+        executor.submit(_get_style)
+
+
+def shutdown_chart_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _cache_key(df, symbol: str, interval: str, chart_type: str, score=None):
+    last_bar = df.index[-1] if len(df) else None
+    return (symbol, interval, str(last_bar), chart_type, score)
+
+
+def _cache_get(key):
+    png = _render_cache.get(key)
+    if png is not None:
+        _render_cache.move_to_end(key)
+    return png
+
+
+def _cache_put(key, png: bytes):
+    _render_cache[key] = png
+    _render_cache.move_to_end(key)
+    while len(_render_cache) > CHART_CACHE_SIZE:
+        _render_cache.popitem(last=False)
+
+
+async def render_chart(df, symbol: str, interval: str, chart_type: str = 'full', score=None):
+    """
+    Render a chart and return a BytesIO with PNG data.
+    'full' runs in the process pool, 'thumb' is drawn inline with Pillow.
+    Results are cached by (symbol, interval, last bar time, chart type, score), so repeated
+    requests within the same bar return immediately.
+    """
+    if chart_type not in _RENDERERS:
+        raise ValueError(f"Unknown chart type: {chart_type}")
+
+    key = _cache_key(df, symbol, interval, chart_type, score)
+    png = _cache_get(key)
+    CHART_CACHE.inc(result="hit" if png is not None else "miss")
+    if png is None:
+        if chart_type == 'full':
+            df = _with_macd(df)
+        # 只传需要的列，减少跨进程序列化开销
+        cols = [c for c in CHART_COLUMNS if c in df.columns]
+        plot_df = df[cols].tail(_RENDER_BARS[chart_type])
+        try:
+            png = await _render(chart_type, plot_df, symbol, interval, score)
+        except BrokenProcessPool as e:
+            logging.error(f"Chart pool broken, restarting: {e}")
+            shutdown_chart_pool()
+            return None
+        except Exception as e:
+            logging.error(f"Chart render failed for {symbol} {interval}: {e}")
+            return None
+        _cache_put(key, png)
+
+    buf = io.BytesIO(png)
     buf.seek(0)
     return buf
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config.settings import COMPUTE_BACKEND, COMPUTE_WORKERS, COMPUTE_MAX_PENDING
+from services.metrics import COMPUTE_JOB_LATENCY, COMPUTE_WAIT, capture_observations, replay_observations
+from services.profiler import profiler
+
+_executor = None
+_backend = None
+_slots = None
+_pending = 0
+_in_worker = False  # True inside process-pool workers
+
+
+# ================== 载荷 ==================
+
+def pack_frame(df):
+    """DataFrame -> plain dict of numpy arrays; cheaper to pickle than the frame and its block manager."""
+    if df is None:
+        return None
+    return {
+        "index": df.index.to_numpy(),
+        "index_name": df.index.name,
+        "columns": {col: df[col].to_numpy() for col in df.columns},
+    }
+
+
+def unpack_frame(payload):
+    if payload is None:
+        return None
+    import pandas as pd
+    index = pd.Index(payload["index"], name=payload["index_name"])
+    return pd.DataFrame(payload["columns"], index=index)
+
+
+def pack_bars(df):
+    """DataFrame -> BarBuffer with only the hot-path columns (what the model / pattern jobs take)."""
+    if df is None:
+        return None
+    from services.bar_buffer import BarBuffer
+    return BarBuffer.from_frame(df)
+
+
+# ================== 任务 (在 worker 中执行, 必须是模块级函数) ==================
+
+def reversal_evaluate(bars, index: int = -1):
+    from services.model import ReversalModel
+    return ReversalModel(bars).evaluate(index=index)
+
+
+def detect_patterns(bars):
+    from services.patterns import CandlePatternDetector
+    return CandlePatternDetector(bars).detect_patterns()
+
+
+def score_batch(items, with_patterns: bool = False):
+    """[(symbol, BarBuffer)] -> [(symbol, evaluate() result, pattern name or None)]; symbols that fail are dropped."""
+    from services.model import ReversalModel
+    from services.patterns import CandlePatternDetector
+    out = []
+    for symbol, bars in items:
+        try:
+            result = ReversalModel(bars).evaluate(index=-1)
+            pattern = None
+            if with_patterns:
+                match, name = CandlePatternDetector(bars).detect_patterns()
+                pattern = name if match else None
+            out.append((symbol, result, pattern))
+        except Exception as e:
+            logging.debug(f"[{symbol}] scoring failed: {e}")
+    return out
+
+
+def build_ai_message(symbol: str, interval: str, payload, btc_payload, balance: float) -> str:
+    from services.ai_service import _build_user_message
+    return _build_user_message(symbol, interval, unpack_frame(payload), unpack_frame(btc_payload), balance)
+
+
+def _init_worker():
+    """Process pool initializer: pay the pandas / pandas_ta imports once per worker."""
+    global _in_worker
+    _in_worker = True
+    import services.model  # noqa: F401
+    import services.patterns  # noqa: F401
+
+
+def _timed(fn, args):
+    """
+    Run a job, timing it. In a worker process the job's own histogram observations (indicator / model /
+    pattern latency) are returned too, so the parent's /metrics sees them; on threads they record directly.
+    """
+    start = time.perf_counter()
+    if not _in_worker:
+        result = fn(*args)
+        return result, time.perf_counter() - start, None
+    with capture_observations() as observations:
+        result = fn(*args)
+    return result, time.perf_counter() - start, observations
+
+
+# ================== 执行器 ==================
+
+def _use_threads(reason: str):
+    global _executor, _backend
+    if _backend == 'thread':
+        return
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    logging.warning(f"Compute executor falling back to threads: {reason}")
+    _executor = ThreadPoolExecutor(max_workers=COMPUTE_WORKERS, thread_name_prefix="compute")
+    _backend = 'thread'
+
+
+def _get_executor():
+    global _executor, _backend
+    if _executor is None:
+        if COMPUTE_BACKEND == 'thread':
+            _executor = ThreadPoolExecutor(max_workers=COMPUTE_WORKERS, thread_name_prefix="compute")
+            _backend = 'thread'
+        else:
+            try:
+                # spawn: don't fork the event loop / bot threads into the workers
+                ctx = multiprocessing.get_context('spawn')
+                _executor = ProcessPoolExecutor(max_workers=COMPUTE_WORKERS, mp_context=ctx, initializer=_init_worker)
+                _backend = 'process'
+            except (OSError, NotImplementedError) as e:
+                _use_threads(str(e))
+    return _executor
+
+
+def warmup_compute_pool():
+    """Start the workers now so the first monitor cycle doesn't pay process spawn + imports."""
+    executor = _get_executor()
+    if _backend == 'process':
+        for _ in range(COMPUTE_WORKERS):
+            executor.submit(int)
+
+
+def shutdown_compute_pool():
+    global _executor, _backend
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _backend = None
+
+
+def compute_queue_depth() -> int:
+    return _pending
+
+
+async def run_job(job: str, fn, *args):
+    """
+    Run fn(*args) on the compute executor and return its result.
+    At most COMPUTE_MAX_PENDING jobs are in flight; further callers wait for a slot.
+    While a /profile capture is active the job runs inline on the event loop thread instead: cProfile and
+    the stack sampler only see that thread, and pool threads / worker processes would hide the hot path.
+    """
+    global _slots, _pending
+    if _slots is None:
+        _slots = asyncio.Semaphore(COMPUTE_MAX_PENDING)
+
+    submitted = time.perf_counter()
+    _pending += 1
+    try:
+        async with _slots:
+            loop = asyncio.get_running_loop()
+            if profiler.capturing:
+                result, elapsed, observations = _timed(fn, args)
+            else:
+                try:
+                    result, elapsed, observations = await loop.run_in_executor(_get_executor(), _timed, fn, args)
+                except BrokenProcessPool as e:
+                    # A worker died (OOM / killed); rerun this job on threads rather than lose it
+                    _use_threads(f"process pool broken: {e}")
+                    result, elapsed, observations = await loop.run_in_executor(_get_executor(), _timed, fn, args)
+    finally:
+        _pending -= 1
+
+    if observations:
+        replay_observations(observations)
+    COMPUTE_JOB_LATENCY.observe(elapsed, job=job)
+    COMPUTE_WAIT.observe(max(0.0, time.perf_counter() - submitted - elapsed), job=job)
+    return result
@@ -1,11 +1,96 @@
 import asyncio
 import logging
-from typing import Optional, Tuple
+import time
+from typing import Dict, Optional, Tuple
 
 import httpx
 import pandas as pd
 import numpy as np
-from config.settings import BASE_URL, PROXY_URL, KLINE_LIMIT
+from config.settings import (
+    BASE_URL, PROXY_URL, KLINE_LIMIT, SNAPSHOT_TTL, EXCHANGE_INFO_TTL, SHM_BARS, INVALID_SYMBOL_TTL,
+)
+from services.breakers import breakers
+from services.metrics import FETCH_LATENCY, FETCH_RETRIES, FETCH_FAILURES, FETCH_SHORT_CIRCUITS
+
+INVALID_SYMBOL_CODE = -1121  # Binance: "Invalid symbol."
+
+
+def _to_float(value, default=0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class MarketSnapshot:
+    """
+    Universe-wide premiumIndex + 24hr ticker, indexed by symbol.
+    One bulk request per endpoint per refresh replaces N per-symbol requests.
+    """
+    def __init__(self, ttl: float = SNAPSHOT_TTL):
+        self.ttl = ttl
+        self.premium: Dict[str, dict] = {}
+        self.ticker: Dict[str, dict] = {}
+        self.updated_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._frame = None
+
+    def is_fresh(self) -> bool:
+        return bool(self.updated_at) and time.monotonic() - self.updated_at < self.ttl
+
+    def update(self, premium_rows, ticker_rows) -> bool:
+        """Replace whichever tables were fetched successfully; return False if neither was."""
+        if isinstance(premium_rows, list):
+            self.premium = {
+                r["symbol"]: {
+                    "mark_price": _to_float(r.get("markPrice")),
+                    "index_price": _to_float(r.get("indexPrice")),
+                    "funding_rate": _to_float(r.get("lastFundingRate")),
+                    "next_funding_time": int(r.get("nextFundingTime") or 0),
+                }
+                for r in premium_rows if "symbol" in r
+            }
+        if isinstance(ticker_rows, list):
+            self.ticker = {
+                r["symbol"]: {
+                    "last_price": _to_float(r.get("lastPrice")),
+                    "price_change_pct": _to_float(r.get("priceChangePercent")),
+                    "high": _to_float(r.get("highPrice")),
+                    "low": _to_float(r.get("lowPrice")),
+                    "volume": _to_float(r.get("volume")),
+                    "quote_volume": _to_float(r.get("quoteVolume")),
+                    "trades": int(r.get("count") or 0),
+                }
+                for r in ticker_rows if "symbol" in r
+            }
+        if not isinstance(premium_rows, list) and not isinstance(ticker_rows, list):
+            return False
+        self.updated_at = time.monotonic()
+        self._frame = None
+        return True
+
+    def get(self, symbol: str) -> Optional[dict]:
+        """Merged premium + ticker row for one symbol, or None if it isn't in the snapshot."""
+        premium = self.premium.get(symbol)
+        ticker = self.ticker.get(symbol)
+        if premium is None and ticker is None:
+            return None
+        return {**(premium or {}), **(ticker or {})}
+
+    def frame(self) -> pd.DataFrame:
+        """Whole snapshot as a DataFrame indexed by symbol (built once per refresh)."""
+        if self._frame is None:
+            symbols = self.premium.keys() | self.ticker.keys()
+            self._frame = pd.DataFrame.from_dict({s: self.get(s) for s in symbols}, orient="index")
+            self._frame.index.name = "symbol"
+        return self._frame
+
+
+# 所有 DataFetcher 实例共享一份快照
+market_snapshot = MarketSnapshot()
+_perpetuals = []
+_perpetuals_at = 0.0
+
 
 class DataFetcher:
     """
@@ -17,16 +102,54 @@ class DataFetcher:
         self._timeout = httpx.Timeout(10.0, connect=5.0)
 
     async def _fetch_json(self, url: str, params: dict) -> Optional[list]:
-        """GET with proxy/timeout and a small retry backoff."""
+        """
+        GET with proxy/timeout and one retry, behind the per-(endpoint, symbol) circuit breaker.
+        4xx answers aren't retried; "Invalid symbol" is cached negatively.
+        """
+        endpoint = url.replace(BASE_URL, "")
+        symbol = params.get("symbol")
+        if not breakers.allow(endpoint, symbol):
+            FETCH_SHORT_CIRCUITS.inc(endpoint=endpoint)
+            return None
+
+        error = None
         for attempt in range(2):
+            if attempt:
+                FETCH_RETRIES.inc(endpoint=endpoint)
+                await asyncio.sleep(1)
             try:
-                async with httpx.AsyncClient(proxy=self._proxies, timeout=self._timeout) as client:
-                    resp = await client.get(url, params=params)
-                    resp.raise_for_status()
-                    return resp.json()
+                with FETCH_LATENCY.time(endpoint=endpoint):
+                    async with httpx.AsyncClient(proxy=self._proxies, timeout=self._timeout) as client:
+                        resp = await client.get(url, params=params)
+                if 400 <= resp.status_code < 500 and resp.status_code not in (418, 429):
+                    # 参数/币种错误, 重试也一样
+                    return self._client_error(endpoint, symbol, resp)
+                resp.raise_for_status()
+                data = resp.json()
+                breakers.success(endpoint, symbol)
+                return data
             except Exception as exc:
+                error = exc
                 logging.warning(f"Request failed ({attempt + 1}/2): {url} | params={params} | error={exc}")
-                await asyncio.sleep(1)
+        FETCH_FAILURES.inc(endpoint=endpoint)
+        breakers.failure(endpoint, symbol, str(error))
+        return None
+
+    @staticmethod
+    def _client_error(endpoint: str, symbol: Optional[str], resp: httpx.Response) -> None:
+        try:
+            body = resp.json()
+        except ValueError:
+            body = {}
+        code = body.get("code") if isinstance(body, dict) else None
+        message = f"HTTP {resp.status_code} {code}: {body.get('msg', '') if isinstance(body, dict) else resp.text[:100]}"
+        FETCH_FAILURES.inc(endpoint=endpoint)
+        if code == INVALID_SYMBOL_CODE and symbol:
+            logging.warning(f"{endpoint} {symbol}: invalid symbol, skipping for {INVALID_SYMBOL_TTL:.0f}s")
+            breakers.mark_invalid(endpoint, symbol, message)
+        else:
+            logging.warning(f"Request rejected: {endpoint} {symbol or ''} | {message}")
+            breakers.failure(endpoint, symbol, message)
         return None
 
     async def get_klines(self, symbol: str, interval: str, limit: int = KLINE_LIMIT, market: str = "futures") -> Optional[pd.DataFrame]:
@@ -57,13 +180,72 @@ class DataFetcher:
         df["open_time"] = pd.to_datetime(df["open_time"], unit="ms")
         df["close_time"] = pd.to_datetime(df["close_time"], unit="ms")
         df.set_index('open_time', inplace=True)
-        price_cols = ["open", "high", "low", "close", "volume"]
-        df[price_cols] = df[price_cols].astype(float)
+        num_cols = ["open", "high", "low", "close", "volume", "quote_asset_volume",
+                    "taker_buy_base_asset_volume", "taker_buy_quote_asset_volume"]
+        df[num_cols] = df[num_cols].astype(float)
+        df["number_of_trades"] = df["number_of_trades"].astype("int64")
 
         return df
 
+    async def get_bars(self, symbol: str, interval: str, limit: int = KLINE_LIMIT) -> Optional[pd.DataFrame]:
+        """
+        Futures klines (same shape as get_klines), derived locally from the finest interval
+        watched for this symbol when possible so 15m/1h/4h watchers share one download.
+        Pairs the bot publishes to shared memory (SHM_SYMBOLS) are read from there instead.
+        """
+        if SHM_BARS:
+            from services.shm_bars import read_bars
+            df = read_bars(symbol, interval, limit)
+            if df is not None:
+                return df
+        from services.bars import bar_cache
+        return await bar_cache.get(self, symbol, interval, limit)
+
+    async def refresh_snapshot(self, force: bool = False) -> MarketSnapshot:
+        """Refresh the shared universe snapshot if stale; concurrent callers share one refresh."""
+        snap = market_snapshot
+        if not force and snap.is_fresh():
+            return snap
+        if snap._lock is None:
+            snap._lock = asyncio.Lock()
+        async with snap._lock:
+            if not force and snap.is_fresh():
+                return snap
+            premium, ticker = await asyncio.gather(
+                self._fetch_json(f"{BASE_URL}/fapi/v1/premiumIndex", {}),
+                self._fetch_json(f"{BASE_URL}/fapi/v1/ticker/24hr", {}),
+            )
+            if not snap.update(premium, ticker):
+                logging.warning("Market snapshot refresh failed; serving previous data")
+        return snap
+
+    async def get_symbol_snapshot(self, symbol: str) -> Optional[dict]:
+        """Mark price, funding and 24h stats for one symbol from the shared snapshot."""
+        snap = await self.refresh_snapshot()
+        return snap.get(symbol)
+
+    async def get_perpetual_symbols(self, quote: str = "USDT") -> list:
+        """All TRADING perpetual contracts quoted in `quote`, from exchangeInfo (cached EXCHANGE_INFO_TTL)."""
+        global _perpetuals, _perpetuals_at
+        if _perpetuals and time.monotonic() - _perpetuals_at < EXCHANGE_INFO_TTL:
+            return [s for s in _perpetuals if s.endswith(quote)]
+
+        data = await self._fetch_json(f"{BASE_URL}/fapi/v1/exchangeInfo", {})
+        if not data:
+            return [s for s in _perpetuals if s.endswith(quote)]  # 失败时沿用旧列表
+        _perpetuals = [
+            s["symbol"] for s in data.get("symbols", [])
+            if s.get("contractType") == "PERPETUAL" and s.get("status") == "TRADING"
+        ]
+        _perpetuals_at = time.monotonic()
+        return [s for s in _perpetuals if s.endswith(quote)]
+
     async def get_current_funding_rate(self, symbol: str) -> float:
-        """Fetch current funding rate; return 0 on failure."""
+        """Current funding rate (percent) from the snapshot; per-symbol request if missing. Return 0 on failure."""
+        row = await self.get_symbol_snapshot(symbol)
+        if row is not None and "funding_rate" in row:
+            return 100 * row["funding_rate"]
+
         url = f"{BASE_URL}/fapi/v1/premiumIndex"
         params = {"symbol": symbol}
 
@@ -78,7 +260,7 @@ class DataFetcher:
             return 0.0
 
     async def get_current_open_interest(self, symbol: str) -> float:
-        """Fetch current Open Interest (Futures)."""
+        """Fetch current Open Interest (Futures). Per-symbol only: Binance has no universe-wide variant."""
         url = f"{BASE_URL}/fapi/v1/openInterest"
         params = {"symbol": symbol}
 
@@ -154,7 +336,7 @@ class DataFetcher:
         """
         logging.info(f"Fetching merged data for {symbol} {interval}...")
         
-        kline_task = self.get_klines(symbol, interval, limit)
+        kline_task = self.get_bars(symbol, interval, limit)
         oi_task = self.get_open_interest_history(symbol, interval, limit)
         ls_task = self.get_long_short_ratio_history(symbol, interval, limit)
         fund_task = self.get_funding_rate_history(symbol, limit)
@@ -223,10 +405,10 @@ async def prepare_market_data_for_ai(symbol: str, interval: str) -> Tuple[Option
     """
     fetcher = DataFetcher()
 
-    task_symbol = fetcher.get_klines(symbol, interval)
+    task_symbol = fetcher.get_bars(symbol, interval)
     task_fund = fetcher.get_current_funding_rate(symbol)
     task_oi = fetcher.get_current_open_interest(symbol)
-    task_btc = fetcher.get_klines("BTCUSDT", interval)
+    task_btc = fetcher.get_bars("BTCUSDT", interval)
 
     results = await asyncio.gather(task_symbol, task_fund, task_oi, task_btc, return_exceptions=True)
 
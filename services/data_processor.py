@@ -3,6 +3,10 @@ import numpy as np
 import pandas as pd
 import pandas_ta as ta
 
+from services.divergence import detect_divergences
+from services.metrics import INDICATOR_LATENCY
+from services.model import divergence_oscillators
+
 
 class CryptoDataProcessor:
     def __init__(self, limit: int = 100):
@@ -10,12 +14,17 @@ class CryptoDataProcessor:
 
     def calculate_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
         """基础指标（目标币与BTC共用）"""
-        df['EMA20'] = ta.ema(df['close'], length=20)
-        df['RSI'] = ta.rsi(df['close'], length=14)
+        with INDICATOR_LATENCY.time(engine="processor_base"):
+            df['EMA20'] = ta.ema(df['close'], length=20)
+            df['RSI'] = ta.rsi(df['close'], length=14)
         return df
 
     def calculate_target_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
         """目标币种的扩展指标"""
+        with INDICATOR_LATENCY.time(engine="processor_target"):
+            return self._calculate_target_indicators(df)
+
+    def _calculate_target_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
         df = self.calculate_indicators(df)
 
         macd = ta.macd(df['close'])
@@ -92,6 +101,12 @@ class CryptoDataProcessor:
             "rsi": recent_btc['RSI'].tolist()
         }
 
+        # 整条序列上找枢轴背离, 只报告发给 AI 的窗口内确认的; 指标与 ReversalModel 评分时相同 (RSI + MACD DIF)
+        divergences = detect_divergences(
+            df_target['high'].to_numpy(dtype=float), df_target['low'].to_numpy(dtype=float),
+            divergence_oscillators(df_target['close'].to_numpy(dtype=float)),
+        ).recent(window=self.limit, times=pd.Index(df_target[t_col_target]) if t_col_target else df_target.index)
+
         ai_input = {
             "account_info": {
                 "balance": balance,
@@ -101,7 +116,8 @@ class CryptoDataProcessor:
                 "target_symbol": symbol,
                 "btc_context": btc_context,
                 "current_price": last_target['close'],
-                "volatility_atr": last_target['ATR']
+                "volatility_atr": last_target['ATR'],
+                "divergences": divergences
             },
             "data_sequences": {
                 "target": target_sequences,
@@ -0,0 +1,150 @@
+from typing import Dict, List
+
+import numpy as np
+
+from config.settings import (
+    DIVERGENCE_PIVOT_LEFT,
+    DIVERGENCE_PIVOT_RIGHT,
+    DIVERGENCE_MAX_GAP,
+    DIVERGENCE_FRESH_BARS,
+    DIVERGENCE_TOLERANCE,
+)
+
+# (kind, direction, pivot type, price comparison, oscillator comparison)
+#   regular: 价格创新低/新高, 指标没有跟随 -> 反转
+#   hidden:  价格回调未破前低/前高, 指标却更弱/更强 -> 趋势延续
+KINDS = (
+    ("regular_bullish", "bullish", "low", -1, 1),
+    ("hidden_bullish", "bullish", "low", 1, -1),
+    ("regular_bearish", "bearish", "high", 1, -1),
+    ("hidden_bearish", "bearish", "high", -1, 1),
+)
+
+
+def find_pivots(x: np.ndarray, left: int = DIVERGENCE_PIVOT_LEFT, right: int = DIVERGENCE_PIVOT_RIGHT,
+                kind: str = "low") -> np.ndarray:
+    """
+    Indices of swing lows (kind='low') / highs: the extreme of the `left` bars before and `right` bars after.
+    A pivot at i is only known at bar i + right. Ties resolve to the earliest bar; NaN bars never pivot.
+    """
+    width = left + right + 1
+    if len(x) < width:
+        return np.empty(0, dtype=np.intp)
+    fill = np.inf if kind == "low" else -np.inf
+    x = np.where(np.isnan(x), fill, x)
+    windows = np.lib.stride_tricks.sliding_window_view(x, width)
+    pos = windows.argmin(axis=1) if kind == "low" else windows.argmax(axis=1)
+    idx = np.flatnonzero(pos == left) + left
+    return idx[np.isfinite(x[idx])]
+
+
+class Divergences:
+    """
+    Every pivot divergence of one series, found in a single pass.
+
+    `events` holds parallel arrays (kind, oscillator, start, end, osc_start, osc_end, confirmed), one entry per divergence;
+    `start` / `end` are the paired pivot bars and `confirmed = end + right` the first bar it is visible on,
+    so lookups at any index never use future bars. `masks[(kind, oscillator)]` is True on the bars where
+    that divergence is fresh (the confirmation bar and the `fresh` - 1 bars after it).
+    """
+
+    __slots__ = ("n", "oscillators", "events", "masks", "prices")
+
+    def __init__(self, n: int, oscillators, events: Dict[str, np.ndarray], masks, prices):
+        self.n = n
+        self.oscillators = tuple(oscillators)
+        self.events = events
+        self.masks = masks
+        self.prices = prices
+
+    def __len__(self) -> int:
+        return len(self.events["kind"])
+
+    def mask(self, kind: str, oscillator: str = None) -> np.ndarray:
+        """Bars where `kind` is fresh (on `oscillator`, or on any oscillator when None)."""
+        if oscillator is not None:
+            return self.masks[(kind, oscillator)]
+        return np.logical_or.reduce([self.masks[(kind, osc)] for osc in self.oscillators])
+
+    def active(self, index: int, direction: str = None, regular_only: bool = False) -> List[str]:
+        """'<kind>:<oscillator>' labels fresh at bar `index`."""
+        if index < 0:
+            index += self.n
+        out = []
+        for kind, kind_direction, *_ in KINDS:
+            if direction is not None and kind_direction != direction:
+                continue
+            if regular_only and not kind.startswith("regular"):
+                continue
+            out.extend(f"{kind}:{osc}" for osc in self.oscillators if self.masks[(kind, osc)][index])
+        return out
+
+    def recent(self, index: int = -1, window: int = 100, times=None) -> List[dict]:
+        """Divergences confirmed in the `window` bars up to `index`, newest first (AI payload)."""
+        if index < 0:
+            index += self.n
+        ev = self.events
+        sel = np.flatnonzero((ev["confirmed"] <= index) & (ev["confirmed"] > index - window))
+        out = []
+        for i in sel[np.argsort(-ev["confirmed"][sel], kind="stable")]:
+            kind = KINDS[ev["kind"][i]]
+            start, end = int(ev["start"][i]), int(ev["end"][i])
+            price = self.prices[kind[2]]
+            item = {
+                "type": kind[0],
+                "oscillator": self.oscillators[ev["oscillator"][i]],
+                "bars_ago": int(index - ev["confirmed"][i]),
+                "price": [float(price[start]), float(price[end])],
+                "value": [float(ev["osc_start"][i]), float(ev["osc_end"][i])],
+            }
+            if times is not None:
+                item["from"], item["to"] = str(times[start]), str(times[end])
+            out.append(item)
+        return out
+
+
+def detect_divergences(high: np.ndarray, low: np.ndarray, oscillators: Dict[str, np.ndarray],
+                       left: int = DIVERGENCE_PIVOT_LEFT, right: int = DIVERGENCE_PIVOT_RIGHT,
+                       max_gap: int = DIVERGENCE_MAX_GAP, fresh: int = DIVERGENCE_FRESH_BARS,
+                       tolerance: Dict[str, float] = DIVERGENCE_TOLERANCE) -> Divergences:
+    """
+    Pair consecutive swing lows (bullish) / highs (bearish) of price with the oscillator values on the same
+    bars and classify regular / hidden divergence. Pass close for both high and low on close-only data.
+    `tolerance[name]` is the minimum oscillator difference that counts (e.g. 1 RSI point).
+    """
+    n = len(low)
+    prices = {"low": np.asarray(low, dtype=np.float64), "high": np.asarray(high, dtype=np.float64)}
+    pivots = {side: find_pivots(prices[side], left, right, side) for side in prices}
+    names = list(oscillators)
+
+    parts = {k: [] for k in ("kind", "oscillator", "start", "end", "osc_start", "osc_end")}
+    masks = {}
+    for k, (kind, _, side, price_sign, osc_sign) in enumerate(KINDS):
+        p = pivots[side]
+        start, end = p[:-1], p[1:]
+        close_enough = (end - start) <= max_gap
+        price = prices[side]
+        price_move = np.sign(price[end] - price[start]) == price_sign
+        for o, name in enumerate(names):
+            osc = np.asarray(oscillators[name], dtype=np.float64)
+            diff = (osc[end] - osc[start]) * osc_sign
+            hit = close_enough & price_move & (diff > tolerance.get(name, 0.0))
+            s, e = start[hit], end[hit]
+            parts["kind"].append(np.full(len(s), k, dtype=np.int8))
+            parts["oscillator"].append(np.full(len(s), o, dtype=np.int8))
+            parts["start"].append(s)
+            parts["end"].append(e)
+            parts["osc_start"].append(osc[s])
+            parts["osc_end"].append(osc[e])
+
+            # 含确认K线在内的 fresh 根K线内有效 ([confirmed, confirmed + fresh)): 差分 + 累加, 一次得到整条序列的掩码
+            # (枢轴点右侧必有 right 根K线, confirmed 总在序列内)
+            confirmed = e + right
+            step = np.zeros(n + 1, dtype=np.int32)
+            np.add.at(step, confirmed, 1)
+            np.add.at(step, np.minimum(confirmed + fresh, n), -1)
+            masks[(kind, name)] = np.cumsum(step[:n]) > 0
+
+    events = {k: np.concatenate(v) if v else np.empty(0) for k, v in parts.items()}
+    events["confirmed"] = events["end"] + right
+    return Divergences(n, names, events, masks, prices)
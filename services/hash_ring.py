@@ -0,0 +1,58 @@
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Optional
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes.
+    Adding or removing a node only moves the keys that node gains or owned (~1/N of them).
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 64):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        self.nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.vnodes):
+            point = _hash(f"{node}#{i}")
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+
+    def remove(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        for i in range(self.vnodes):
+            point = _hash(f"{node}#{i}")
+            if self._owners.get(point) == node:
+                del self._owners[point]
+                idx = bisect.bisect_left(self._points, point)
+                if idx < len(self._points) and self._points[idx] == point:
+                    self._points.pop(idx)
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        idx = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[self._points[idx]]
+
+    def assign(self, pairs) -> Dict[str, list]:
+        """Split (symbol, interval) pairs into {node: [pairs]}; all intervals of a symbol share a node."""
+        shards = {node: [] for node in self.nodes}
+        for sym, interval in pairs:
+            node = self.node_for(sym)
+            if node is not None:
+                shards[node].append((sym, interval))
+        return shards
@@ -79,3 +79,35 @@ def calc_kdj(high: pd.Series, low: pd.Series, close: pd.Series, period: int = 9,
     j = 3 * k - 2 * d
     
     return k, d, j
+
+
+# ================== 数组版 (BarBuffer 热路径, 输入输出均为 numpy 数组) ==================
+
+def ewm_array(x: np.ndarray, span: int = None, alpha: float = None) -> np.ndarray:
+    """ewm(adjust=False).mean() of a 1-D array; the Series wraps `x` without copying it."""
+    return pd.Series(x, copy=False).ewm(span=span, alpha=alpha, adjust=False).mean().to_numpy()
+
+
+def rolling_mean_array(x: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over `window` bars; NaN until the window is full (like rolling(window).mean())."""
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = np.lib.stride_tricks.sliding_window_view(x, window).mean(axis=1)
+    return out
+
+
+def shift_array(x: np.ndarray, n: int = 1) -> np.ndarray:
+    """x shifted forward by n bars, NaN-padded (Series.shift(n))."""
+    out = np.full(len(x), np.nan)
+    if n < len(x):
+        out[n:] = x[:len(x) - n]
+    return out
+
+
+def rsi_ewm_array(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """RSI with Wilder (alpha = 1/period) smoothing, as ReversalModel computes it."""
+    delta = np.diff(close, prepend=np.nan)
+    gain = ewm_array(np.where(delta > 0, delta, 0.0), alpha=1 / period)
+    loss = ewm_array(np.where(delta < 0, -delta, 0.0), alpha=1 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100 - (100 / (1 + gain / loss))
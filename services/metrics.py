@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+_capture = threading.local()  # .buffer: list while capture_observations() is active on this thread
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+        REGISTRY.register(self)
+
+    def _key(self, labels: dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[n] for n in self.labelnames)
+
+    def _header(self, name: Optional[str] = None):
+        name = name or self.name
+        return [f"# HELP {name} {self.documentation}", f"# TYPE {name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def total(self) -> float:
+        """Sum over all label values."""
+        with self._lock:
+            return sum(self._values.values())
+
+    def collect(self):
+        # 样本名带 _total, HELP / TYPE 必须用同一个名字, 否则 Prometheus 当作 untyped
+        lines = self._header(f"{self.name}_total")
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}_total{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge set explicitly or, with `fn`, read at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._fn = fn
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn: Callable[[], float]):
+        self._fn = fn
+
+    def collect(self):
+        lines = self._header()
+        if self._fn is not None:
+            try:
+                lines.append(f"{self.name} {float(self._fn())}")
+            except Exception as e:
+                logging.debug(f"Gauge {self.name} callback failed: {e}")
+            return lines
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        buffer = getattr(_capture, "buffer", None)
+        if buffer is not None:
+            buffer.append((self.name, value, labels))
+            return
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [bucket counts..., sum, count]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        lines = self._header()
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for key, state in items:
+            for bound, count in zip(self.buckets, state):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', repr(bound)))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {state[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._by_name = {}
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        self._by_name[metric.name] = metric
+
+    def get(self, name: str):
+        return self._by_name[name]
+
+    def exposition(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+@contextmanager
+def capture_observations():
+    """
+    Divert Histogram observations made on this thread into a list of (name, value, labels) instead of
+    recording them. Compute workers run jobs inside this and return the list with the result, since a
+    worker process's registry is never scraped; the parent records them with replay_observations().
+    """
+    buffer = _capture.buffer = []
+    try:
+        yield buffer
+    finally:
+        _capture.buffer = None
+
+
+def replay_observations(observations):
+    for name, value, labels in observations:
+        REGISTRY.get(name).observe(value, **labels)
+
+
+# ================== 指标定义 ==================
+
+FETCH_LATENCY = Histogram("datafetcher_request_seconds", "Binance REST request latency by endpoint", ["endpoint"])
+FETCH_RETRIES = Counter("datafetcher_retries", "Binance REST request retries by endpoint", ["endpoint"])
+FETCH_FAILURES = Counter("datafetcher_failures", "Binance REST requests that failed after all retries", ["endpoint"])
+FETCH_SHORT_CIRCUITS = Counter("datafetcher_short_circuits", "Binance REST requests skipped by an open breaker", ["endpoint"])
+FETCH_OPEN_BREAKERS = Gauge("datafetcher_open_breakers", "Open (endpoint, symbol) circuit breakers")
+
+INDICATOR_LATENCY = Histogram("indicator_seconds", "Indicator computation time", ["engine"])
+MODEL_EVALUATE_LATENCY = Histogram("model_evaluate_seconds", "ReversalModel.evaluate time")
+PATTERN_LATENCY = Histogram("pattern_detect_seconds", "CandlePatternDetector.detect_patterns time")
+
+LLM_LATENCY = Histogram("llm_request_seconds", "LLM completion latency", ["model"],
+                        buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0))
+LLM_TOKENS = Counter("llm_tokens", "LLM tokens used", ["model", "kind"])
+LLM_FAILURES = Counter("llm_failures", "LLM calls that raised or returned unparsable output", ["model"])
+
+CHART_LATENCY = Histogram("chart_render_seconds", "Chart render time", ["chart_type"])
+CHART_CACHE = Counter("chart_cache", "Chart render cache lookups", ["result"])
+
+COMPUTE_JOB_LATENCY = Histogram("compute_job_seconds", "Analysis job run time inside the compute executor", ["job"])
+COMPUTE_WAIT = Histogram("compute_wait_seconds", "Analysis job time spent queued and (de)serializing", ["job"])
+
+TELEGRAM_SEND_LATENCY = Histogram("telegram_send_seconds", "Telegram Bot API send latency", ["method"])
+TELEGRAM_RETRIES = Counter("telegram_retries", "Telegram send retries", ["reason"])
+TELEGRAM_FAILURES = Counter("telegram_failures", "Telegram messages given up on")
+UPDATE_LATENCY = Histogram("telegram_update_seconds", "Update handler run time by lane", ["lane"])
+UPDATE_WAIT = Histogram("telegram_update_wait_seconds", "Time an update waited for its chat / lane", ["lane"])
+
+MONITOR_CYCLE_LATENCY = Histogram("monitor_cycle_seconds", "Full monitor cycle duration",
+                                  buckets=(1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 180.0, 300.0, 600.0))
+MONITOR_CYCLE_LAG = Gauge("monitor_cycle_lag_seconds", "How late the last monitor cycle started vs its schedule")
+MONITOR_PAIRS = Gauge("monitor_pairs", "Pairs scanned in the last monitor cycle")
+MONITOR_WORKERS = Gauge("monitor_workers", "Sharded monitor worker processes connected to the coordinator")
+SEND_QUEUE_DEPTH = Gauge("telegram_send_queue_depth", "Alerts waiting in the Telegram send queue")
+STORAGE_QUEUE_DEPTH = Gauge("storage_queue_depth", "Writes waiting on the storage I/O thread")
+UPDATES_RUNNING = Gauge("telegram_updates_running", "Updates being handled", ["lane"])
+COMPUTE_QUEUE_DEPTH = Gauge("compute_queue_depth", "Analysis jobs submitted to the compute executor and not finished")
+
+
+# ================== HTTP 暴露 ==================
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # 丢弃请求头
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if not line or line in (b"\r\n", b"\n"):
+                break
+        parts = request_line.decode("latin-1").split()
+        path = parts[1] if len(parts) > 1 else "/"
+        if path.split("?")[0] == "/metrics":
+            body = REGISTRY.exposition().encode("utf-8")
+            status = "200 OK"
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = b"not found\n"
+            status = "404 Not Found"
+            content_type = "text/plain"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logging.debug(f"Metrics request failed: {e}")
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str, port: int):
+    """Serve /metrics in Prometheus text format on the running event loop."""
+    server = await asyncio.start_server(_handle, host, port)
+    logging.info(f"Metrics server listening on http://{host}:{port}/metrics")
+    return server
@@ -1,214 +1,154 @@
 import pandas as pd
 import numpy as np
 
+from services.bar_buffer import BarBuffer
+from services.divergence import detect_divergences, KINDS
+from services.indicators import ewm_array, rsi_ewm_array, rolling_mean_array, shift_array
+from services.metrics import INDICATOR_LATENCY, MODEL_EVALUATE_LATENCY
+from services.rules import load_rules
+
+DIVERGENCE_KINDS = tuple(k[0] for k in KINDS)
+
+
+def divergence_oscillators(close: np.ndarray) -> dict:
+    """RSI(14) 与 MACD DIF, 与 ReversalModel 评分所用的背离指标完全一致 (AI 载荷也用它)"""
+    return {
+        'rsi': rsi_ewm_array(close, 14),
+        'macd': ewm_array(close, span=12) - ewm_array(close, span=26),
+    }
+
 class ReversalModel:
-    def __init__(self, df):
+    def __init__(self, df, rules=None):
         """
         初始化模型
-        df: 包含 ['open', 'high', 'low', 'close', 'volume', 'oi', 'long_ratio', 'funding'] 的 DataFrame
+        df: BarBuffer, 或包含 ['open', 'high', 'low', 'close', 'volume', 'oi', 'long_ratio', 'funding'] 的 DataFrame
+        rules: RuleSet, 默认加载 SCORING_RULES (rules/reversal.json)
         数据频率建议: 15m 或 1h
         """
-        self.df = df.copy()
-        self._calculate_indicators()
+        self.bars = df if isinstance(df, BarBuffer) else BarBuffer.from_frame(df)
+        self.rules = rules if rules is not None else load_rules()
+        self.ind = {}
+        self._divergences = None
+        self.features = _Features(self)
+        with INDICATOR_LATENCY.time(engine="reversal_model"):
+            self._calculate_indicators()
+
+    @property
+    def df(self):
+        """K线 + 指标的 DataFrame (仅供调试/展示, 热路径不用)"""
+        return self.bars.to_frame(self.ind)
 
     def _calculate_indicators(self):
-        """计算基础技术指标"""
+        """计算基础技术指标 (数组, 不复制也不改动输入)"""
+        ind = self.ind
+        close = self.bars.column('close')
+
         # 1. EMA
-        self.df['ema50'] = self.df['close'].ewm(span=50, adjust=False).mean()
-        self.df['ema200'] = self.df['close'].ewm(span=200, adjust=False).mean()
+        ind['ema50'] = ewm_array(close, span=50)
+        ind['ema200'] = ewm_array(close, span=200)
 
         # 2. RSI (14)
-        delta = self.df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).ewm(alpha=1/14, adjust=False).mean()
-        loss = (-delta.where(delta < 0, 0)).ewm(alpha=1/14, adjust=False).mean()
-        self.df['rsi'] = 100 - (100 / (1 + gain / loss))
+        ind['rsi'] = rsi_ewm_array(close, 14)
 
         # 3. MACD
-        exp12 = self.df['close'].ewm(span=12, adjust=False).mean()
-        exp26 = self.df['close'].ewm(span=26, adjust=False).mean()
-        self.df['dif'] = exp12 - exp26
-        self.df['dea'] = self.df['dif'].ewm(span=9, adjust=False).mean()
-        self.df['macd_hist'] = (self.df['dif'] - self.df['dea']) * 2
+        exp12 = ewm_array(close, span=12)
+        exp26 = ewm_array(close, span=26)
+        ind['dif'] = exp12 - exp26
+        ind['dea'] = ewm_array(ind['dif'], span=9)
+        ind['macd_hist'] = (ind['dif'] - ind['dea']) * 2
 
         # 4. 辅助计算：OI 变化率 (过去 5 根均值对比)
-        self.df['oi_ma'] = self.df['oi'].rolling(window=5).mean()
-        self.df['oi_change'] = (self.df['oi'] - self.df['oi_ma'].shift(1)) / self.df['oi_ma'].shift(1)
-
-        # 5. 辅助计算：成交量比率
-        self.df['vol_ma'] = self.df['volume'].rolling(window=10).mean()
-        self.df['vol_ratio'] = self.df['volume'] / self.df['vol_ma'].shift(1)
-
-    def _check_divergence(self, index, lookback=15, direction="bullish"):
-        """
-        简单的背离检测 (最近 lookback 根K线)
-        bullish: 价格创新低，RSI 没创新低
-        bearish: 价格创新高，RSI 没创新高
-        """
-        if index < lookback: return False
-        
-        current_price = self.df['close'].iloc[index]
-        current_rsi = self.df['rsi'].iloc[index]
-        
-        # 提取过去窗口的数据（不包含当前K线）
-        past_window = self.df.iloc[index-lookback:index]
-        
-        if direction == "bullish":
-            # 价格必须接近或低于过去窗口的最低价
-            min_price = past_window['close'].min()
-            min_rsi = past_window['rsi'].min()
-            
-            # 逻辑：当前价格破了(或接近)前低，但当前RSI高于前低RSI
-            if current_price <= min_price * 1.001 and current_rsi > min_rsi + 1:
-                return True
-                
-        elif direction == "bearish":
-            max_price = past_window['close'].max()
-            max_rsi = past_window['rsi'].max()
-            
-            if current_price >= max_price * 0.999 and current_rsi < max_rsi - 1:
-                return True
-                
-        return False
+        oi = self.bars.column('oi')
+        ind['oi_ma'] = rolling_mean_array(oi, 5)
+        oi_ma_prev = shift_array(ind['oi_ma'], 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ind['oi_change'] = (oi - oi_ma_prev) / oi_ma_prev
+
+            # 5. 辅助计算：成交量比率
+            volume = self.bars.column('volume')
+            ind['vol_ma'] = rolling_mean_array(volume, 10)
+            ind['vol_ratio'] = volume / shift_array(ind['vol_ma'], 1)
+
+    def _row(self, i):
+        """第 i 根K线的原始列 + 指标, 以 float 字典返回"""
+        row = self.bars[i]
+        for name, values in self.ind.items():
+            row[name] = float(values[i])
+        return row
+
+    @property
+    def divergences(self):
+        """整条序列的枢轴背离 (RSI / MACD DIF), 首次使用时一次算完并缓存"""
+        if self._divergences is None:
+            close = self.bars.column('close')
+            high = self.bars.column('high') if 'high' in self.bars else close
+            low = self.bars.column('low') if 'low' in self.bars else close
+            self._divergences = detect_divergences(high, low, {'rsi': self.ind['rsi'], 'macd': self.ind['dif']})
+        return self._divergences
 
     def evaluate(self, index=-1):
         """
         核心评估函数
         index: 评估哪一行的数据，默认 -1 (最新)
         """
-        # 修正 index 为整数位置
-        if index < 0: index = len(self.df) + index
-        
-        row = self.df.iloc[index]
-        prev_row = self.df.iloc[index-1]
-        
-        # --- 第一步：判断趋势方向 ---
-        # 简单逻辑：价格 < EMA200 且 EMA50 < EMA200 -> 下跌趋势 (寻找做多机会)
-        # 否则如果价格 > EMA200 且 EMA50 > EMA200 -> 上涨趋势 (寻找做空机会)
-        # 其他 -> 震荡 (这里为了简化，震荡偏空则按做多算，震荡偏多按做空算，或者降权)
-        
-        trend = "neutral"
-        mode = "wait"
-        
-        if row['close'] < row['ema200'] and row['ema50'] < row['ema200']:
-            trend = "downtrend"
-            mode = "long_reversal" # 重点算 Bullish Score
-        elif row['close'] > row['ema200'] and row['ema50'] > row['ema200']:
-            trend = "uptrend"
-            mode = "short_reversal" # 重点算 Bearish Score
-        else:
-            # 震荡市，看当前价格在 EMA200 上方还是下方来决定倾向
-            if row['close'] < row['ema200']: mode = "long_reversal"
-            else: mode = "short_reversal"
-
-        score = 0
-        details = {}
-
-        # --- 第二步：计算分数 ---
-        
-        if mode == "long_reversal": # 下跌 -> 向上反转 (做多)
-            
-            # 1. 技术超卖 & 背离 (Max 40 -> 优化建议 30)
-            sub_score = 0
-            if row['rsi'] < 30: sub_score += 15
-            if row['rsi'] < 20: sub_score += 5
-            if self._check_divergence(index, direction="bullish"): sub_score += 10 # 降低了背离权重防止误判
-            score += sub_score
-            details['Tech_RSI'] = sub_score
-
-            # 2. MACD 动能衰竭 (Max 20)
-            sub_score = 0
-            # 柱子连续缩短 (绿柱变短或红柱变短) - 这里简化判断 Histogram 变大 (负值变大趋向0，或正值变大)
-            if row['macd_hist'] > prev_row['macd_hist']: sub_score += 10
-            # 金叉附近
-            if row['dif'] > row['dea'] and prev_row['dif'] < prev_row['dea']: sub_score += 10
-            elif (row['dif'] - row['dea']) > 0 and (row['dif'] - row['dea']) < 5: sub_score += 5 # 已经在上方不远
-            score += min(sub_score, 20)
-            details['MACD'] = min(sub_score, 20)
-
-            # 3. OI & 资金行为 (Max 20 -> 优化建议 25)
-            sub_score = 0
-            # 价格跌 + OI 大降 (多头爆仓)
-            if row['oi_change'] < -0.03: sub_score += 15
-            # 或者：轧空前兆 (OI 增 + 费率极负) - 实战优化
-            elif row['oi_change'] > 0.03 and row['funding'] < -0.0005: sub_score += 15
-            
-            # 价格新低 OI 未新高 (简化判断)
-            if row['close'] < prev_row['close'] and row['oi'] < prev_row['oi']: sub_score += 5
-            score += min(sub_score, 25)
-            details['OI_Funding'] = min(sub_score, 25)
-
-            # 4. 多空结构 (Max 10) - 假设 long_ratio 是 大户多头占比
-            sub_score = 0
-            # 散户狂多，大户狂空 -> 此时 long_ratio (大户) 应该很低
-            if row['long_ratio'] < 0.35: sub_score += 5
-            if row['long_ratio'] < 0.25: sub_score += 5
-            score += sub_score
-            details['LS_Ratio'] = sub_score
-
-            # 5. 量能与K线 (Max 10 -> 优化建议 15)
-            sub_score = 0
-            # 放量
-            if row['vol_ratio'] > 2.0: sub_score += 5
-            # 长下影线 (下影线长度 > 实体 * 2)
-            lower_shadow = min(row['open'], row['close']) - row['low']
-            body = abs(row['open'] - row['close'])
-            if body > 0 and lower_shadow > body * 2: sub_score += 10
-            score += min(sub_score, 15)
-            details['Vol_Candle'] = min(sub_score, 15)
+        with MODEL_EVALUATE_LATENCY.time():
+            return self._evaluate(index)
 
-        else: # mode == "short_reversal" (做空)
-            
-            # 1. 技术超买 & 背离
-            sub_score = 0
-            if row['rsi'] > 70: sub_score += 15
-            if row['rsi'] > 80: sub_score += 5
-            if self._check_divergence(index, direction="bearish"): sub_score += 10
-            score += sub_score
-            details['Tech_RSI'] = sub_score
-
-            # 2. MACD
-            sub_score = 0
-            if row['macd_hist'] < prev_row['macd_hist']: sub_score += 10
-            if row['dif'] < row['dea'] and prev_row['dif'] > prev_row['dea']: sub_score += 10
-            score += min(sub_score, 20)
-            details['MACD'] = min(sub_score, 20)
-
-            # 3. OI
-            sub_score = 0
-            if row['oi_change'] < -0.03: sub_score += 15 # 高位减仓
-            elif row['oi_change'] > 0.03 and row['funding'] > 0.0005: sub_score += 15 # 诱多
-            score += min(sub_score, 25)
-            details['OI_Funding'] = min(sub_score, 25)
-
-            # 4. 多空结构 (大户多头过度拥挤)
-            sub_score = 0
-            if row['long_ratio'] > 0.65: sub_score += 5
-            if row['long_ratio'] > 0.75: sub_score += 5
-            score += sub_score
-            details['LS_Ratio'] = sub_score
+    def _evaluate(self, index):
+        # 修正 index 为整数位置
+        if index < 0: index = len(self.bars) + index
 
-            # 5. 量能
-            sub_score = 0
-            if row['vol_ratio'] > 2.0: sub_score += 5
-            upper_shadow = row['high'] - max(row['open'], row['close'])
-            body = abs(row['open'] - row['close'])
-            if body > 0 and upper_shadow > body * 2: sub_score += 10
-            score += min(sub_score, 15)
-            details['Vol_Candle'] = min(sub_score, 15)
+        row = self._row(index)
+        # 趋势 / 方向 / 各项得分由规则集给出 (rules/reversal.json), 只计算这根K线需要的窗口
+        result = self.rules.score_at(self.features, index)
 
-        # 最终封顶
-        total_score = min(score, 100)
-        
         return {
-            "timestamp": str(row.name) if isinstance(row.name, pd.Timestamp) else index,
-            "trend": trend,
-            "signal_type": mode,
-            "total_score": total_score,
-            "details": details,
+            "timestamp": str(self.bars.timestamp(index)) if self.bars.times is not None else index,
+            "trend": result['trend'],
+            "signal_type": result['signal_type'],
+            "total_score": result['total_score'],
+            "details": result['details'],
             "price": row['close'],
-            "rsi": row['rsi']
+            "rsi": row['rsi'],
+            "divergence": self.divergences.active(index)
         }
 
+    def score_history(self):
+        """整条序列逐根评分 (回测 / 调参用), 返回 services.rules.Scores"""
+        return self.rules.score(self.features)
+
+    def feature(self, name):
+        """规则可引用的特征: K线列、指标 (self.ind) 和背离标记 (regular_bullish / hidden_bearish ...)"""
+        if name in self.ind:
+            return self.ind[name]
+        if name in self.bars:
+            return self.bars.column(name)
+        if name in DIVERGENCE_KINDS:
+            return self.divergences.mask(name)
+        raise KeyError(name)
+
+
+class _Features(dict):
+    """ReversalModel 特征的惰性字典, 首次访问时计算并缓存"""
+
+    def __init__(self, model):
+        super().__init__()
+        self._model = model
+
+    def __missing__(self, name):
+        value = self[name] = self._model.feature(name)
+        return value
+
+    def __contains__(self, name):
+        if dict.__contains__(self, name):
+            return True
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+
 # --- 模拟数据生成与测试 ---
 def generate_fake_data(n=300):
     """生成模拟的下跌然后反转的数据"""
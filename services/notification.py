@@ -4,6 +4,9 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from telegram.helpers import escape_markdown
 
+from config.settings import NOTIFICATION_CHART_TYPES
+from services.charting import render_chart
+
 class NotificationService:
     @staticmethod
     def format_report(symbol, interval, result):
@@ -102,6 +105,21 @@ class NotificationService:
         
         return short_caption, full_report
 
+    @staticmethod
+    async def build_chart(df, symbol, interval, notification_type, score=None):
+        """
+        Render the chart configured for this notification type.
+        Returns a BytesIO, or None if the type is text-only or rendering fails.
+        """
+        chart_type = NOTIFICATION_CHART_TYPES.get(notification_type)
+        if not chart_type or df is None or len(df) == 0:
+            return None
+        try:
+            return await render_chart(df, symbol, interval, chart_type=chart_type, score=score)
+        except Exception as e:
+            logging.error(f"Failed to build {chart_type} chart for {symbol} {interval}: {e}")
+            return None
+
     @staticmethod
     async def send_telegram_report(bot, chat_id, chart_buf, caption, full_report):
         """
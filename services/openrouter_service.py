@@ -1,60 +1,143 @@
-import httpx
+import asyncio
+import json
 import logging
-from config.settings import OPENROUTER_API_KEY, OPENROUTER_BASE_URL
+import os
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from config.settings import OPENROUTER_API_KEY, OPENROUTER_BASE_URL, MODEL_CATALOG_FILE, MODEL_CATALOG_TTL
+from utils.files import atomic_write_json
+
+
+def _provider_of(model_id: str) -> str:
+    return model_id.split('/')[0] if '/' in model_id else 'other'
+
+
+class ModelCatalog:
+    """Immutable snapshot of the model list with provider / id indexes built once per refresh."""
+
+    def __init__(self, models: List[dict], fetched_at: float):
+        self.models = models
+        self.fetched_at = fetched_at
+        self.by_id: Dict[str, dict] = {}
+        by_provider: Dict[str, List[dict]] = {}
+        for m in models:
+            mid = m.get('id', '')
+            self.by_id[mid] = m
+            by_provider.setdefault(_provider_of(mid), []).append(m)
+        self.by_provider = {p: sorted(ms, key=lambda x: x.get('name', '')) for p, ms in by_provider.items()}
+        self.providers = sorted(self.by_provider)
+        self._search_keys = [(f"{m.get('name', '')} {m.get('id', '')}".lower(), m) for m in models]
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def search(self, query: str, limit: int = 20) -> List[dict]:
+        """Case-insensitive substring match on name and id; name matches rank first."""
+        q = query.lower().strip()
+        if not q:
+            return []
+        hits = [m for key, m in self._search_keys if q in key]
+        hits.sort(key=lambda m: (q not in m.get('name', '').lower(), m.get('name', '')))
+        return hits[:limit]
+
 
 class OpenRouterService:
-    _models_cache = []
+    _catalog: Optional[ModelCatalog] = None
+    _refresh_task: Optional[asyncio.Task] = None
 
-    @classmethod
-    async def fetch_models(cls):
-        """Fetch all available models from OpenRouter."""
-        if cls._models_cache:
-            return cls._models_cache
+    # ================== 拉取 / 持久化 ==================
 
+    @classmethod
+    async def _download(cls) -> Optional[List[dict]]:
         url = f"{OPENROUTER_BASE_URL}/models/user"
         headers = {"Authorization": f"Bearer {OPENROUTER_API_KEY}"}
-        
         try:
             async with httpx.AsyncClient() as client:
                 resp = await client.get(url, headers=headers, timeout=10)
                 resp.raise_for_status()
-                data = resp.json()
-                cls._models_cache = data.get('data', [])
-                return cls._models_cache
+                return resp.json().get('data', [])
         except Exception as e:
             logging.error(f"Failed to fetch models: {e}")
-            return []
+            return None
+
+    @classmethod
+    def _load_from_disk(cls) -> Optional[ModelCatalog]:
+        try:
+            with open(MODEL_CATALOG_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return ModelCatalog(data['models'], data['fetched_at'])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable model catalog {MODEL_CATALOG_FILE}: {e}")
+            return None
+
+    @classmethod
+    def _save_to_disk(cls, catalog: ModelCatalog):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(MODEL_CATALOG_FILE)), exist_ok=True)
+            atomic_write_json(MODEL_CATALOG_FILE, json.dumps({"fetched_at": catalog.fetched_at, "models": catalog.models}))
+        except Exception as e:
+            logging.warning(f"Failed to persist model catalog: {e}")
+
+    @classmethod
+    async def refresh(cls) -> Optional[ModelCatalog]:
+        """Download the model list, rebuild the indexes and persist them. Keeps the old catalog on failure."""
+        models = await cls._download()
+        if models is None:
+            return cls._catalog
+        catalog = ModelCatalog(models, time.time())
+        cls._catalog = catalog
+        await asyncio.to_thread(cls._save_to_disk, catalog)
+        return catalog
+
+    @classmethod
+    def _refresh_in_background(cls):
+        if cls._refresh_task is None or cls._refresh_task.done():
+            cls._refresh_task = asyncio.ensure_future(cls.refresh())
+
+    @classmethod
+    async def get_catalog(cls) -> ModelCatalog:
+        """
+        Current catalog. Stale-while-revalidate: past MODEL_CATALOG_TTL the cached catalog is still
+        returned immediately while one background refresh runs. Only a cold start with no disk copy waits.
+        """
+        if cls._catalog is None:
+            cls._catalog = await asyncio.to_thread(cls._load_from_disk)
+        if cls._catalog is None:
+            if cls._refresh_task is None or cls._refresh_task.done():
+                cls._refresh_task = asyncio.ensure_future(cls.refresh())
+            catalog = await cls._refresh_task
+            return catalog or ModelCatalog([], 0.0)  # 下次调用会重试
+        if cls._catalog.age() > MODEL_CATALOG_TTL:
+            cls._refresh_in_background()
+        return cls._catalog
+
+    # ================== 查询 ==================
+
+    @classmethod
+    async def fetch_models(cls):
+        """Fetch all available models from OpenRouter."""
+        return (await cls.get_catalog()).models
 
     @classmethod
     async def get_providers(cls):
-        """Extract unique providers from model IDs (prefix before /)."""
-        models = await cls.fetch_models()
-        providers = set()
-        for m in models:
-            mid = m.get('id', '')
-            if '/' in mid:
-                providers.add(mid.split('/')[0])
-            else:
-                providers.add('other')
-        return sorted(list(providers))
+        """Unique providers (prefix before /), sorted."""
+        return (await cls.get_catalog()).providers
 
     @classmethod
     async def get_models_by_provider(cls, provider):
-        """Get all models for a specific provider."""
-        models = await cls.fetch_models()
-        result = []
-        for m in models:
-            mid = m.get('id', '')
-            p = mid.split('/')[0] if '/' in mid else 'other'
-            if p == provider:
-                result.append(m)
-        return sorted(result, key=lambda x: x.get('name', ''))
+        """All models for a specific provider, sorted by name."""
+        return (await cls.get_catalog()).by_provider.get(provider, [])
 
     @classmethod
     async def get_model_details(cls, model_id):
         """Get details for a specific model."""
-        models = await cls.fetch_models()
-        for m in models:
-            if m.get('id') == model_id:
-                return m
-        return None
+        return (await cls.get_catalog()).by_id.get(model_id)
+
+    @classmethod
+    async def search_models(cls, query, limit=20):
+        """Models whose name or id contains `query` (case-insensitive)."""
+        return (await cls.get_catalog()).search(query, limit)
@@ -1,5 +1,19 @@
 import logging
-from services.data_processor import CryptoDataProcessor
+
+import numpy as np
+import pandas as pd
+import pandas_ta as ta
+
+from config.settings import (
+    PATTERN_TREND_LOOKBACK,
+    PATTERN_TREND_THRESHOLD,
+    PATTERN_MIN_BODY_RATIO,
+    PATTERN_SHADOW_RATIO,
+    PATTERN_SHORT_SHADOW_RATIO,
+    PATTERN_STAR_BODY_RATIO,
+)
+from services.bar_buffer import BarBuffer
+from services.metrics import PATTERN_LATENCY
 
 logger = logging.getLogger(__name__)
 
@@ -12,18 +26,26 @@ class CandlePatternDetector:
     index 为时间顺序递增
     """
 
-    def __init__(self, df, trend_lookback=5, trend_threshold=0.002):
-        self.df = df
+    def __init__(self, df, trend_lookback=PATTERN_TREND_LOOKBACK, trend_threshold=PATTERN_TREND_THRESHOLD,
+                 min_body_ratio=PATTERN_MIN_BODY_RATIO, shadow_ratio=PATTERN_SHADOW_RATIO,
+                 short_shadow_ratio=PATTERN_SHORT_SHADOW_RATIO, star_body_ratio=PATTERN_STAR_BODY_RATIO):
+        # BarBuffer 直接使用; DataFrame 只取 OHLC 列, 不再往里写 EMA20/RSI
+        self.bars = df if isinstance(df, BarBuffer) else BarBuffer.from_frame(df, ("open", "high", "low", "close"))
         self.trend_lookback = trend_lookback
         self.trend_threshold = trend_threshold  # 比如 0.2% 以上才算明显趋势
+        self.min_body_ratio = min_body_ratio
+        self.shadow_ratio = shadow_ratio
+        self.short_shadow_ratio = short_shadow_ratio
+        self.star_body_ratio = star_body_ratio
+        self._ema20 = None
 
     # ================== 基础工具 ==================
 
     def _get_candle(self, i):
         """获取第 i 根 K 线的基础数据"""
         if i < 0:
-            i += len(self.df)
-        row = self.df.iloc[i]
+            i += len(self.bars)
+        row = self.bars[i]
 
         body = abs(row["close"] - row["open"])
         upper = row["high"] - max(row["close"], row["open"])
@@ -32,19 +54,19 @@ class CandlePatternDetector:
         is_green = row["close"] > row["open"]
 
         return {
-            "open": float(row["open"]),
-            "close": float(row["close"]),
-            "high": float(row["high"]),
-            "low": float(row["low"]),
-            "body": float(body),
-            "upper": float(upper),
-            "lower": float(lower),
-            "mid": float(mid),
-            "is_green": bool(is_green),
+            "open": row["open"],
+            "close": row["close"],
+            "high": row["high"],
+            "low": row["low"],
+            "body": body,
+            "upper": upper,
+            "lower": lower,
+            "mid": mid,
+            "is_green": is_green,
         }
     def detect_patterns(self):
         patterns = []
-        for i in range(len(self.df)):
+        for i in range(len(self.bars)):
             if self.is_hammer(i):
                 patterns.append('Hammer')
             elif self.is_inverse_hammer(i):
@@ -86,21 +108,20 @@ class CandlePatternDetector:
 
         # 处理负索引
         if i < 0:
-            i += len(self.df)
-        processor = CryptoDataProcessor()
-        processor.calculate_indicators(self.df)
-        if "EMA20" not in self.df.columns:
+            i += len(self.bars)
+        ema20 = self._get_ema20()
+        if ema20 is None:
             return 0  # 防御性处理
 
         start = max(0, i - lookback + 1)
-        emas = self.df["EMA20"].iloc[start : i + 1]
+        emas = ema20[start : i + 1]
 
         if len(emas) < 2:
             return 0
 
         # 用 EMA 的变化比例来判断方向
-        ema_start = emas.iloc[0]
-        ema_end = emas.iloc[-1]
+        ema_start = emas[0]
+        ema_end = emas[-1]
 
         if ema_start == 0:
             return 0
@@ -113,11 +134,21 @@ class CandlePatternDetector:
         else:
             return 0      # 震荡
 
-    def _has_min_body(self, c, min_ratio=0.1):
+    def _get_ema20(self):
+        """EMA20 (pandas_ta, 与 CryptoDataProcessor 一致), 整个检测器只算一次"""
+        if self._ema20 is None:
+            ema = ta.ema(pd.Series(self.bars.column("close"), copy=False), length=20)
+            if ema is not None:
+                self._ema20 = ema.to_numpy(dtype=float)
+        return self._ema20
+
+    def _has_min_body(self, c, min_ratio=None):
         """
         简单过滤极小实体（十字星之类）
-        min_ratio: 实体相对全长的最小比例
+        min_ratio: 实体相对全长的最小比例 (默认 self.min_body_ratio)
         """
+        if min_ratio is None:
+            min_ratio = self.min_body_ratio
         full_range = c["high"] - c["low"]
         if full_range <= 0:
             return False
@@ -135,6 +166,10 @@ class CandlePatternDetector:
             pattern_name: str or None
         你如果想保持跟原来一样只要 True/False，可以只用 matc    hed.
         """
+        with PATTERN_LATENCY.time():
+            return self._detect_patterns(i)
+
+    def _detect_patterns(self, i):
         trend = self._get_trend(i)
         print(f"Local trend at {i}: {trend}")
         logger.debug(f"Local trend at {i}: {trend}")
@@ -175,6 +210,95 @@ class CandlePatternDetector:
 
         return False, None
 
+    # ================== 整段序列 (回测 / 调参) ==================
+
+    BULLISH = ("is_hammer", "is_inverse_hammer", "is_bullish_engulfing", "is_piercing_line",
+               "is_morning_star", "is_three_white_soldiers")
+    BEARISH = ("is_hanging_man", "is_shooting_star", "is_bearish_engulfing", "is_evening_star",
+               "is_three_black_crows", "is_dark_cloud_cover")
+    PATTERNS = BULLISH + BEARISH
+
+    def trend_series(self):
+        """_get_trend() for every bar at once (1 / -1 / 0)."""
+        ema = self._get_ema20()
+        n = len(self.bars)
+        if ema is None or n == 0:
+            return np.zeros(n, dtype=np.int8)
+        idx = np.arange(n)
+        start = np.maximum(idx - self.trend_lookback + 1, 0)
+        ema_start = ema[start]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = ema / ema_start - 1
+        valid = (idx - start >= 1) & (ema_start != 0)
+        trend = np.zeros(n, dtype=np.int8)
+        trend[valid & (change > self.trend_threshold)] = 1
+        trend[valid & (change < -self.trend_threshold)] = -1
+        return trend
+
+    def detect_series(self):
+        """
+        Pattern code for every bar: 0 = none, k = PATTERNS[k - 1]; same rules and priority as detect_patterns(i),
+        vectorized (the first bars, which detect_patterns would read with wrapped indices, never match).
+        """
+        n = len(self.bars)
+        o, h, l, c = (self.bars.column(k) for k in ("open", "high", "low", "close"))
+
+        def shift(x, k):
+            out = np.full(n, np.nan) if x.dtype != bool else np.zeros(n, dtype=bool)
+            if k < n:
+                out[k:] = x[:n - k]
+            return out
+
+        body = np.abs(c - o)
+        upper = h - np.maximum(c, o)
+        lower = np.minimum(c, o) - l
+        green = c > o
+        full = h - l
+        with np.errstate(divide="ignore", invalid="ignore"):
+            min_body = (full > 0) & (body / full >= self.min_body_ratio)
+        mid = (c + o) / 2
+
+        # 前一根 (p) / 前两根 (q)
+        po, pc, pbody, pupper, pmid = (shift(x, 1) for x in (o, c, body, upper, mid))
+        pgreen, pmin = shift(green, 1), shift(min_body, 1)
+        qo, qc, qbody, qmid = (shift(x, 2) for x in (o, c, body, mid))
+        qgreen, qmin = shift(green, 2), shift(min_body, 2)
+        # shift 补的 False 对应 "前一根不存在"; 阴线判断要求该K线存在
+        pred, qred = ~pgreen & ~np.isnan(pc), ~qgreen & ~np.isnan(qc)
+
+        long_lower = min_body & (lower >= body * self.shadow_ratio) & (upper <= body * self.short_shadow_ratio)
+        long_upper = min_body & (upper >= body * self.shadow_ratio) & (lower <= body * self.short_shadow_ratio)
+
+        masks = {
+            "is_hammer": long_lower,
+            "is_inverse_hammer": long_upper,
+            "is_bullish_engulfing": pred & green & min_body & pmin & (o <= pc) & (c >= po),
+            "is_piercing_line": pred & green & min_body & pmin & (o <= pc) & (c > pmid) & (c < po),
+            "is_morning_star": qred & green & qmin & min_body & (pbody < qbody * self.star_body_ratio)
+                               & (pc < qc) & (c > qmid),
+            "is_three_white_soldiers": qgreen & pgreen & green & (pc > qc) & (c > pc)
+                                       & (po > np.minimum(qo, qc)) & (po < np.maximum(qo, qc))
+                                       & (o > np.minimum(po, pc)) & (o < np.maximum(po, pc))
+                                       & (upper < body) & (pupper < pbody),
+            "is_hanging_man": long_lower,
+            "is_shooting_star": long_upper,
+            "is_bearish_engulfing": pgreen & ~green & min_body & pmin & (o >= pc) & (c <= po),
+            "is_evening_star": qgreen & ~green & qmin & min_body & (pbody < qbody * self.star_body_ratio)
+                               & (pc > qc) & (c < qmid),
+            "is_three_black_crows": qred & pred & ~green & (pc < qc) & (c < pc)
+                                    & (po < qo) & (po > qc) & (o < po) & (o > pc),
+            "is_dark_cloud_cover": pgreen & ~green & min_body & pmin & (o > pc) & (c < pmid) & (c > po),
+        }
+
+        trend = self.trend_series()
+        codes = np.zeros(n, dtype=np.int8)
+        # 按 detect_patterns 的优先级: 倒序写入, 排在前面的形态最后覆盖
+        for k in range(len(self.PATTERNS) - 1, -1, -1):
+            name = self.PATTERNS[k]
+            side = -1 if name in self.BULLISH else 1
+            codes[masks[name] & (trend == side)] = k + 1
+        return codes
+
     # ================== 看涨形态 (Bullish) ==================
 
     def is_hammer(self, i=-1):
@@ -187,7 +311,7 @@ class CandlePatternDetector:
         if not self._has_min_body(c):
             return False
 
-        shape = (c["lower"] >= c["body"] * 2) and (c["upper"] <= c["body"] * 0.5)
+        shape = (c["lower"] >= c["body"] * self.shadow_ratio) and (c["upper"] <= c["body"] * self.short_shadow_ratio)
         if shape:
             logger.debug(
                 f"Hammer detected at {i}: lower={c['lower']:.4f}, body={c['body']:.4f}"
@@ -203,7 +327,7 @@ class CandlePatternDetector:
         if not self._has_min_body(c):
             return False
 
-        shape = (c["upper"] >= c["body"] * 2) and (c["lower"] <= c["body"] * 0.5)
+        shape = (c["upper"] >= c["body"] * self.shadow_ratio) and (c["lower"] <= c["body"] * self.short_shadow_ratio)
         if shape:
             logger.debug(
                 f"Inverse Hammer detected at {i}: upper={c['upper']:.4f}, body={c['body']:.4f}"
@@ -279,7 +403,7 @@ class CandlePatternDetector:
         if not (self._has_min_body(c1) and self._has_min_body(c3)):
             return False
 
-        small_body = c2["body"] < (c1["body"] * 0.5)
+        small_body = c2["body"] < (c1["body"] * self.star_body_ratio)
         low_position = c2["close"] < c1["close"]
         c1_mid = (c1["open"] + c1["close"]) / 2
         rebound = c3["close"] > c1_mid
@@ -331,7 +455,7 @@ class CandlePatternDetector:
         if not self._has_min_body(c):
             return False
 
-        shape = (c["lower"] >= c["body"] * 2) and (c["upper"] <= c["body"] * 0.5)
+        shape = (c["lower"] >= c["body"] * self.shadow_ratio) and (c["upper"] <= c["body"] * self.short_shadow_ratio)
         if shape:
             logger.debug(
                 f"Hanging Man detected at {i}: lower={c['lower']:.4f}, body={c['body']:.4f}"
@@ -347,7 +471,7 @@ class CandlePatternDetector:
         if not self._has_min_body(c):
             return False
 
-        shape = (c["upper"] >= c["body"] * 2) and (c["lower"] <= c["body"] * 0.5)
+        shape = (c["upper"] >= c["body"] * self.shadow_ratio) and (c["lower"] <= c["body"] * self.short_shadow_ratio)
         if shape:
             logger.debug(
                 f"Shooting Star detected at {i}: upper={c['upper']:.4f}, body={c['body']:.4f}"
@@ -392,7 +516,7 @@ class CandlePatternDetector:
         if not (self._has_min_body(c1) and self._has_min_body(c3)):
             return False
 
-        small_body = c2["body"] < (c1["body"] * 0.5)
+        small_body = c2["body"] < (c1["body"] * self.star_body_ratio)
         high_position = c2["close"] > c1["close"]
         c1_mid = (c1["open"] + c1["close"]) / 2
         drop = c3["close"] < c1_mid
@@ -0,0 +1,210 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from config.settings import PROFILE_SAMPLE_INTERVAL, PROFILE_TOP_N
+
+PROFILE_TARGETS = ("monitor", "ai")
+PROFILE_MODES = ("cprofile", "sample")
+
+
+class _StackSampler:
+    """Samples one thread's Python stack on a background thread; output is flamegraph 'folded' format."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def summary(self, top_n: int) -> str:
+        leaf = Counter()
+        for stack, count in self.stacks.items():
+            leaf[stack.rsplit(";", 1)[-1]] += count
+        total = self.samples or 1
+        lines = [f"{self.samples} samples @ {self.interval * 1000:.0f} ms", "self%   function"]
+        for name, count in leaf.most_common(top_n):
+            lines.append(f"{100 * count / total:5.1f}   {name}")
+        return "\n".join(lines)
+
+
+class Profiler:
+    """
+    Arm-once profiler for the monitor loop or the next /ai call(s).
+    capture() is a no-op unless armed for that target, so the disarmed cost is one comparison.
+    Note: captures run on the event loop thread, so other coroutines active meanwhile are included;
+    compute jobs run inline on that thread while a capture is active (see compute.run_job) so they show up too.
+    """
+
+    def __init__(self):
+        self._target: Optional[str] = None
+        self._mode = "cprofile"
+        self._remaining = 0
+        self._total = 0
+        self._chat_id = None
+        self._active = False
+        self._started = 0.0
+        self._elapsed = 0.0
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_StackSampler] = None
+        self._generation = 0  # 每次 arm / disarm 递增, 进行中的采集据此判断结果是否还属于当前会话
+
+    # ================== 控制 ==================
+
+    def arm(self, target: str, count: int, chat_id, mode: str = "cprofile"):
+        if target not in PROFILE_TARGETS:
+            raise ValueError(f"Unknown profile target: {target}")
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.disarm()
+        self._target = target
+        self._mode = mode
+        self._remaining = self._total = max(1, count)
+        self._chat_id = chat_id
+        self._elapsed = 0.0
+        self._profile = cProfile.Profile() if mode == "cprofile" else None
+        self._sampler = None
+
+    def disarm(self):
+        # 进行中的采集由 capture() 自己停止 (_active 保持到那时, 期间不会开始新的采集)
+        self._generation += 1
+        self._target = None
+        self._profile = None
+        self._sampler = None
+
+    @property
+    def capturing(self) -> bool:
+        return self._active
+
+    def status(self) -> str:
+        if self._target is None:
+            return "Profiler disarmed"
+        done = self._total - self._remaining
+        return f"Profiler armed: {self._target} ({self._mode}), {done}/{self._total} captured"
+
+    # ================== 采集 ==================
+
+    def _start_capture(self):
+        """Start collecting; returns the (profile, sampler) this capture owns."""
+        self._active = True
+        self._started = time.perf_counter()
+        if self._mode == "cprofile":
+            self._profile.enable()
+            return self._profile, None
+        if self._sampler is None:
+            self._sampler = _StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+        self._sampler.start()
+        return None, self._sampler
+
+    def _stop_capture(self, profile, sampler) -> float:
+        if profile is not None:
+            profile.disable()
+        else:
+            sampler.stop()
+        self._active = False
+        return time.perf_counter() - self._started
+
+    @asynccontextmanager
+    async def capture(self, target: str, bot=None):
+        if self._target != target or self._active:
+            yield
+            return
+
+        generation = self._generation
+        profile, sampler = self._start_capture()
+        try:
+            yield
+        finally:
+            elapsed = self._stop_capture(profile, sampler)
+            # 采集期间被 disarm / 重新 arm: 只停掉自己的采集器, 不计入新会话
+            if generation == self._generation:
+                self._elapsed += elapsed
+                self._remaining -= 1
+                if self._remaining <= 0:
+                    await self._finish(bot)
+
+    # ================== 报告 ==================
+
+    def _build_report(self):
+        """Return (summary_text, file_bytes, filename)."""
+        header = f"{self._target} x{self._total} ({self._mode}), {self._elapsed:.2f}s captured"
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if self._mode == "cprofile":
+            out = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=out)
+            stats.strip_dirs().sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+            with tempfile.NamedTemporaryFile(suffix=".pstats", delete=False) as f:
+                path = f.name
+            try:
+                self._profile.dump_stats(path)
+                with open(path, "rb") as f:
+                    data = f.read()
+            finally:
+                os.unlink(path)
+            return f"{header}\n{out.getvalue()}", data, f"profile-{self._target}-{stamp}.pstats"
+
+        summary = self._sampler.summary(PROFILE_TOP_N) if self._sampler else "no samples"
+        folded = self._sampler.folded() if self._sampler else ""
+        return f"{header}\n{summary}", folded.encode("utf-8"), f"profile-{self._target}-{stamp}.folded"
+
+    async def _finish(self, bot):
+        chat_id = self._chat_id
+        try:
+            summary, data, filename = self._build_report()
+        except Exception as e:
+            logging.exception(f"Failed to build profile report: {e}")
+            self.disarm()
+            return
+        self.disarm()
+
+        if bot is None or chat_id is None:
+            logging.info(f"Profile report:\n{summary}")
+            return
+        try:
+            # Telegram 单条消息上限 4096
+            text = summary if len(summary) <= 3900 else summary[:3900] + "\n..."
+            await bot.send_message(chat_id=chat_id, text=f"```\n{text}\n```", parse_mode="Markdown")
+            await bot.send_document(chat_id=chat_id, document=data, filename=filename)
+        except Exception as e:
+            logging.error(f"Failed to send profile report to {chat_id}: {e}")
+
+
+profiler = Profiler()
@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import (
+    PROMPTS_DIR,
+    DEFAULT_PROMPT,
+    COMMAND_PROMPTS,
+    PROMPT_RELOAD_INTERVAL,
+    PROMPT_CACHE_MODEL_PREFIXES,
+)
+
+FALLBACK_PROMPT = "You are a crypto analyst. Reply JSON."
+
+
+class PromptTemplate:
+    """A loaded prompt file with its content hash used as version."""
+
+    __slots__ = ("name", "path", "content", "version", "mtime")
+
+    def __init__(self, name: str, path: Path, content: str, mtime: float):
+        self.name = name
+        self.path = path
+        self.content = content
+        self.version = hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+        self.mtime = mtime
+
+
+class PromptRegistry:
+    """
+    Registry of system prompts loaded from `prompts/*.md`.
+    Files are re-read when their mtime changes (checked at most every PROMPT_RELOAD_INTERVAL seconds),
+    and compiled system messages are cached per (prompt version, cacheable).
+    Reloads run under a lock and publish fresh dicts, so callers on worker threads
+    (ai_service runs completions via asyncio.to_thread) and on the event loop can read concurrently.
+    """
+
+    def __init__(self, prompts_dir=PROMPTS_DIR, reload_interval: float = PROMPT_RELOAD_INTERVAL):
+        self.prompts_dir = Path(prompts_dir)
+        self.reload_interval = reload_interval
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._last_check = 0.0
+        self._compiled: Dict[Tuple[str, str, bool], Dict[str, Any]] = {}
+        self._lock = threading.Lock()  # serializes reloads and writes to _compiled
+
+    # ================== 加载 / 热更新 ==================
+
+    def _scan(self):
+        """Reload changed files, pick up new ones and drop deleted ones. Caller holds self._lock."""
+        old = self._templates
+        templates = {}
+        try:
+            paths = sorted(self.prompts_dir.glob("*.md"))
+        except OSError as e:
+            logging.error(f"Failed to list prompts dir {self.prompts_dir}: {e}")
+            return
+
+        for path in paths:
+            name = path.stem
+            cached = old.get(name)
+            try:
+                mtime = path.stat().st_mtime
+            except OSError:
+                if cached:
+                    templates[name] = cached
+                continue
+            if cached and cached.mtime == mtime:
+                templates[name] = cached
+                continue
+            try:
+                content = path.read_text(encoding="utf-8")
+            except Exception as e:
+                logging.error(f"Failed to read prompt file {path}: {e}")
+                if cached:
+                    templates[name] = cached
+                continue
+            template = PromptTemplate(name, path, content, mtime)
+            if cached and cached.version != template.version:
+                logging.info(f"Prompt '{name}' reloaded: {cached.version} -> {template.version}")
+            templates[name] = template
+
+        for name in old:
+            if name not in templates:
+                logging.info(f"Prompt '{name}' removed")
+
+        # 丢弃已失效版本的编译缓存; 新字典整体替换, 读者不会遇到迭代中被修改
+        live = {(t.name, t.version) for t in templates.values()}
+        self._compiled = {key: msg for key, msg in self._compiled.items() if (key[0], key[1]) in live}
+        self._templates = templates
+
+    def _due(self, now: float) -> bool:
+        return not self._templates or now - self._last_check >= self.reload_interval
+
+    def refresh(self, force: bool = False):
+        if not force and not self._due(time.monotonic()):
+            return
+        with self._lock:
+            # 另一个线程可能刚刚完成了同一次重载
+            now = time.monotonic()
+            if force or self._due(now):
+                self._last_check = now
+                self._scan()
+
+    # ================== 查询 ==================
+
+    def names(self) -> List[str]:
+        self.refresh()
+        return sorted(self._templates)
+
+    def get(self, name: str) -> Optional[PromptTemplate]:
+        self.refresh()
+        return self._templates.get(name)
+
+    def versions(self) -> Dict[str, str]:
+        self.refresh()
+        return {name: t.version for name, t in self._templates.items()}
+
+    # ================== 选择 ==================
+
+    def set_user_prompt(self, user_id, name: Optional[str]) -> bool:
+        """Select a prompt for a user; None resets to default. Returns False if name is unknown."""
+        from services import storage  # 延迟导入: 选择随存储后端持久化
+
+        if name is not None and self.get(name) is None:
+            return False
+        storage.set_user_prompt(user_id, name)
+        return True
+
+    def get_user_prompt(self, user_id) -> Optional[str]:
+        from services import storage
+
+        return storage.get_user_prompt(user_id)
+
+    def resolve(self, user_id=None, command: Optional[str] = None) -> Optional[PromptTemplate]:
+        """
+        Pick a prompt: user selection > per-command mapping > DEFAULT_PROMPT.
+        Unknown names fall through to the next candidate.
+        """
+        candidates = []
+        if user_id is not None:
+            candidates.append(self.get_user_prompt(user_id))
+        if command:
+            candidates.append(COMMAND_PROMPTS.get(command))
+        candidates.append(DEFAULT_PROMPT)
+
+        for name in candidates:
+            if not name:
+                continue
+            template = self.get(name)
+            if template is not None:
+                return template
+        return None
+
+    # ================== 编译 ==================
+
+    @staticmethod
+    def supports_prompt_cache(model: Optional[str]) -> bool:
+        """Models that need an explicit `cache_control` breakpoint on OpenRouter."""
+        if not model:
+            return False
+        return any(model.startswith(p) for p in PROMPT_CACHE_MODEL_PREFIXES)
+
+    def system_message(self, model: Optional[str] = None, user_id=None, command: Optional[str] = None):
+        """
+        Return (message_dict, template) for the chat completion `system` role.
+        For cache-capable models the prompt is sent as a content part with an ephemeral
+        cache_control breakpoint so the static prefix is reused across calls.
+        """
+        template = self.resolve(user_id=user_id, command=command)
+        if template is None:
+            return {"role": "system", "content": FALLBACK_PROMPT}, None
+
+        cacheable = self.supports_prompt_cache(model)
+        key = (template.name, template.version, cacheable)
+        message = self._compiled.get(key)
+        if message is None:
+            if cacheable:
+                content = [{"type": "text", "text": template.content, "cache_control": {"type": "ephemeral"}}]
+            else:
+                content = template.content
+            message = {"role": "system", "content": content}
+            with self._lock:
+                self._compiled[key] = message
+        return message, template
+
+
+prompt_registry = PromptRegistry()
@@ -0,0 +1,423 @@
+import ast
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+import numpy as np
+
+from config.settings import SCORING_RULES, RULES_RELOAD_INTERVAL
+
+
+class RuleError(ValueError):
+    """Invalid rule file or condition expression."""
+
+
+# ================== 表达式编译 ==================
+# 条件是受限的 Python 表达式 (只解析 AST, 不 eval):
+#   比较 / and / or / not / + - * / / 数字 / 特征名 / 参数名 / abs(x) min(a, b) max(a, b) prev(x[, n])
+# 参数名 (规则文件的 "params") 在编译时替换为常量, 调参时只需换参数重新编译
+# 编译结果是闭包 f(features) -> ndarray, 对最后一维 (K线) 逐元素计算, 所以一维 (单币) 和
+# 二维 (币种 x K线) 的特征都适用
+
+_BINOPS = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+_CMPOPS = {ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+           ast.Eq: np.equal, ast.NotEq: np.not_equal}
+_FUNCS = {"abs": (np.abs, 1), "min": (np.minimum, 2), "max": (np.maximum, 2)}
+
+
+def _shift(x, n: int):
+    """x shifted n bars later along the last axis, NaN-padded."""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if n < x.shape[-1]:
+        out[..., n:] = x[..., :x.shape[-1] - n]
+    return out
+
+
+class Expression:
+    """A compiled condition / value: call with a feature mapping."""
+
+    __slots__ = ("source", "names", "lookback", "_params", "_fn")
+
+    def __init__(self, source: str, params: Optional[Mapping[str, float]] = None):
+        self.source = source
+        self.names = set()
+        self.lookback = 0
+        self._params = params or {}
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as e:
+            raise RuleError(f"Bad expression {source!r}: {e.msg}") from None
+        self._fn = self._compile(tree.body, 0)
+
+    def __call__(self, features: Mapping[str, np.ndarray]) -> np.ndarray:
+        return self._fn(features)
+
+    def __repr__(self):
+        return f"Expression({self.source!r})"
+
+    def _compile(self, node, shift: int) -> Callable:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            value = node.value
+            return lambda f: value
+
+        if isinstance(node, ast.Name) and node.id in self._params:
+            value = self._params[node.id]
+            return lambda f: value
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            self.names.add(name)
+            self.lookback = max(self.lookback, shift)
+            if shift:
+                return lambda f: _shift(f[name], shift)
+            return lambda f: f[name]
+
+        if isinstance(node, ast.BoolOp):
+            parts = [self._compile(v, shift) for v in node.values]
+            op = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+
+            def bool_op(f):
+                out = parts[0](f)
+                for part in parts[1:]:
+                    out = op(out, part(f))
+                return out
+            return bool_op
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self._compile(node.operand, shift)
+            if isinstance(node.op, ast.Not):
+                return lambda f: np.logical_not(operand(f))
+            if isinstance(node.op, ast.USub):
+                return lambda f: np.negative(operand(f))
+            if isinstance(node.op, ast.UAdd):
+                return operand
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINOPS:
+            op = _BINOPS[type(node.op)]
+            left, right = self._compile(node.left, shift), self._compile(node.right, shift)
+
+            def bin_op(f):
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    return op(left(f), right(f))
+            return bin_op
+
+        if isinstance(node, ast.Compare) and all(type(o) in _CMPOPS for o in node.ops):
+            # a < b < c -> (a < b) and (b < c)
+            terms = [self._compile(n, shift) for n in [node.left] + node.comparators]
+            ops = [_CMPOPS[type(o)] for o in node.ops]
+
+            def compare(f):
+                values = [t(f) for t in terms]
+                out = ops[0](values[0], values[1])
+                for i in range(1, len(ops)):
+                    out = np.logical_and(out, ops[i](values[i], values[i + 1]))
+                return out
+            return compare
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            name, args = node.func.id, node.args
+            if name == "prev":
+                if not 1 <= len(args) <= 2:
+                    raise RuleError(f"prev() takes 1 or 2 arguments in {self.source!r}")
+                n = 1
+                if len(args) == 2:
+                    if not (isinstance(args[1], ast.Constant) and isinstance(args[1].value, int) and args[1].value >= 0):
+                        raise RuleError(f"prev() bar count must be a non-negative integer in {self.source!r}")
+                    n = args[1].value
+                return self._compile(args[0], shift + n)
+            if name in _FUNCS:
+                fn, arity = _FUNCS[name]
+                if len(args) != arity:
+                    raise RuleError(f"{name}() takes {arity} argument(s) in {self.source!r}")
+                compiled = [self._compile(a, shift) for a in args]
+                return lambda f: fn(*[c(f) for c in compiled])
+
+        raise RuleError(f"Unsupported syntax ({type(node).__name__}) in {self.source!r}")
+
+
+# ================== 规则集 ==================
+
+def _number(value, params, what: str):
+    """A literal number, or the name of a rule-set parameter."""
+    if isinstance(value, str):
+        if value not in params:
+            raise RuleError(f"{what} refers to unknown parameter {value!r}")
+        value = params[value]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RuleError(f"{what} must be a number or parameter name, got {value!r}")
+    return value
+
+
+class _Rule:
+    """{"when": expr, "score": n} or {"first": [rules]} (only the first matching rule scores)."""
+
+    __slots__ = ("when", "score", "first")
+
+    def __init__(self, spec, params):
+        self.first = None
+        self.when = None
+        self.score = 0
+        if "first" in spec:
+            self.first = [_Rule(s, params) for s in spec["first"]]
+            if any(r.first for r in self.first):
+                raise RuleError("Nested 'first' blocks are not supported")
+        else:
+            try:
+                self.when = Expression(str(spec["when"]), params)
+                self.score = int(_number(spec["score"], params, f"score of {spec['when']!r}"))
+            except KeyError as e:
+                raise RuleError(f"Rule {spec!r} is missing {e}") from None
+
+    def expressions(self):
+        return [r.when for r in self.first] if self.first else [self.when]
+
+    def points(self, f, shape) -> np.ndarray:
+        if self.first is None:
+            return np.where(np.broadcast_to(self.when(f), shape), self.score, 0)
+        out = np.zeros(shape, dtype=np.int64)
+        taken = np.zeros(shape, dtype=bool)
+        for rule in self.first:
+            hit = np.broadcast_to(rule.when(f), shape) & ~taken
+            out[hit] = rule.score
+            taken |= hit
+        return out
+
+
+class _Group:
+    __slots__ = ("name", "cap", "rules")
+
+    def __init__(self, spec, params):
+        self.name = spec["name"]
+        self.cap = _number(spec["cap"], params, f"cap of {self.name!r}") if spec.get("cap") is not None else None
+        self.rules = [_Rule(r, params) for r in spec.get("rules", [])]
+
+    def score(self, f, shape) -> np.ndarray:
+        total = np.zeros(shape, dtype=np.int64)
+        for rule in self.rules:
+            total += rule.points(f, shape)
+        return total if self.cap is None else np.minimum(total, self.cap)
+
+
+class _Side:
+    __slots__ = ("signal", "when", "groups")
+
+    def __init__(self, spec, params):
+        self.signal = spec["signal"]
+        self.when = Expression(str(spec["when"]), params) if spec.get("when") is not None else None
+        self.groups = [_Group(g, params) for g in spec.get("groups", [])]
+
+
+class RuleSet:
+    """
+    Scoring rules compiled to NumPy mask expressions.
+
+    - `trend`: ordered [{"when", "label"}]; the first match labels the bar, else `default_trend`
+    - `sides`: ordered [{"signal", "when", "groups"}]; the first matching side is the bar's signal
+      (the last side may omit `when`). Each group sums its rules' points and clips at `cap`.
+    - the total is the chosen side's group sum clipped at `max_score`
+    - `params`: named numbers usable in expressions, scores and caps; `params=` overrides them (parameter sweeps)
+    Every expression is evaluated once over all bars (and symbols, for 2-D features).
+    """
+
+    def __init__(self, spec: Dict[str, Any], source: str = "<dict>", params: Optional[Mapping[str, float]] = None):
+        self.source = source
+        self.spec = spec
+        try:
+            self.params = dict(spec.get("params") or {})
+            unknown = set(params or ()) - set(self.params)
+            if unknown:
+                raise RuleError(f"unknown parameter(s) {sorted(unknown)}")
+            self.params.update(params or {})
+            self.name = spec.get("name", "rules")
+            self.version = spec.get("version")
+            self.max_score = _number(spec["max_score"], self.params, "max_score") if spec.get("max_score") is not None else None
+            self.default_trend = spec.get("default_trend", "neutral")
+            self.trends = [(Expression(str(t["when"]), self.params), t["label"]) for t in spec.get("trend", [])]
+            self.sides = [_Side(s, self.params) for s in spec["sides"]]
+        except RuleError as e:
+            raise RuleError(f"{source}: {e}") from None
+        except (KeyError, TypeError, AttributeError) as e:
+            raise RuleError(f"{source}: malformed rule set ({e!r})") from None
+        if not self.sides:
+            raise RuleError(f"{source}: no sides defined")
+
+        exprs = [e for e, _ in self.trends]
+        for side in self.sides:
+            if side.when is not None:
+                exprs.append(side.when)
+            for group in side.groups:
+                for rule in group.rules:
+                    exprs.extend(rule.expressions())
+        self.names = set().union(*(e.names for e in exprs)) if exprs else set()
+        self.lookback = max((e.lookback for e in exprs), default=0)
+        self.signals = [s.signal for s in self.sides]
+        self.trend_labels = [label for _, label in self.trends] + [self.default_trend]
+
+    def __repr__(self):
+        return f"RuleSet({self.name!r}, version={self.version!r}, sides={self.signals})"
+
+    def with_params(self, params: Mapping[str, float]) -> "RuleSet":
+        """Recompile with some parameters replaced."""
+        return RuleSet(self.spec, self.source, {**self.params, **params})
+
+    def score(self, features: Mapping[str, np.ndarray]) -> "Scores":
+        """Score every bar; `features` maps the referenced names to equally shaped arrays."""
+        missing = [n for n in self.names if n not in features]
+        if missing:
+            raise RuleError(f"{self.source}: unknown feature(s) {sorted(missing)}")
+        shape = np.shape(features[next(iter(self.names))]) if self.names else (0,)
+
+        trend = np.full(shape, len(self.trends), dtype=np.int8)
+        for i in range(len(self.trends) - 1, -1, -1):
+            trend[np.broadcast_to(self.trends[i][0](features), shape)] = i
+
+        side = np.full(shape, -1, dtype=np.int8)
+        for i in range(len(self.sides) - 1, -1, -1):
+            when = self.sides[i].when
+            side[np.ones(shape, dtype=bool) if when is None else np.broadcast_to(when(features), shape)] = i
+
+        groups = [{g.name: g.score(features, shape) for g in s.groups} for s in self.sides]
+        total = np.zeros(shape, dtype=np.int64)
+        for i, side_groups in enumerate(groups):
+            if side_groups:
+                total = np.where(side == i, sum(side_groups.values()), total)
+        if self.max_score is not None:
+            total = np.minimum(total, self.max_score)
+        return Scores(self, total, side, trend, groups)
+
+    def score_at(self, features: Mapping[str, np.ndarray], index: int) -> Dict[str, Any]:
+        """Score one bar, evaluating only the `lookback` bars it needs."""
+        n = np.shape(features[next(iter(self.names))])[-1] if self.names else 0
+        if index < 0:
+            index += n
+        window = _Window(features, max(0, index - self.lookback), index + 1)
+        return self.score(window).at(-1)
+
+
+class _Window(Mapping):
+    """Lazy [..., start:stop] view over a feature mapping."""
+
+    def __init__(self, features, start, stop):
+        self._features, self._start, self._stop = features, start, stop
+
+    def __getitem__(self, name):
+        return np.asarray(self._features[name])[..., self._start:self._stop]
+
+    def __contains__(self, name):
+        return name in self._features
+
+    def __iter__(self):
+        return iter(self._features)
+
+    def __len__(self):
+        return len(self._features)
+
+
+class Scores:
+    """RuleSet.score() output: per-bar total, side / trend indices and per-side group scores."""
+
+    __slots__ = ("rules", "total", "side", "trend", "groups")
+
+    def __init__(self, rules: RuleSet, total, side, trend, groups):
+        self.rules = rules
+        self.total = total
+        self.side = side
+        self.trend = trend
+        self.groups = groups
+
+    def signal_mask(self, signal: str) -> np.ndarray:
+        return self.side == self.rules.signals.index(signal)
+
+    def at(self, index) -> Dict[str, Any]:
+        """One bar as ReversalModel.evaluate() reports it (index may be a tuple for 2-D scores)."""
+        side = int(self.side[index])
+        return {
+            "trend": self.rules.trend_labels[int(self.trend[index])],
+            "signal_type": self.rules.signals[side] if side >= 0 else "wait",
+            "total_score": int(self.total[index]),
+            "details": {name: int(v[index]) for name, v in self.groups[side].items()} if side >= 0 else {},
+        }
+
+
+def stack_features(frames: List[Mapping[str, np.ndarray]], names, positions: Optional[List[np.ndarray]] = None,
+                   width: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Per-symbol features -> (symbols, bars) arrays, NaN- (bool: False-) padded. Series are right-aligned, or placed at
+    `positions[i]` (the column of each bar, e.g. its slot on a shared time grid of `width` bars).
+    """
+    names = list(names)
+    if width is None:
+        if positions is not None:
+            width = max((int(p[-1]) + 1 for p in positions if len(p)), default=0)
+        else:
+            width = max(len(f[names[0]]) for f in frames) if frames and names else 0
+    out = {}
+    for name in names:
+        # 布尔特征 (背离标记) 用 False 补齐: NaN 在条件里会被当成 True
+        flag = bool(frames) and np.asarray(frames[0][name]).dtype == bool
+        block = np.zeros((len(frames), width), dtype=bool) if flag else np.full((len(frames), width), np.nan)
+        for i, f in enumerate(frames):
+            col = np.asarray(f[name], dtype=bool if flag else np.float64)
+            if not len(col):
+                continue
+            if positions is not None:
+                block[i, positions[i]] = col
+            else:
+                block[i, width - len(col):] = col
+        out[name] = block
+    return out
+
+
+# ================== 加载 / 热更新 ==================
+
+def parse_rules(text: str, source: str = "<string>") -> RuleSet:
+    """JSON, or YAML when the file is .yml/.yaml (needs PyYAML)."""
+    if source.endswith((".yml", ".yaml")):
+        try:
+            import yaml
+        except ImportError:
+            raise RuleError(f"{source}: YAML rules need PyYAML (pip install pyyaml) or use JSON") from None
+        spec = yaml.safe_load(text)
+    else:
+        try:
+            spec = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise RuleError(f"{source}: {e}") from None
+    if not isinstance(spec, dict):
+        raise RuleError(f"{source}: top level must be an object")
+    return RuleSet(spec, source)
+
+
+_cache: Dict[str, list] = {}  # path -> [mtime, RuleSet, last_check]
+
+
+def load_rules(path: Optional[str] = None) -> RuleSet:
+    """
+    Load (and cache) a rule file. The file is re-read when its mtime changes, checked at most every
+    RULES_RELOAD_INTERVAL seconds; a broken edit is logged and the previous version keeps scoring.
+    """
+    path = os.path.abspath(path or SCORING_RULES)
+    entry = _cache.get(path)
+    now = time.monotonic()
+    if entry is not None and now - entry[2] < RULES_RELOAD_INTERVAL:
+        return entry[1]
+    try:
+        mtime = os.stat(path).st_mtime
+        if entry is not None and entry[0] == mtime:
+            entry[2] = now
+            return entry[1]
+        with open(path, encoding="utf-8") as fh:
+            rules = parse_rules(fh.read(), path)
+    except (OSError, RuleError) as e:
+        if entry is None:
+            raise
+        logging.error(f"Failed to reload scoring rules, keeping {entry[1]!r}: {e}")
+        entry[2] = now
+        return entry[1]
+    if entry is not None:
+        logging.info(f"Scoring rules reloaded: {rules!r}")
+    _cache[path] = [mtime, rules, now]
+    return rules
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from config.settings import (
+    COMPUTE_WORKERS,
+    SCAN_MAX_SYMBOLS,
+    SCAN_CONCURRENCY,
+    SCAN_CACHE_SIZE,
+)
+from services.bars import INTERVAL_SECONDS
+from services.compute import run_job, pack_bars, score_batch
+
+_results: "OrderedDict[Tuple, dict]" = OrderedDict()
+_inflight: Dict[Tuple, asyncio.Task] = {}
+
+
+def current_bar(interval: str, now: float = None) -> int:
+    """Open time (unix seconds) of the bar currently forming on `interval`."""
+    step = INTERVAL_SECONDS[interval]
+    now = time.time() if now is None else now
+    return int(now // step) * step
+
+
+async def _fetch_frames(fetcher, symbols: List[str], interval: str, snap):
+    """
+    Klines per symbol through bar_cache (one request per cold symbol, only new bars when warm); funding comes
+    from the bulk snapshot. OI / long-short history is skipped: it costs three more rate-limited requests per
+    symbol, so those rule groups score zero here and only /ai and the monitor use them.
+    """
+    sem = asyncio.Semaphore(SCAN_CONCURRENCY)
+
+    async def one(sym):
+        async with sem:
+            try:
+                df = await fetcher.get_bars(sym, interval)
+            except Exception as e:
+                logging.warning(f"[{sym} {interval}] scan fetch failed: {e}")
+                return sym, None
+        if df is None or len(df) < 2:
+            return sym, None
+        df = df.copy()
+        df['funding'] = snap.premium.get(sym, {}).get('funding_rate', 0.0)
+        df['oi'] = np.nan
+        df['long_ratio'] = np.nan
+        return sym, df
+
+    results = await asyncio.gather(*(one(s) for s in symbols))
+    return [(sym, df) for sym, df in results if df is not None]
+
+
+async def _run_scan(interval: str, with_patterns: bool) -> dict:
+    from services.data_fetcher import DataFetcher
+
+    started = time.perf_counter()
+    fetcher = DataFetcher()
+    symbols, snap = await asyncio.gather(fetcher.get_perpetual_symbols(), fetcher.refresh_snapshot())
+
+    # 只扫描成交额最高的 SCAN_MAX_SYMBOLS 个, 控制请求量 (futures/data 接口限频较严)
+    symbols.sort(key=lambda s: snap.ticker.get(s, {}).get("quote_volume", 0.0), reverse=True)
+    universe = len(symbols)
+    symbols = symbols[:SCAN_MAX_SYMBOLS]
+
+    frames = await _fetch_frames(fetcher, symbols, interval, snap)
+    fetched = time.perf_counter()
+
+    # 按 worker 数切块, 每块一次提交, 减少进程间往返
+    items = [(sym, pack_bars(df)) for sym, df in frames]
+    chunk = max(1, -(-len(items) // max(1, COMPUTE_WORKERS)))
+    batches = await asyncio.gather(*(
+        run_job("scan", score_batch, items[i:i + chunk], with_patterns) for i in range(0, len(items), chunk)
+    ))
+
+    rows = []
+    for batch in batches:
+        for sym, result, pattern in batch:
+            ticker = snap.ticker.get(sym, {})
+            rows.append({
+                "symbol": sym,
+                "score": result["total_score"],
+                "signal_type": result["signal_type"],
+                "trend": result["trend"],
+                "rsi": float(result["rsi"]),
+                "price": float(result["price"]),
+                "change_24h": ticker.get("price_change_pct"),
+                "pattern": pattern,
+            })
+    rows.sort(key=lambda r: r["score"], reverse=True)
+
+    return {
+        "rows": rows,
+        "universe": universe,
+        "scanned": len(symbols),
+        "scored": len(rows),
+        "fetch_seconds": fetched - started,
+        "total_seconds": time.perf_counter() - started,
+    }
+
+
+async def scan_universe(interval: str, with_patterns: bool = False) -> dict:
+    """
+    Rank liquid USDT-M perpetuals by ReversalModel score on `interval`.
+    Results are cached per (interval, current bar); concurrent scans of the same bar share one run.
+    Returned dict has 'rows' (sorted by score) plus scan stats and a 'cached' flag.
+    """
+    key = (interval, current_bar(interval), with_patterns)
+    cached = _results.get(key)
+    if cached is not None:
+        _results.move_to_end(key)
+        return {**cached, "cached": True}
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_run_scan(interval, with_patterns))
+        _inflight[key] = task
+        try:
+            result = await task
+        finally:
+            _inflight.pop(key, None)
+        _results[key] = result
+        while len(_results) > SCAN_CACHE_SIZE:
+            _results.popitem(last=False)
+        return {**result, "cached": False}
+
+    return {**(await task), "cached": True}
@@ -0,0 +1,250 @@
+"""
+Shared-memory columnar kline store.
+
+One ingest process (the bot) publishes klines for popular symbols into one POSIX shared memory segment
+per (symbol, interval); monitor shard workers and other processes read them as NumPy views instead of
+downloading their own copies.
+
+Segment layout (all little-endian 8-byte slots):
+    header  int64[8]                magic, layout, seq, n_rows, capacity, updated_ns, last_open_ns, reserved
+    times   int64[2, capacity]      open_time, close_time (ns since epoch)
+    values  float64[9, capacity]    VALUE_COLUMNS
+
+`seq` is a seqlock: odd while the writer is mid-update, bumped to the next even value when done.
+Readers never lock; they compare seq before/after copying and retry on a change.
+"""
+import asyncio
+import logging
+import time
+from multiprocessing import shared_memory
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from config.settings import BARS_TTL, SHM_SYMBOLS, SHM_ROWS, KLINE_LIMIT
+
+MAGIC = 0x41495342  # "AISB"
+LAYOUT = 1
+VALUE_COLUMNS = (
+    "open", "high", "low", "close", "volume", "quote_asset_volume", "number_of_trades",
+    "taker_buy_base_asset_volume", "taker_buy_quote_asset_volume",
+)
+_HEADER = 8
+_MAGIC, _LAYOUT, _SEQ, _N_ROWS, _CAPACITY, _UPDATED, _LAST_OPEN = range(7)
+MAX_AGE = 2 * BARS_TTL  # older snapshots are ignored by readers (ingest stalled)
+
+
+def segment_name(symbol: str, interval: str) -> str:
+    return f"aisb-{symbol.lower()}-{interval}"
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach without registering with the resource tracker (it would unlink the segment when a reader exits)."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        from multiprocessing import resource_tracker
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class _Segment:
+    def __init__(self, shm: shared_memory.SharedMemory, capacity: int):
+        self.shm = shm
+        self.capacity = capacity
+        buf = shm.buf
+        self.header = np.ndarray((_HEADER,), dtype=np.int64, buffer=buf)
+        offset = _HEADER * 8
+        self.times = np.ndarray((2, capacity), dtype=np.int64, buffer=buf, offset=offset)
+        offset += 2 * capacity * 8
+        self.values = np.ndarray((len(VALUE_COLUMNS), capacity), dtype=np.float64, buffer=buf, offset=offset)
+
+    @staticmethod
+    def size(capacity: int) -> int:
+        return (_HEADER + (2 + len(VALUE_COLUMNS)) * capacity) * 8
+
+    def close(self):
+        # numpy views must be released before the mmap can close
+        self.header = self.times = self.values = None
+        self.shm.close()
+
+
+# ================== 写入 (ingest 进程) ==================
+
+class BarStoreWriter:
+    def __init__(self, symbol: str, interval: str, capacity: int = SHM_ROWS):
+        self.name = segment_name(symbol, interval)
+        try:
+            shm = shared_memory.SharedMemory(name=self.name, create=True, size=_Segment.size(capacity))
+        except FileExistsError:
+            # 上次运行遗留 (或容量变了): 重建
+            stale = shared_memory.SharedMemory(name=self.name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=self.name, create=True, size=_Segment.size(capacity))
+        self.seg = _Segment(shm, capacity)
+        self.seg.header[:] = 0
+        self.seg.header[_MAGIC] = MAGIC
+        self.seg.header[_LAYOUT] = LAYOUT
+        self.seg.header[_CAPACITY] = capacity
+
+    def write(self, df: pd.DataFrame):
+        """Publish the last `capacity` rows of a get_klines()-shaped frame."""
+        seg = self.seg
+        df = df.iloc[-seg.capacity:]
+        n = len(df)
+        header = seg.header
+        header[_SEQ] += 1  # odd: 写入中
+        try:
+            seg.times[0, :n] = df.index.to_numpy(dtype="datetime64[ns]").view(np.int64)
+            if "close_time" in df.columns:
+                seg.times[1, :n] = df["close_time"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+            for i, col in enumerate(VALUE_COLUMNS):
+                seg.values[i, :n] = df[col].to_numpy(dtype=np.float64) if col in df.columns else np.nan
+            header[_N_ROWS] = n
+            header[_UPDATED] = time.time_ns()
+            header[_LAST_OPEN] = seg.times[0, n - 1] if n else 0
+        finally:
+            header[_SEQ] += 1  # even: 可读
+
+    def close(self, unlink: bool = True):
+        shm = self.seg.shm
+        self.seg.close()
+        if unlink:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+# ================== 读取 (分析进程) ==================
+
+class BarStoreReader:
+    def __init__(self, symbol: str, interval: str, shm: shared_memory.SharedMemory = None):
+        # 同进程内的 writer 直接共享映射, 避免 resource tracker 重复注销
+        shm = shm or _attach(segment_name(symbol, interval))
+        header = np.ndarray((_HEADER,), dtype=np.int64, buffer=shm.buf)
+        if header[_MAGIC] != MAGIC or header[_LAYOUT] != LAYOUT:
+            del header
+            shm.close()
+            raise ValueError(f"{shm.name} is not a bar store segment (layout {LAYOUT})")
+        capacity = int(header[_CAPACITY])
+        del header
+        self.seg = _Segment(shm, capacity)
+
+    @property
+    def version(self) -> int:
+        """Seqlock counter; changes on every publish (odd while a write is in progress)."""
+        return int(self.seg.header[_SEQ])
+
+    @property
+    def last_open_ns(self) -> int:
+        return int(self.seg.header[_LAST_OPEN])
+
+    def age(self) -> float:
+        return time.time() - self.seg.header[_UPDATED] / 1e9
+
+    def view(self) -> Dict[str, np.ndarray]:
+        """
+        Zero-copy views of the current rows. The writer may overwrite them at any time:
+        check `version` before and after using them, or call read() for a consistent copy.
+        """
+        n = int(self.seg.header[_N_ROWS])
+        cols = {"open_time": self.seg.times[0, :n], "close_time": self.seg.times[1, :n]}
+        for i, col in enumerate(VALUE_COLUMNS):
+            cols[col] = self.seg.values[i, :n]
+        return cols
+
+    def read(self, retries: int = 100) -> Optional[Dict[str, np.ndarray]]:
+        """Consistent copy of all columns (seqlock retry), or None if the writer kept it busy."""
+        header = self.seg.header
+        for _ in range(retries):
+            before = int(header[_SEQ])
+            if before & 1:
+                time.sleep(0)
+                continue
+            cols = {k: v.copy() for k, v in self.view().items()}
+            if int(header[_SEQ]) == before:
+                return cols
+        return None
+
+    def to_frame(self, limit: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """get_klines()-shaped DataFrame (without the unused 'ignore' column)."""
+        cols = self.read()
+        if cols is None:
+            return None
+        if limit is not None:
+            cols = {k: v[-limit:] for k, v in cols.items()}
+        index = pd.DatetimeIndex(cols.pop("open_time").view("datetime64[ns]"), name="open_time")
+        cols["close_time"] = cols["close_time"].view("datetime64[ns]")
+        cols["number_of_trades"] = cols["number_of_trades"].astype(np.int64)
+        order = ("open", "high", "low", "close", "volume", "close_time") + VALUE_COLUMNS[5:]
+        return pd.DataFrame({c: cols[c] for c in order}, index=index)
+
+    def close(self):
+        self.seg.close()
+
+
+_readers: Dict[tuple, BarStoreReader] = {}
+_writers: Dict[tuple, BarStoreWriter] = {}
+
+
+def read_bars(symbol: str, interval: str, limit: int = KLINE_LIMIT) -> Optional[pd.DataFrame]:
+    """Klines from shared memory if another process publishes this pair and the data is fresh enough."""
+    key = (symbol, interval)
+    reader = _readers.get(key)
+    if reader is None:
+        writer = _writers.get(key)
+        try:
+            reader = _readers[key] = BarStoreReader(symbol, interval, writer.seg.shm if writer else None)
+        except (FileNotFoundError, ValueError):
+            return None
+    if reader.age() > MAX_AGE or int(reader.seg.header[_N_ROWS]) < limit:
+        return None
+    return reader.to_frame(limit)
+
+
+def publish(symbol: str, interval: str, df: pd.DataFrame):
+    key = (symbol, interval)
+    writer = _writers.get(key)
+    if writer is None:
+        writer = _writers[key] = BarStoreWriter(symbol, interval)
+    writer.write(df)
+
+
+def close_all():
+    """Detach from everything this process read and unlink everything it published."""
+    for reader in _readers.values():
+        reader.close()
+    _readers.clear()
+    for writer in _writers.values():
+        writer.close(unlink=True)
+    _writers.clear()
+
+
+async def ingest_loop():
+    """
+    Keep SHM_SYMBOLS published on every watched interval, refreshing every BARS_TTL seconds.
+    Runs in the bot process; fetches go through the bar cache so they share its windows.
+    """
+    from services.bars import bar_cache
+    from services.data_fetcher import DataFetcher
+    from services.storage import get_all_unique_pairs
+
+    fetcher = DataFetcher()
+    while True:
+        intervals = {interval for _, interval in get_all_unique_pairs()} or {"1h"}
+        for symbol in SHM_SYMBOLS:
+            for interval in sorted(intervals):
+                try:
+                    df = await bar_cache.get(fetcher, symbol, interval, SHM_ROWS)
+                    if df is not None and len(df):
+                        publish(symbol, interval, df)
+                except Exception as e:
+                    logging.warning(f"[{symbol} {interval}] shared bar ingest failed: {e}")
+        await asyncio.sleep(BARS_TTL)
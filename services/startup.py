@@ -0,0 +1,58 @@
+import asyncio
+import importlib
+import logging
+import sys
+import time
+from typing import Dict
+
+# 按依赖顺序排列: 先 pandas 系, 再 openai, 最后 matplotlib 系
+HEAVY_MODULES = (
+    "services.data_fetcher",
+    "services.data_processor",
+    "services.model",
+    "services.patterns",
+    "services.ai_service",
+    "openai",
+    "services.notification",
+)
+
+PROCESS_START = time.perf_counter()
+_import_times: Dict[str, float] = {}
+
+
+def mark(stage: str):
+    """Record a startup milestone (seconds since this module was first imported)."""
+    _import_times[stage] = time.perf_counter() - PROCESS_START
+    logging.info(f"Startup: {stage} at {_import_times[stage] * 1000:.0f} ms")
+
+
+def _import(name: str) -> float:
+    if name in sys.modules:
+        return 0.0
+    start = time.perf_counter()
+    importlib.import_module(name)
+    return time.perf_counter() - start
+
+
+async def prewarm(modules=HEAVY_MODULES):
+    """Import heavy modules off the event loop so the first /ai or monitor cycle doesn't pay for them."""
+    total = time.perf_counter()
+    for name in modules:
+        try:
+            _import_times[name] = await asyncio.to_thread(_import, name)
+        except Exception as e:
+            logging.error(f"Prewarm import of {name} failed: {e}")
+    _import_times["prewarm"] = time.perf_counter() - total
+
+    from services.charting import warmup_chart_pool
+    from services.compute import warmup_compute_pool
+    warmup_chart_pool()
+    warmup_compute_pool()
+    logging.info("Startup report:\n" + import_report())
+
+
+def import_report() -> str:
+    lines = []
+    for name, seconds in _import_times.items():
+        lines.append(f"  {seconds * 1000:8.1f} ms  {name}")
+    return "\n".join(lines)
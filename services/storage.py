@@ -1,44 +1,104 @@
-import json
-import os
-from config.settings import DATA_FILE, ALLOWED_USER_IDS
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import STORAGE_BACKEND, DB_FILE
+from services.storage_backends import create_backend
 
 # Global variable: {user_id: {symbol: interval}}
 user_watchlists = {}
 user_risk_settings = {}
+# {user_id: prompt name} chosen via /prompt
+user_prompts = {}
+
+_backend = create_backend(STORAGE_BACKEND, DB_FILE)
+# Single I/O thread: keeps writes ordered and the sqlite connection on one thread
+_io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+
+# Inverted index: {(symbol, interval): set(user_ids)}
+# The key set doubles as the ref-counted unique pair set (refcount == len(watchers)).
+_watchers = {}
+_pairs_version = 0
+_pairs_snapshot = (None, frozenset())
+
+
+def _uid_value(uid):
+    return int(uid) if uid.isdigit() else uid
+
+
+def _index_add(uid, symbol, interval):
+    global _pairs_version
+    pair = (symbol, interval)
+    users = _watchers.get(pair)
+    if users is None:
+        users = _watchers[pair] = set()
+        _pairs_version += 1
+    users.add(_uid_value(uid))
+
+
+def _index_remove(uid, symbol, interval):
+    global _pairs_version
+    pair = (symbol, interval)
+    users = _watchers.get(pair)
+    if users is None:
+        return
+    users.discard(_uid_value(uid))
+    if not users:
+        del _watchers[pair]
+        _pairs_version += 1
+
+
+def _rebuild_index():
+    global _pairs_version
+    _watchers.clear()
+    for uid, watchlist in user_watchlists.items():
+        for sym, interval in watchlist.items():
+            _index_add(uid, sym, interval)
+    _pairs_version += 1
+
+def _submit(method, *args):
+    """Run a backend call on the storage I/O thread (ordered, never blocks the event loop)."""
+    future = _io.submit(getattr(_backend, method), *args)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def _log_failure(future):
+    exc = future.exception()
+    if exc is not None:
+        logging.error(f"Storage write failed: {exc}")
+
 
 def load_data():
-    global user_watchlists
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-                # Migration logic: Check if data is in old format (flat dict)
-                # Old format: {"BTCUSDT": "1h", ...}
-                # New format: {"123456": {"BTCUSDT": "1h"}, ...}
-                if data and isinstance(data, dict):
-                    first_key = next(iter(data)) if data else None
-                    first_val = data[first_key] if first_key else None
-                    
-                    # If value is string, it's the old format (symbol -> interval)
-                    if isinstance(first_val, str):
-                        print("Detected legacy watchlist format. Migrating...")
-                        default_user = ALLOWED_USER_IDS[0] if ALLOWED_USER_IDS else "unknown_user"
-                        user_watchlists[str(default_user)] = data
-                        save_data() # Save immediately in new format
-                    else:
-                        # New format
-                        user_watchlists.update(data)
-                        
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Error loading data: {e}")
+    """Load watchlists, risk settings and prompt selections from the configured backend."""
+    try:
+        data = _io.submit(_backend.load).result()
+    except Exception as e:
+        print(f"Error loading data: {e}")
+        data = {"watchlists": {}, "risk": {}, "prompts": {}}
+
+    user_watchlists.clear()
+    user_watchlists.update({uid: dict(wl) for uid, wl in data["watchlists"].items()})
+    user_risk_settings.clear()
+    user_risk_settings.update({_uid_value(str(uid)): v for uid, v in data["risk"].items()})
+    user_prompts.clear()
+    user_prompts.update({str(uid): name for uid, name in data.get("prompts", {}).items()})
+    _rebuild_index()
 
 def save_data():
-    try:
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(user_watchlists, f, indent=2)
-    except IOError as e:
-        print(f"Error saving data: {e}")
+    """Persist a full snapshot of all watchlists."""
+    _submit("replace_watchlists", {uid: dict(wl) for uid, wl in user_watchlists.items()})
+
+async def flush_storage():
+    """Wait until every queued write has reached the backend and force pending snapshots to disk."""
+    await asyncio.get_running_loop().run_in_executor(_io, _backend.flush)
+
+def close_storage():
+    _io.submit(_backend.close).result()
+    _io.shutdown(wait=True)
+
+def storage_queue_depth():
+    return _io._work_queue.qsize()
 
 def get_user_watchlist(user_id):
     uid = str(user_id)
@@ -50,36 +110,70 @@ def add_to_watchlist(user_id, symbol, interval):
     uid = str(user_id)
     if uid not in user_watchlists:
         user_watchlists[uid] = {}
+    previous = user_watchlists[uid].get(symbol)
+    if previous is not None:
+        _index_remove(uid, symbol, previous)
     user_watchlists[uid][symbol] = interval
-    save_data()
+    _index_add(uid, symbol, interval)
+    _submit("upsert_watch", uid, symbol, interval)
 
 def remove_from_watchlist(user_id, symbol):
     uid = str(user_id)
     if uid in user_watchlists and symbol in user_watchlists[uid]:
-        del user_watchlists[uid][symbol]
-        save_data()
+        interval = user_watchlists[uid].pop(symbol)
+        _index_remove(uid, symbol, interval)
+        _submit("delete_watch", uid, symbol)
 
 def clear_user_watchlist(user_id):
     uid = str(user_id)
     if uid in user_watchlists:
+        for sym, interval in user_watchlists[uid].items():
+            _index_remove(uid, sym, interval)
         user_watchlists[uid] = {}
-        save_data()
+        _submit("clear_watchlist", uid)
 
 def get_all_unique_pairs():
-    """Return a set of (symbol, interval) tuples from all users."""
-    pairs = set()
-    for uid, watchlist in user_watchlists.items():
-        for sym, interval in watchlist.items():
-            pairs.add((sym, interval))
+    """Return a frozenset of (symbol, interval) tuples from all users (cached until pairs change)."""
+    global _pairs_snapshot
+    version, pairs = _pairs_snapshot
+    if version != _pairs_version:
+        pairs = frozenset(_watchers)
+        _pairs_snapshot = (_pairs_version, pairs)
     return pairs
 
+def get_pairs_version():
+    """Monotonic counter bumped whenever a pair is added to or removed from the unique set."""
+    return _pairs_version
+
+def diff_pairs(previous):
+    """
+    Compare a previous get_all_unique_pairs() snapshot with the current one.
+    Returns (added, removed) sets, e.g. for stream subscription changes.
+    """
+    current = get_all_unique_pairs()
+    return current - previous, previous - current
+
 def get_users_watching(symbol, interval):
     """Return list of user_ids watching this specific pair."""
-    users = []
-    for uid, watchlist in user_watchlists.items():
-        if watchlist.get(symbol) == interval:
-            users.append(int(uid) if uid.isdigit() else uid)
-    return users
+    return list(_watchers.get((symbol, interval), ()))
 
 def get_user_risk_settings():
     return user_risk_settings
+
+def set_user_risk_settings(user_id, balance, risk):
+    settings = {'balance': balance, 'risk': risk}
+    user_risk_settings[user_id] = settings
+    _submit("upsert_risk", str(user_id), dict(settings))
+    return settings
+
+def get_user_prompt(user_id):
+    return user_prompts.get(str(user_id))
+
+def set_user_prompt(user_id, name):
+    """Persist a user's /prompt selection; None resets to the default."""
+    uid = str(user_id)
+    if name is None:
+        user_prompts.pop(uid, None)
+    else:
+        user_prompts[uid] = name
+    _submit("set_user_prompt", uid, name)
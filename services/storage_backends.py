@@ -0,0 +1,365 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from config.settings import DATA_FILE, STATE_FILE, ALLOWED_USER_IDS, STORAGE_FLUSH_DELAY
+from utils.files import atomic_write_json
+
+
+class JsonBackend:
+    """
+    Legacy file backend with write-behind.
+    Watchlists live in DATA_FILE ({user_id: {symbol: interval}}); risk settings and per-user
+    prompt selections in STATE_FILE. Mutations only mark the mirror dirty;
+    snapshots are written at most once per `flush_delay` seconds (or on flush()/close()) from a timer thread.
+    """
+
+    name = "json"
+
+    def __init__(self, data_file=DATA_FILE, state_file=STATE_FILE, flush_delay=STORAGE_FLUSH_DELAY):
+        self.data_file = data_file
+        self.state_file = state_file
+        self.flush_delay = flush_delay
+        self._watchlists = {}
+        self._risk = {}
+        self._prompts = {}
+        self._lock = threading.RLock()       # guards the mirror + dirty flags
+        self._write_lock = threading.Lock()  # serializes file writes
+        self._dirty_watchlists = False
+        self._dirty_state = False
+        self._timer = None
+        self._snapshot_seq = 0  # bumped per snapshot (under _lock)
+        self._written_seq = {}  # file -> seq of the snapshot on disk (under _write_lock)
+
+    # ================== 读取 ==================
+
+    def _read_watchlists(self):
+        """Read DATA_FILE, migrating the old flat {symbol: interval} format."""
+        if not os.path.exists(self.data_file):
+            return {}, False
+        try:
+            with open(self.data_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Error loading data: {e}")
+            return {}, False
+
+        if not data or not isinstance(data, dict):
+            return {}, False
+
+        # Migration logic: Check if data is in old format (flat dict)
+        # Old format: {"BTCUSDT": "1h", ...}
+        # New format: {"123456": {"BTCUSDT": "1h"}, ...}
+        first_key = next(iter(data))
+        if isinstance(data[first_key], str):
+            print("Detected legacy watchlist format. Migrating...")
+            default_user = ALLOWED_USER_IDS[0] if ALLOWED_USER_IDS else "unknown_user"
+            return {str(default_user): data}, True
+        return data, False
+
+    def _read_state(self):
+        """Return (risk, prompts) from STATE_FILE."""
+        if not os.path.exists(self.state_file):
+            return {}, {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Error loading state: {e}")
+            return {}, {}
+        return state.get("risk", {}), state.get("prompts", {})
+
+    def load(self):
+        watchlists, migrated = self._read_watchlists()
+        risk, prompts = self._read_state()
+        self._watchlists = {uid: dict(wl) for uid, wl in watchlists.items()}
+        self._risk = dict(risk)
+        self._prompts = dict(prompts)
+        if migrated:
+            self._mark_dirty(watchlists=True)
+            self.flush()  # Save immediately in new format
+        return {
+            "watchlists": watchlists,
+            "risk": risk,
+            "prompts": prompts,
+        }
+
+    # ================== 写入 ==================
+
+    def _mark_dirty(self, watchlists=False, state=False):
+        """Caller holds self._lock; starts the debounce timer if none is pending."""
+        self._dirty_watchlists |= watchlists
+        self._dirty_state |= state
+        if self.flush_delay <= 0:
+            self.flush()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write dirty snapshots now."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            data_text = json.dumps(self._watchlists, indent=2) if self._dirty_watchlists else None
+            state_text = (
+                json.dumps({"risk": self._risk, "prompts": self._prompts}, indent=2)
+                if self._dirty_state else None
+            )
+            self._dirty_watchlists = False
+            self._dirty_state = False
+            self._snapshot_seq += 1
+            seq = self._snapshot_seq
+
+        # 快照与写入之间可能有另一个 flush (定时器 / 关闭) 写入了更新的快照: 旧快照不得覆盖它
+        with self._write_lock:
+            for path, text, what in ((self.data_file, data_text, "data"), (self.state_file, state_text, "state")):
+                if text is None or self._written_seq.get(path, 0) > seq:
+                    continue
+                try:
+                    atomic_write_json(path, text)
+                    self._written_seq[path] = seq
+                except OSError as e:
+                    print(f"Error saving {what}: {e}")
+
+    def upsert_watch(self, uid, symbol, interval):
+        with self._lock:
+            self._watchlists.setdefault(uid, {})[symbol] = interval
+            self._mark_dirty(watchlists=True)
+
+    def delete_watch(self, uid, symbol):
+        with self._lock:
+            self._watchlists.get(uid, {}).pop(symbol, None)
+            self._mark_dirty(watchlists=True)
+
+    def clear_watchlist(self, uid):
+        with self._lock:
+            self._watchlists[uid] = {}
+            self._mark_dirty(watchlists=True)
+
+    def replace_watchlists(self, watchlists):
+        with self._lock:
+            self._watchlists = {uid: dict(wl) for uid, wl in watchlists.items()}
+            self._mark_dirty(watchlists=True)
+
+    def upsert_risk(self, uid, settings):
+        with self._lock:
+            self._risk[uid] = dict(settings)
+            self._mark_dirty(state=True)
+
+    def set_user_prompt(self, uid, name):
+        """Store a user's prompt selection; None clears it."""
+        with self._lock:
+            if name is None:
+                self._prompts.pop(uid, None)
+            else:
+                self._prompts[uid] = name
+            self._mark_dirty(state=True)
+
+    def close(self):
+        self.flush()
+
+
+class SqliteBackend:
+    """
+    SQLite backend (WAL mode) with row-level upserts.
+    Schema is versioned with PRAGMA user_version; a fresh database imports the
+    legacy JSON files inside the same transaction as the schema migration.
+    Not thread-safe: storage.py drives it from a single I/O thread.
+    """
+
+    name = "sqlite"
+
+    MIGRATIONS = [
+        # v1
+        """
+        CREATE TABLE IF NOT EXISTS watchlist (
+            user_id  TEXT NOT NULL,
+            symbol   TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (user_id, symbol)
+        );
+        CREATE INDEX IF NOT EXISTS idx_watchlist_pair ON watchlist (symbol, interval);
+        CREATE TABLE IF NOT EXISTS risk_settings (
+            user_id  TEXT PRIMARY KEY,
+            balance  REAL NOT NULL,
+            risk     REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        """,
+        # v2
+        """
+        CREATE TABLE IF NOT EXISTS user_prompts (
+            user_id  TEXT PRIMARY KEY,
+            name     TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        """,
+    ]
+
+    def __init__(self, db_file, legacy_data_file=DATA_FILE, legacy_state_file=STATE_FILE):
+        self.db_file = db_file
+        self.legacy_data_file = legacy_data_file
+        self.legacy_state_file = legacy_state_file
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.db_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # isolation_level=None: explicit BEGIN/COMMIT via _tx()
+            self._conn = sqlite3.connect(self.db_file, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+        return self._conn
+
+    def _tx(self, statements):
+        """Run [(sql, params), ...] atomically."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in statements:
+                conn.execute(sql, params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ================== 迁移 ==================
+
+    def _migrate(self):
+        conn = self._connect()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= len(self.MIGRATIONS):
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for target in range(version, len(self.MIGRATIONS)):
+                for statement in self.MIGRATIONS[target].split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+            if version == 0:
+                self._import_legacy_json(conn)
+            conn.execute(f"PRAGMA user_version = {len(self.MIGRATIONS)}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logging.info(f"SQLite storage migrated from v{version} to v{len(self.MIGRATIONS)}")
+
+    def _import_legacy_json(self, conn):
+        legacy = JsonBackend(self.legacy_data_file, self.legacy_state_file)
+        if not (os.path.exists(self.legacy_data_file) or os.path.exists(self.legacy_state_file)):
+            return
+        watchlists, _ = legacy._read_watchlists()
+        risk, prompts = legacy._read_state()
+        now = time.time()
+        count = 0
+        for uid, watchlist in watchlists.items():
+            for symbol, interval in watchlist.items():
+                conn.execute(
+                    "INSERT OR REPLACE INTO watchlist (user_id, symbol, interval, updated_at) VALUES (?, ?, ?, ?)",
+                    (str(uid), symbol, interval, now),
+                )
+                count += 1
+        for uid, settings in risk.items():
+            conn.execute(
+                "INSERT OR REPLACE INTO risk_settings (user_id, balance, risk, updated_at) VALUES (?, ?, ?, ?)",
+                (str(uid), float(settings['balance']), float(settings['risk']), now),
+            )
+        for uid, name in prompts.items():
+            conn.execute(
+                "INSERT OR REPLACE INTO user_prompts (user_id, name, updated_at) VALUES (?, ?, ?)",
+                (str(uid), name, now),
+            )
+        logging.info(f"Imported {count} watchlist entries from {self.legacy_data_file}")
+
+    # ================== 读取 ==================
+
+    def load(self):
+        self._migrate()
+        conn = self._connect()
+
+        watchlists = {}
+        for uid, symbol, interval in conn.execute("SELECT user_id, symbol, interval FROM watchlist ORDER BY rowid"):
+            watchlists.setdefault(uid, {})[symbol] = interval
+
+        risk = {
+            uid: {'balance': balance, 'risk': risk}
+            for uid, balance, risk in conn.execute("SELECT user_id, balance, risk FROM risk_settings")
+        }
+
+        prompts = dict(conn.execute("SELECT user_id, name FROM user_prompts"))
+
+        return {"watchlists": watchlists, "risk": risk, "prompts": prompts}
+
+    # ================== 写入 ==================
+
+    def upsert_watch(self, uid, symbol, interval):
+        self._tx([(
+            "INSERT INTO watchlist (user_id, symbol, interval, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (user_id, symbol) DO UPDATE SET interval = excluded.interval, updated_at = excluded.updated_at",
+            (uid, symbol, interval, time.time()),
+        )])
+
+    def delete_watch(self, uid, symbol):
+        self._tx([("DELETE FROM watchlist WHERE user_id = ? AND symbol = ?", (uid, symbol))])
+
+    def clear_watchlist(self, uid):
+        self._tx([("DELETE FROM watchlist WHERE user_id = ?", (uid,))])
+
+    def replace_watchlists(self, watchlists):
+        now = time.time()
+        statements = [("DELETE FROM watchlist", ())]
+        for uid, watchlist in watchlists.items():
+            for symbol, interval in watchlist.items():
+                statements.append((
+                    "INSERT INTO watchlist (user_id, symbol, interval, updated_at) VALUES (?, ?, ?, ?)",
+                    (uid, symbol, interval, now),
+                ))
+        self._tx(statements)
+
+    def upsert_risk(self, uid, settings):
+        self._tx([(
+            "INSERT INTO risk_settings (user_id, balance, risk, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET balance = excluded.balance, risk = excluded.risk, "
+            "updated_at = excluded.updated_at",
+            (uid, float(settings['balance']), float(settings['risk']), time.time()),
+        )])
+
+    def set_user_prompt(self, uid, name):
+        if name is None:
+            self._tx([("DELETE FROM user_prompts WHERE user_id = ?", (uid,))])
+            return
+        self._tx([(
+            "INSERT INTO user_prompts (user_id, name, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET name = excluded.name, updated_at = excluded.updated_at",
+            (uid, name, time.time()),
+        )])
+
+    def flush(self):
+        """Row writes are committed immediately; just checkpoint the WAL."""
+        if self._conn is not None:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def create_backend(name, db_file=None):
+    if name == "sqlite":
+        return SqliteBackend(db_file)
+    if name == "json":
+        return JsonBackend()
+    raise ValueError(f"Unknown storage backend: {name}")
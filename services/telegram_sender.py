@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from telegram.error import BadRequest, RetryAfter, TimedOut, NetworkError
+
+from config.settings import (
+    TELEGRAM_GLOBAL_RATE,
+    TELEGRAM_CHAT_RATE,
+    SEND_QUEUE_MAXSIZE,
+    SEND_WORKERS,
+    SEND_MAX_RETRIES,
+    TELEGRAM_MESSAGE_LIMIT,
+)
+from services.metrics import TELEGRAM_SEND_LATENCY, TELEGRAM_RETRIES, TELEGRAM_FAILURES
+
+DIGEST_SEPARATOR = "\n\n━━━━━━━━━━━━━━━\n\n"
+
+
+class TokenBucket:
+    """Simple token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _Outgoing:
+    __slots__ = ("caption", "full_report", "photo", "enqueued_at")
+
+    def __init__(self, caption, full_report, photo):
+        self.caption = caption
+        self.full_report = full_report
+        self.photo = photo
+        self.enqueued_at = time.monotonic()
+
+
+class TelegramSender:
+    """
+    Outbound message queue for alerts.
+
+    - enqueue() never awaits delivery; items are buffered per chat
+    - a chat is handled by one worker at a time, so its messages stay ordered
+    - per-chat and global token buckets keep us under Telegram flood limits
+    - consecutive text parts pending for the same chat are coalesced into digest messages (photos keep their place)
+    - RetryAfter is honoured, transient network errors are retried
+    """
+
+    def __init__(self, workers: int = SEND_WORKERS, maxsize: int = SEND_QUEUE_MAXSIZE):
+        self.workers = workers
+        self.maxsize = maxsize
+        self._bot = None
+        self._pending: Dict[object, deque] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._scheduled = set()
+        self._tasks = []
+        self._global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE)
+        self._chat_buckets: Dict[object, TokenBucket] = {}
+        self._depth = 0
+        self.metrics = {
+            "enqueued": 0,
+            "sent": 0,
+            "dropped": 0,
+            "failed": 0,
+            "retries": 0,
+            "retry_after": 0,
+            "coalesced": 0,
+            "max_depth": 0,
+            "last_latency": 0.0,
+        }
+
+    # ================== 生命周期 ==================
+
+    async def start(self, bot):
+        if self._tasks:
+            return
+        self._bot = bot
+        self._ready = asyncio.Queue()
+        for chat_id in self._pending:
+            self._schedule(chat_id)
+        self._tasks = [asyncio.create_task(self._worker(), name=f"tg-sender-{i}") for i in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0):
+        """Drain pending messages (up to `timeout` seconds), then cancel workers."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._ready.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Telegram sender stopped with {self._depth} undelivered messages")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ================== 入队 ==================
+
+    def enqueue(self, chat_id, caption, full_report=None, chart_buf=None) -> bool:
+        """Queue an alert for delivery; returns False if it was dropped due to backpressure."""
+        if self._depth >= self.maxsize:
+            self.metrics["dropped"] += 1
+            logging.warning(f"Send queue full ({self._depth}); dropping alert for {chat_id}")
+            return False
+
+        photo = chart_buf.getvalue() if chart_buf is not None else None
+        self._pending.setdefault(chat_id, deque()).append(_Outgoing(caption, full_report, photo))
+        self._depth += 1
+        self.metrics["enqueued"] += 1
+        self.metrics["max_depth"] = max(self.metrics["max_depth"], self._depth)
+        self._schedule(chat_id)
+        return True
+
+    def _schedule(self, chat_id):
+        if self._ready is None or chat_id in self._scheduled:
+            return
+        self._scheduled.add(chat_id)
+        self._ready.put_nowait(chat_id)
+
+    def stats(self) -> dict:
+        return dict(self.metrics, depth=self._depth, chats_pending=len(self._scheduled))
+
+    # ================== 发送 ==================
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            try:
+                items = self._pending.pop(chat_id, deque())
+                self._depth -= len(items)
+                await self._deliver(chat_id, list(items))
+            except Exception as e:
+                logging.exception(f"Telegram sender error for {chat_id}: {e}")
+            finally:
+                self._scheduled.discard(chat_id)
+                # 发送期间又有新消息进来 -> 重新排队
+                if self._pending.get(chat_id):
+                    self._schedule(chat_id)
+                self._ready.task_done()
+
+    def _build_digests(self, texts):
+        """Join text parts into as few messages as possible within Telegram's length limit."""
+        digests, current = [], ""
+        for text in texts:
+            if not current:
+                current = text
+            elif len(current) + len(DIGEST_SEPARATOR) + len(text) <= TELEGRAM_MESSAGE_LIMIT:
+                current += DIGEST_SEPARATOR + text
+                self.metrics["coalesced"] += 1
+            else:
+                digests.append(current)
+                current = text
+        if current:
+            digests.append(current)
+        return digests
+
+    async def _deliver(self, chat_id, items):
+        """Send in queue order; only runs of consecutive text parts are merged into digests."""
+        run = []  # [(item, text)] 尚未发送的连续文字
+
+        async def flush():
+            if run:
+                oldest = run[0][0]
+                for digest in self._build_digests([text for _, text in run]):
+                    await self._send(chat_id, oldest, text=digest)
+                run.clear()
+
+        for item in items:
+            if item.photo is not None:
+                # 先发出排在这张图之前的文字, 保持同一聊天的顺序
+                await flush()
+                await self._send(chat_id, item, photo=item.photo, text=item.caption)
+            elif item.caption:
+                run.append((item, item.caption))
+            if item.full_report:
+                # 紧跟在自己的图之后 (可与之后的纯文字合并)
+                run.append((item, item.full_report))
+        await flush()
+
+    async def _send(self, chat_id, item, text=None, photo=None):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(TELEGRAM_CHAT_RATE, capacity=1)
+
+        parse_mode = 'Markdown'
+        for attempt in range(SEND_MAX_RETRIES + 1):
+            await bucket.acquire()
+            await self._global_bucket.acquire()
+            try:
+                if photo is not None:
+                    with TELEGRAM_SEND_LATENCY.time(method="send_photo"):
+                        await self._bot.send_photo(chat_id=chat_id, photo=photo, caption=text, parse_mode=parse_mode)
+                else:
+                    with TELEGRAM_SEND_LATENCY.time(method="send_message"):
+                        await self._bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                self.metrics["sent"] += 1
+                if item is not None:
+                    self.metrics["last_latency"] = time.monotonic() - item.enqueued_at
+                return True
+            except RetryAfter as e:
+                self.metrics["retry_after"] += 1
+                TELEGRAM_RETRIES.inc(reason="retry_after")
+                delay = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else float(e.retry_after)
+                logging.warning(f"Telegram flood wait for {chat_id}: sleeping {delay}s")
+                await asyncio.sleep(delay)
+            except BadRequest as e:
+                # 常见原因是 Markdown 实体解析失败 -> 退回纯文本重发一次
+                if parse_mode and "parse entities" in str(e).lower():
+                    logging.warning(f"Markdown rejected for {chat_id}, resending as plain text: {e}")
+                    parse_mode = None
+                    continue
+                logging.error(f"Failed to send Telegram message to {chat_id}: {e}")
+                break
+            except (TimedOut, NetworkError) as e:
+                self.metrics["retries"] += 1
+                TELEGRAM_RETRIES.inc(reason="network")
+                logging.warning(f"Telegram send to {chat_id} failed ({attempt + 1}/{SEND_MAX_RETRIES + 1}): {e}")
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                logging.error(f"Failed to send Telegram message to {chat_id}: {e}")
+                break
+
+        self.metrics["failed"] += 1
+        TELEGRAM_FAILURES.inc()
+        return False
+
+
+telegram_sender = TelegramSender()
@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from config.settings import (
+    UPDATE_MAX_PENDING, UPDATE_HEAVY_CONCURRENCY, UPDATE_LIGHT_CONCURRENCY, HEAVY_COMMANDS, HEAVY_CALLBACKS,
+)
+from services.metrics import UPDATE_LATENCY, UPDATE_WAIT, UPDATES_RUNNING
+
+HEAVY = 'heavy'
+LIGHT = 'light'
+
+
+def update_lane(update) -> str:
+    """'heavy' for updates that fetch data / call the LLM (/ai, /scan, the scan button), else 'light'."""
+    if not isinstance(update, Update):
+        return LIGHT
+    if update.callback_query is not None:
+        return HEAVY if update.callback_query.data in HEAVY_CALLBACKS else LIGHT
+    message = update.effective_message
+    text = message.text if message is not None else None
+    if text and text.startswith('/'):
+        command = text[1:].split(maxsplit=1)[0].split('@', 1)[0].lower()
+        if command in HEAVY_COMMANDS:
+            return HEAVY
+    return LIGHT
+
+
+def _chat_key(update):
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
+
+
+class LaneUpdateProcessor(BaseUpdateProcessor):
+    """
+    Concurrent update processing with two lanes and per-chat ordering.
+    - heavy / light lanes each have their own concurrency limit, so menus and callbacks never queue behind analyses
+    - within a lane, one chat's updates run one at a time in arrival order
+    - a heavy update first waits for the chat's earlier light updates (/add BTC then /ai BTC stays ordered);
+      later light updates may overtake a running analysis
+    """
+
+    def __init__(self, max_pending: int = UPDATE_MAX_PENDING,
+                 heavy: int = UPDATE_HEAVY_CONCURRENCY, light: int = UPDATE_LIGHT_CONCURRENCY):
+        # 基类信号量只做准入上限 (运行 + 排队), 真正的并发由各通道控制
+        super().__init__(max(max_pending, heavy + light))
+        self._lanes = {HEAVY: asyncio.Semaphore(heavy), LIGHT: asyncio.Semaphore(light)}
+        self._locks = {}  # (lane, chat) -> [Lock, users]
+        self._running = {HEAVY: 0, LIGHT: 0}
+
+    def running(self, lane: str) -> int:
+        return self._running[lane]
+
+    async def _enter(self, key):
+        """Wait (FIFO) for this chat's earlier updates in the lane; the lock is dropped once nobody uses it."""
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            await entry[0].acquire()
+        except BaseException:
+            self._unref(key)
+            raise
+
+    def _leave(self, key):
+        self._locks[key][0].release()
+        self._unref(key)
+
+    def _unref(self, key):
+        entry = self._locks[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[key]
+
+    async def do_process_update(self, update, coroutine):
+        lane = update_lane(update)
+        chat = _chat_key(update)
+        key = (lane, chat) if chat is not None else None
+        queued = time.perf_counter()
+        held = started = False
+        try:
+            if key is not None:
+                if lane == HEAVY:
+                    # 排在同一聊天之前的轻量更新之后 (只占位, 不持有轻量通道)
+                    await self._enter((LIGHT, chat))
+                    self._leave((LIGHT, chat))
+                await self._enter(key)
+                held = True
+            async with self._lanes[lane]:
+                UPDATE_WAIT.observe(time.perf_counter() - queued, lane=lane)
+                self._running[lane] += 1
+                UPDATES_RUNNING.set(self._running[lane], lane=lane)
+                started = True
+                t0 = time.perf_counter()
+                try:
+                    await coroutine
+                finally:
+                    self._running[lane] -= 1
+                    UPDATES_RUNNING.set(self._running[lane], lane=lane)
+                    UPDATE_LATENCY.observe(time.perf_counter() - t0, lane=lane)
+        finally:
+            if held:
+                self._leave(key)
+            if not started and asyncio.iscoroutine(coroutine):
+                # 排队时被取消 (关闭中): 处理协程从未启动, 避免 "never awaited" 警告
+                coroutine.close()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+update_processor = LaneUpdateProcessor()
@@ -1,17 +1,18 @@
 
+import io
 import logging
+import time
 from telegram.ext import ContextTypes
-from config.settings import ALLOWED_USER_IDS
+from config.settings import ALLOWED_USER_IDS, MONITOR_INTERVAL, REVERSAL_ALERT_SCORE
 from services.storage import get_all_unique_pairs, get_users_watching
-from services.data_fetcher import prepare_market_data_for_ai
-from services.ai_service import analyze_with_ai
-from services.notification import NotificationService
-from services.patterns import CandlePatternDetector
-from services.confirmations import volume_confirmation, rsi_confirmation, macd_confirmation
-from services.model import ReversalModel
-from services.data_fetcher import DataFetcher
+from services.telegram_sender import telegram_sender
+from services.metrics import MONITOR_CYCLE_LATENCY, MONITOR_CYCLE_LAG, MONITOR_PAIRS
+from services.profiler import profiler
+from services.compute import run_job, pack_bars, reversal_evaluate, detect_patterns
+from tasks.shards import coordinator
 
 _monitor_paused = False
+_last_scheduled_start = None
 
 
 def is_monitor_paused() -> bool:
@@ -29,14 +30,15 @@ def toggle_monitor_paused() -> bool:
     return _monitor_paused
 
 async def reversal_monitor(sym, interval):
+    from services.data_fetcher import DataFetcher
+    from services.notification import NotificationService
      # 获取指标
     dfr = DataFetcher()
     df = await dfr.get_merged_data(sym, interval)
-    model = ReversalModel(df)
     if df is None:
         raise RuntimeError("Data fetch failed (symbol/network)")
     try:
-        result = model.evaluate(index=-1)
+        result = await run_job('reversal', reversal_evaluate, pack_bars(df))
         caption = (
             f"当前价格: {result['price']:.2f}\n"
             f"RSI数值: {result['rsi']:.2f}\n"
@@ -48,6 +50,8 @@ async def reversal_monitor(sym, interval):
         )
         for k, v in result['details'].items():
             caption += f"  - {k}: +{v}\n"
+        if result.get('divergence'):
+            caption += f"背离: {', '.join(result['divergence'])}\n"
         caption += f"{'-' * 30}\n"
         
         score = result['total_score']
@@ -55,56 +59,90 @@ async def reversal_monitor(sym, interval):
             caption += "建议: 观望 (风险低但机会也低)"
         elif score < 60:
             caption += "建议: 观察区 (等待更多信号)"
-        elif score < 80:
+        elif score < REVERSAL_ALERT_SCORE:
             caption += "建议: 重点关注 (轻仓尝试 + 紧止损)"
         else:
             caption += "建议: ⚠️ 极端反转区 (高胜率，由于波动大需挂单进场)"
         
-        if score >= 80:
-            return caption
+        if score >= REVERSAL_ALERT_SCORE:
+            chart_buf = await NotificationService.build_chart(df, sym, interval, 'reversal', score=score)
+            return caption, None, chart_buf
         print(f"[{sym} {interval}] Reversal monitor score: {score}")
-        return None,None 
+        return None, None, None
     except Exception as e:
         logging.exception(f"[{sym} {interval}] Reversal monitor error: {e}")
+        return None, None, None
 async def monitor_ai_analysis(sym, interval):
+    from services.data_fetcher import prepare_market_data_for_ai
+    from services.ai_service import analyze_with_ai
+    from services.notification import NotificationService
     # 获取指标
     df, df_btc = await prepare_market_data_for_ai(sym, interval)
 
     if df is None:
         raise RuntimeError("Data fetch failed (symbol/network)")
-    detector  = CandlePatternDetector(df)
-    match,pattern = detector.detect_patterns()
+    match, pattern = await run_job('patterns', detect_patterns, pack_bars(df))
     if not match:
         logging.info(f"[{sym} {interval}] Bearish pattern detected, skipping notification")
-        return None,None
+        return None, None, None
     try:
-        result = await analyze_with_ai(sym, interval, df,df_btc, balance=1000)
+        result = await analyze_with_ai(sym, interval, df,df_btc, balance=1000, command='monitor')
         if result.get('decision') == 'HOLD':
             logging.info(f"[{sym} {interval}] AI decision is hold, skipping notification")
-            return None,None
+            return None, None, None
         caption, full_report = NotificationService.format_report(sym, interval, result)
-        return caption, full_report
+        chart_buf = await NotificationService.build_chart(df, sym, interval, 'ai_report')
+        return caption, full_report, chart_buf
     except Exception as e:
         logging.exception(f"[{sym} {interval}] AI Analysis/Notification failed: {e}")
+        return None, None, None
 async def monitor_task(context: ContextTypes.DEFAULT_TYPE):
     if is_monitor_paused():
         logging.info("Monitor task is paused; skipping this cycle.")
         return None,None
 
+    global _last_scheduled_start
+    now = time.monotonic()
+    if context.job is not None:
+        # 只统计定时任务；手动 Scan 不影响 lag
+        if _last_scheduled_start is not None:
+            MONITOR_CYCLE_LAG.set(max(0.0, now - _last_scheduled_start - MONITOR_INTERVAL))
+        _last_scheduled_start = now
+
     unique_pairs = get_all_unique_pairs()
+    MONITOR_PAIRS.set(len(unique_pairs))
     if not unique_pairs:
         return
 
+    with MONITOR_CYCLE_LATENCY.time():
+        if coordinator.active():
+            # 分片模式: worker 进程扫描, 告警经 deliver_alert 回到这里发送; 掉线 worker 的分片本地补扫
+            orphans = await coordinator.run_cycle(unique_pairs)
+            if orphans:
+                await _scan_pairs(context, orphans)
+            return
+        async with profiler.capture('monitor', context.bot):
+            await _scan_pairs(context, unique_pairs)
+
+
+def deliver_alert(sym, interval, caption, full_report, chart_buf):
+    """Queue an alert for every allowed user watching (sym, interval)."""
+    if isinstance(chart_buf, (bytes, bytearray)):
+        chart_buf = io.BytesIO(chart_buf)
+    interested_users = get_users_watching(sym, interval)
+    for uid in interested_users:
+        # Double check if user is allowed (optional, but good practice if storage gets messy)
+        if uid in ALLOWED_USER_IDS or str(uid) in [str(x) for x in ALLOWED_USER_IDS]:
+            telegram_sender.enqueue(uid, caption, full_report, chart_buf)
+
+
+async def _scan_pairs(context, unique_pairs):
     for sym, interval in unique_pairs:
         try:
-            caption, full_report = await reversal_monitor(sym, interval)
+            caption, full_report, chart_buf = await reversal_monitor(sym, interval)
             # monitor_ai_analysis(sym, interval)
             if not caption and not full_report:
                 continue
-            interested_users = get_users_watching(sym, interval)
-            for uid in interested_users:
-                # Double check if user is allowed (optional, but good practice if storage gets messy)
-                if uid in ALLOWED_USER_IDS or str(uid) in [str(x) for x in ALLOWED_USER_IDS]:
-                    await NotificationService.send_telegram_report(context.bot, uid, None, caption, full_report)
+            deliver_alert(sym, interval, caption, full_report, chart_buf)
         except Exception as e:
             logging.exception(f"[{sym} {interval}] Monitor loop error: {e}")
@@ -0,0 +1,538 @@
+"""
+Parameter sweep for the alert models: grid / random search over stored history with walk-forward validation.
+
+    python -m tasks.optimize --fetch BTCUSDT,ETHUSDT,SOLUSDT --interval 1h       # append to data/history
+    python -m tasks.optimize --interval 1h --target reversal --trials 2000
+    python -m tasks.optimize --interval 1h --target patterns --search grid --space space.json
+    python -m tasks.optimize --synthetic 50 --bars 4000 --trials 500            # smoke run, no data needed
+
+Indicators / features are computed once in the parent and shared with the worker processes (fork: copy-on-write;
+spawn: sent once per worker); a trial only re-scores the precomputed features with its parameters.
+Each signal is scored by the forward return over --horizon bars (net of --fee) in the signal's direction.
+
+History is split by time into --folds + 1 segments; signals whose exit falls in the next segment are dropped.
+Trials are ranked on every segment but the last (the holdout), and the anchored walk-forward picks the best
+trial on segments [0, k) and reports it on segment k, k = 1 .. folds.
+"""
+import argparse
+import asyncio
+import copy
+import glob
+import inspect
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config.settings import OPTIMIZE_HISTORY_DIR, REVERSAL_ALERT_SCORE, SCORING_RULES
+
+TARGETS = ("reversal", "patterns")
+OBJECTIVES = ("tstat", "mean", "hit_rate")
+
+# 默认搜索空间: 列表 = 候选值; {"min", "max", "step"} = 等距候选值; 不带 step = 连续区间 (仅随机搜索)
+DEFAULT_SPACES = {
+    "reversal": {
+        "alert_score": {"min": 50, "max": 95, "step": 5},
+        "rsi_oversold": [20, 25, 30, 35],
+        "rsi_overbought": [65, 70, 75, 80],
+        "oi_change_pct": [0.02, 0.03, 0.05],
+        "vol_spike": [1.5, 2.0, 2.5, 3.0],
+        "w_rsi": [10, 15, 20],
+        "w_divergence": [5, 10, 15, 20],
+        "w_macd_hist": [5, 10, 15],
+        "w_oi": [10, 15, 20],
+        "w_wick": [5, 10, 15],
+    },
+    "patterns": {
+        "trend_lookback": {"min": 3, "max": 10, "step": 1, "int": True},
+        "trend_threshold": [0.001, 0.002, 0.003, 0.005],
+        "min_body_ratio": [0.05, 0.1, 0.15, 0.2],
+        "shadow_ratio": [1.5, 2.0, 2.5, 3.0],
+        "short_shadow_ratio": [0.3, 0.5, 0.7],
+        "star_body_ratio": [0.3, 0.5, 0.7],
+    },
+}
+
+
+# ================== 历史数据 ==================
+
+def history_path(directory: str, symbol: str, interval: str, ext: str = ".csv") -> str:
+    return os.path.join(directory, f"{symbol.upper()}_{interval}{ext}")
+
+
+def _read_frame(path: str) -> pd.DataFrame:
+    df = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+    t_col = 'timestamp' if 'timestamp' in df.columns else 'open_time'
+    df[t_col] = pd.to_datetime(df[t_col])
+    df = df.drop_duplicates(t_col, keep='last').sort_values(t_col)
+    return df.set_index(t_col, drop=False)
+
+
+def load_history(directory: str, interval: str, symbols: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+    """{symbol: merged frame} from <SYMBOL>_<interval>.csv / .parquet files (as written by --fetch)."""
+    frames = {}
+    for path in sorted(glob.glob(os.path.join(directory, f"*_{interval}.*"))):
+        name, ext = os.path.splitext(os.path.basename(path))
+        if ext not in (".csv", ".parquet"):
+            continue
+        symbol = name[:-len(interval) - 1]
+        if symbols and symbol not in symbols:
+            continue
+        try:
+            frames[symbol] = _read_frame(path)
+        except Exception as e:
+            logging.warning(f"Skipping {path}: {e}")
+    return frames
+
+
+async def fetch_history(symbols: List[str], interval: str, limit: int, directory: str):
+    """
+    Download merged data (klines + OI + long/short + funding) and merge it into the stored CSVs.
+    Binance only serves the last ~30 days of OI / ratio history, so run this periodically to build months of data.
+    """
+    from services.data_fetcher import DataFetcher
+
+    fetcher = DataFetcher()
+    os.makedirs(directory, exist_ok=True)
+    for symbol in symbols:
+        df = await fetcher.get_merged_data(symbol, interval, limit=limit)
+        if df is None or df.empty:
+            logging.warning(f"[{symbol}] no data fetched")
+            continue
+        path = history_path(directory, symbol, interval)
+        df = df.reset_index(drop=True)
+        if os.path.exists(path):
+            df = pd.concat([_read_frame(path).reset_index(drop=True), df])
+            df = df.drop_duplicates('timestamp', keep='last').sort_values('timestamp')
+        df.to_csv(path, index=False)
+        logging.info(f"[{symbol}] {len(df)} bars -> {path}")
+
+
+# ================== 预计算 (父进程, 只做一次) ==================
+
+def _segments(width: int, folds: int):
+    """Column -> segment id for folds + 1 equal time segments, and the segment end columns."""
+    bounds = np.linspace(0, width, folds + 2).astype(np.int64)
+    seg = np.searchsorted(bounds[1:], np.arange(width), side='right')
+    return seg, bounds[1:]
+
+
+def prepare(frames: Dict[str, pd.DataFrame], target: str, horizon: int, folds: int, rules=None) -> dict:
+    """
+    Everything a trial needs, on a shared time grid (symbols x bars):
+    forward returns, the segment of every column and which entries are scorable, plus the target's
+    precomputed inputs (rule features / pattern detectors with their EMA20 cached).
+    """
+    from services.bar_buffer import BarBuffer
+
+    symbols = list(frames)
+    bars = {s: BarBuffer.from_frame(frames[s]) for s in symbols}
+    grid = np.unique(np.concatenate([bars[s].times for s in symbols]))
+    positions = [np.searchsorted(grid, bars[s].times) for s in symbols]
+    width = len(grid)
+    seg, seg_end = _segments(width, folds)
+
+    fwd = np.full((len(symbols), width), np.nan)
+    valid = np.zeros((len(symbols), width), dtype=bool)
+    for i, s in enumerate(symbols):
+        close = bars[s].column('close').astype(np.float64)
+        pos = positions[i]
+        if len(close) <= horizon:
+            continue
+        ret = close[horizon:] / close[:-horizon] - 1
+        entry, exit_ = pos[:-horizon], pos[horizon:]
+        fwd[i, entry] = ret
+        # 持仓跨入下一段的信号不计分, 避免训练段的收益用到测试段的价格
+        valid[i, entry] = np.isfinite(ret) & (exit_ < seg_end[seg[entry]])
+
+    data = {
+        "target": target, "symbols": symbols, "times": grid, "horizon": horizon, "folds": folds,
+        "fwd": fwd, "valid": valid, "seg": np.broadcast_to(seg, fwd.shape),
+    }
+    if target == "reversal":
+        from services.model import ReversalModel
+        from services.rules import stack_features
+        models = [ReversalModel(bars[s], rules) for s in symbols]
+        data["features"] = stack_features([m.features for m in models], rules.names, positions, width)
+        data["rules"] = (rules.spec, rules.source)
+    else:
+        from services.patterns import CandlePatternDetector
+        detectors = []
+        for i, s in enumerate(symbols):
+            det = CandlePatternDetector(bars[s])
+            det._get_ema20()  # 缓存 EMA20, 各试验只改阈值
+            detectors.append((det, positions[i]))
+        data["detectors"] = detectors
+        data["width"] = width
+    return data
+
+
+# ================== 单次试验 (在 worker 中执行) ==================
+
+_DATA = None
+_RULES = None
+
+
+def _init_worker(data):
+    global _DATA
+    _DATA = data
+
+
+def _base_rules():
+    global _RULES
+    if _RULES is None:
+        from services.rules import RuleSet
+        _RULES = RuleSet(*_DATA["rules"])
+    return _RULES
+
+
+def _reversal_signals(params: dict) -> np.ndarray:
+    """+1 / -1 on the bar the score first reaches alert_score (the monitor alerts once per crossing), else 0."""
+    params = dict(params)
+    alert = params.pop("alert_score", REVERSAL_ALERT_SCORE)
+    rules = _base_rules().with_params(params) if params else _base_rules()
+    scores = rules.score(_DATA["features"])
+    on = scores.total >= alert
+    edge = on.copy()
+    edge[:, 1:] &= ~on[:, :-1]
+    sides = np.array([1 if s.startswith("long") else -1 for s in rules.signals], dtype=np.int8)
+    return np.where(edge & (scores.side >= 0), sides[scores.side], 0).astype(np.int8)
+
+
+def _pattern_signals(params: dict) -> np.ndarray:
+    from services.patterns import CandlePatternDetector
+    lut = np.array([0] + [1 if p in CandlePatternDetector.BULLISH else -1 for p in CandlePatternDetector.PATTERNS],
+                   dtype=np.int8)
+    detectors = _DATA["detectors"]
+    out = np.zeros((len(detectors), _DATA["width"]), dtype=np.int8)
+    for i, (base, pos) in enumerate(detectors):
+        det = copy.copy(base)
+        for name, value in params.items():
+            setattr(det, name, value)
+        out[i, pos] = lut[det.detect_series()]
+    return out
+
+
+def run_trial(params: dict) -> np.ndarray:
+    """Per-segment (signals, sum, sum of squares, wins) of the net forward returns."""
+    direction = _reversal_signals(params) if _DATA["target"] == "reversal" else _pattern_signals(params)
+    hit = (direction != 0) & _DATA["valid"]
+    ret = direction[hit] * _DATA["fwd"][hit] - _DATA["fee"]
+    seg = _DATA["seg"][hit]
+    k = _DATA["folds"] + 1
+    return np.stack([
+        np.bincount(seg, minlength=k).astype(np.float64),
+        np.bincount(seg, weights=ret, minlength=k),
+        np.bincount(seg, weights=ret * ret, minlength=k),
+        np.bincount(seg, weights=(ret > 0).astype(np.float64), minlength=k),
+    ], axis=1)
+
+
+def _run_chunk(chunk):
+    return [(trial, run_trial(params)) for trial, params in chunk]
+
+
+def run_trials(data: dict, trials: List[dict], workers: int) -> np.ndarray:
+    """(trials, segments, 4) statistics; trials are sent to the pool in chunks."""
+    global _DATA
+    _DATA = data
+    out = np.zeros((len(trials), data["folds"] + 1, 4))
+    jobs = list(enumerate(trials))
+    if workers <= 1 or len(trials) < 2:
+        for trial, stats in _run_chunk(jobs):
+            out[trial] = stats
+        return out
+
+    size = max(1, math.ceil(len(jobs) / (workers * 8)))
+    chunks = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+    if "fork" in multiprocessing.get_all_start_methods():
+        # fork: worker 直接继承父进程的 _DATA (写时复制), 不做任何序列化
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+    else:
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(data,))
+    done = 0
+    started = time.perf_counter()
+    with pool:
+        for future in as_completed([pool.submit(_run_chunk, c) for c in chunks]):
+            for trial, stats in future.result():
+                out[trial] = stats
+            done += 1
+            if done % max(1, len(chunks) // 10) == 0 or done == len(chunks):
+                logging.info(f"{done}/{len(chunks)} chunks, {time.perf_counter() - started:.1f}s")
+    return out
+
+
+# ================== 搜索空间 ==================
+
+def parse_space(spec: dict) -> Dict[str, dict]:
+    space = {}
+    for name, value in spec.items():
+        if isinstance(value, list):
+            if not value:
+                raise ValueError(f"{name}: empty choice list")
+            space[name] = {"choices": value}
+        elif isinstance(value, dict) and "min" in value and "max" in value:
+            lo, hi, as_int = value["min"], value["max"], bool(value.get("int"))
+            if value.get("step"):
+                count = int(math.floor((hi - lo) / value["step"] + 1e-9)) + 1
+                choices = [round(lo + i * value["step"], 10) for i in range(count)]
+                space[name] = {"choices": [int(c) for c in choices] if as_int else choices}
+            else:
+                space[name] = {"low": lo, "high": hi, "int": as_int}
+        else:
+            raise ValueError(f"{name}: expected a list of values or {{min, max[, step, int]}}, got {value!r}")
+    return space
+
+
+def make_trials(space: Dict[str, dict], defaults: dict, search: str, limit: int, seed: int) -> List[dict]:
+    """Trial 0 is always the defaults (the baseline); grid / random points follow, without duplicates."""
+    names = list(space)
+    trials = [{n: defaults[n] for n in names}]
+    seen = {tuple(trials[0].values())}
+    if search == "grid":
+        if any("choices" not in space[n] for n in names):
+            raise ValueError("grid search needs discrete values (lists or ranges with a step)")
+        size = math.prod(len(space[n]["choices"]) for n in names)
+        if size > limit:
+            raise ValueError(f"grid has {size} points, more than --trials {limit}; narrow the space or use --search random")
+        points = itertools.product(*(space[n]["choices"] for n in names))
+    else:
+        rng = np.random.default_rng(seed)
+
+        def draw(dim):
+            if "choices" in dim:
+                return dim["choices"][rng.integers(len(dim["choices"]))]
+            if dim["int"]:
+                return int(rng.integers(dim["low"], dim["high"] + 1))
+            return float(rng.uniform(dim["low"], dim["high"]))
+        points = (tuple(draw(space[n]) for n in names) for _ in range(limit * 20))
+    for point in points:
+        if len(trials) >= limit:
+            break
+        if point not in seen:
+            seen.add(point)
+            trials.append(dict(zip(names, point)))
+    return trials
+
+
+def target_defaults(target: str, rules=None) -> dict:
+    if target == "reversal":
+        return {**rules.params, "alert_score": REVERSAL_ALERT_SCORE}
+    from services.patterns import CandlePatternDetector
+    sig = inspect.signature(CandlePatternDetector.__init__)
+    return {n: p.default for n, p in sig.parameters.items() if p.default is not inspect.Parameter.empty}
+
+
+# ================== 评价 / 报告 ==================
+
+def summarize(stats) -> dict:
+    n, total, squares, wins = (float(x) for x in stats)
+    if n == 0:
+        return {"signals": 0, "mean": None, "hit_rate": None, "tstat": None}
+    mean = total / n
+    var = max(squares / n - mean * mean, 0.0) * n / (n - 1) if n > 1 else 0.0
+    return {
+        "signals": int(n),
+        "mean": mean,
+        "hit_rate": wins / n,
+        "tstat": mean / math.sqrt(var) * math.sqrt(n) if var > 0 else None,
+    }
+
+
+def objective(stats: np.ndarray, name: str, min_signals: int) -> np.ndarray:
+    """Vectorized over the leading axes of (..., 4) statistics; -inf below min_signals."""
+    n, total, squares, wins = np.moveaxis(stats, -1, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / n
+        if name == "mean":
+            value = mean
+        elif name == "hit_rate":
+            value = wins / n
+        else:
+            var = np.maximum(squares / n - mean * mean, 0) * n / (n - 1)
+            value = mean / np.sqrt(var) * np.sqrt(n)
+    return np.where((n >= max(min_signals, 2)) & np.isfinite(value), value, -np.inf)
+
+
+def walk_forward(stats: np.ndarray, name: str, min_signals: int) -> dict:
+    """Anchored walk-forward: choose on segments [0, k), test on segment k."""
+    folds = []
+    oos = np.zeros(4)
+    for k in range(1, stats.shape[1]):
+        train = stats[:, :k].sum(axis=1)
+        score = objective(train, name, min_signals)
+        best = int(np.argmax(score))
+        oos += stats[best, k]
+        folds.append({
+            "fold": k, "trial": best,
+            "train": summarize(train[best]), "test": summarize(stats[best, k]),
+            "baseline_test": summarize(stats[0, k]),
+        })
+    return {"folds": folds, "oos": summarize(oos), "baseline_oos": summarize(stats[0, 1:].sum(axis=0))}
+
+
+def _fmt(s: dict) -> str:
+    if not s["signals"]:
+        return "n=0"
+    t = f"{s['tstat']:+.2f}" if s["tstat"] is not None else "  n/a"
+    return f"n={s['signals']:<5d} mean={s['mean'] * 100:+.3f}% hit={s['hit_rate'] * 100:.1f}% t={t}"
+
+
+def _fmt_params(params: dict) -> str:
+    return " ".join(f"{k}={v:g}" if isinstance(v, float) else f"{k}={v}" for k, v in params.items())
+
+
+def report(trials: List[dict], stats: np.ndarray, name: str, min_signals: int, top: int) -> dict:
+    in_sample = stats[:, :-1].sum(axis=1)
+    score = objective(in_sample, name, min_signals)
+    order = [int(i) for i in np.argsort(-score, kind="stable")[:top] if np.isfinite(score[i])]
+    wf = walk_forward(stats, name, min_signals)
+
+    print(f"\nTop {len(order)} of {len(trials)} trials by in-sample {name} (holdout = last segment):")
+    for rank, i in enumerate(order, 1):
+        print(f"{rank:>3}. #{i:<5d} in-sample {_fmt(summarize(in_sample[i]))}")
+        print(f"            holdout  {_fmt(summarize(stats[i, -1]))}")
+        print(f"            {_fmt_params(trials[i])}")
+    print(f"\nBaseline #0  in-sample {_fmt(summarize(in_sample[0]))}")
+    print(f"             holdout  {_fmt(summarize(stats[0, -1]))}")
+
+    print("\nWalk-forward (anchored):")
+    for f in wf["folds"]:
+        print(f"  fold {f['fold']}: #{f['trial']:<5d} test {_fmt(f['test'])} | baseline {_fmt(f['baseline_test'])}")
+    print(f"  out-of-sample   {_fmt(wf['oos'])}")
+    print(f"  baseline        {_fmt(wf['baseline_oos'])}")
+
+    return {
+        "objective": name,
+        "top": [{"trial": i, "params": trials[i], "in_sample": summarize(in_sample[i]),
+                 "holdout": summarize(stats[i, -1])} for i in order],
+        "baseline": {"params": trials[0], "in_sample": summarize(in_sample[0]), "holdout": summarize(stats[0, -1])},
+        "walk_forward": {**wf, "folds": [{**f, "params": trials[f["trial"]]} for f in wf["folds"]]},
+    }
+
+
+def save_best(path: str, target: str, params: dict, rules=None):
+    """reversal: the rule file with the tuned params; patterns: the detector kwargs as JSON."""
+    params = dict(params)
+    if target == "reversal":
+        alert = params.pop("alert_score", REVERSAL_ALERT_SCORE)
+        spec = copy.deepcopy(rules.spec)
+        spec["params"] = {**spec.get("params", {}), **params}
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(spec, fh, indent=2, ensure_ascii=False)
+        print(f"\nTuned rules written to {path}; use with SCORING_RULES={path} REVERSAL_ALERT_SCORE={alert}")
+    else:
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(params, fh, indent=2)
+        print(f"\nTuned detector parameters written to {path} (PATTERN_* in config/settings.py)")
+
+
+# ================== 入口 ==================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grid / random parameter sweep with walk-forward validation")
+    parser.add_argument("--target", choices=TARGETS, default="reversal")
+    parser.add_argument("--interval", default="1h")
+    parser.add_argument("--history", default=OPTIMIZE_HISTORY_DIR, help="directory of <SYMBOL>_<interval>.csv/.parquet")
+    parser.add_argument("--symbols", default=None, help="comma separated subset of the stored symbols")
+    parser.add_argument("--fetch", default=None, metavar="SYMBOLS",
+                        help="download these symbols into --history and exit")
+    parser.add_argument("--synthetic", type=int, default=None, metavar="N", help="use N synthetic symbols instead")
+    parser.add_argument("--bars", type=int, default=1500, help="bars per symbol for --fetch / --synthetic")
+    parser.add_argument("--min-bars", type=int, default=300, help="skip shorter histories")
+    parser.add_argument("--rules", default=SCORING_RULES, help="base rule file (reversal)")
+    parser.add_argument("--space", default=None, help="search space JSON file (default: built-in)")
+    parser.add_argument("--search", choices=("grid", "random"), default="random")
+    parser.add_argument("--trials", type=int, default=1000, help="number of trials (grid: upper bound)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--horizon", type=int, default=12, help="bars held after a signal")
+    parser.add_argument("--fee", type=float, default=0.0008, help="round-trip cost subtracted from every return")
+    parser.add_argument("--folds", type=int, default=4, help="walk-forward folds (history is split into folds + 1)")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="tstat")
+    parser.add_argument("--min-signals", type=int, default=30, help="trials with fewer signals are not ranked")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", default=None, help="write the report as JSON")
+    parser.add_argument("--save-best", default=None, metavar="PATH", help="write the top trial's parameters")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    if args.fetch:
+        symbols = [s.strip().upper() for s in args.fetch.split(",") if s.strip()]
+        asyncio.run(fetch_history(symbols, args.interval, args.bars, args.history))
+        return 0
+
+    if args.synthetic:
+        from benchmarks.synthetic import make_universe
+        frames = make_universe(args.synthetic, args.bars, args.interval, seed=args.seed)
+    else:
+        symbols = [s.strip().upper() for s in args.symbols.split(",")] if args.symbols else None
+        frames = load_history(args.history, args.interval, symbols)
+    frames = {s: df for s, df in frames.items() if len(df) >= args.min_bars}
+    if not frames:
+        parser.error(f"no history with >= {args.min_bars} bars for {args.interval} in {args.history} (see --fetch)")
+
+    rules = None
+    if args.target == "reversal":
+        from services.rules import load_rules
+        rules = load_rules(args.rules)
+    spec = DEFAULT_SPACES[args.target]
+    if args.space:
+        with open(args.space, encoding="utf-8") as fh:
+            spec = json.load(fh)
+    try:
+        space = parse_space(spec)
+        defaults = target_defaults(args.target, rules)
+        unknown = set(space) - set(defaults)
+        if unknown:
+            raise ValueError(f"unknown {args.target} parameter(s) {sorted(unknown)}; known: {sorted(defaults)}")
+        trials = make_trials(space, defaults, args.search, args.trials, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+
+    started = time.perf_counter()
+    data = prepare(frames, args.target, args.horizon, args.folds, rules)
+    data["fee"] = args.fee
+    prepared = time.perf_counter()
+    logging.info(f"Prepared {len(frames)} symbols x {len(data['times'])} bars in {prepared - started:.1f}s; "
+                 f"running {len(trials)} trials on {args.workers} workers")
+    stats = run_trials(data, trials, args.workers)
+    elapsed = time.perf_counter() - prepared
+    logging.info(f"{len(trials)} trials in {elapsed:.1f}s ({len(trials) / max(elapsed, 1e-9):.0f}/s)")
+
+    times = pd.to_datetime(data["times"][[0, -1]])
+    print(f"\n{args.target} | {len(frames)} symbols | {args.interval} {times[0]} -> {times[1]} | "
+          f"horizon {args.horizon} bars | fee {args.fee:g} | {args.folds + 1} segments")
+    result = report(trials, stats, args.objective, args.min_signals, args.top)
+
+    if args.json:
+        payload = {
+            "meta": {"target": args.target, "interval": args.interval, "symbols": data["symbols"],
+                     "start": str(times[0]), "end": str(times[1]), "horizon": args.horizon, "fee": args.fee,
+                     "folds": args.folds, "search": args.search, "trials": len(trials), "seconds": elapsed},
+            **result,
+        }
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(payload, fh, indent=2, default=float)
+        print(f"\nReport written to {args.json}")
+    if args.save_best:
+        if not result["top"]:
+            print("\nNo trial reached --min-signals; nothing saved")
+        else:
+            save_best(args.save_best, args.target, result["top"][0]["params"], rules)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+"""
+Sharded monitor: a coordinator inside the bot process and N scan workers talking over a unix socket.
+
+The coordinator owns the consistent-hash ring (keyed by symbol, so one worker sees every interval of a
+symbol and can share its kline download), sends each worker its shard once per cycle and forwards the
+alerts they report to the single Telegram sender. Extra workers on the same box can join with
+
+    python -m tasks.shards --socket data/monitor.sock --id extra-1
+
+Messages are newline-delimited JSON; chart PNGs travel base64-encoded.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import sys
+from typing import Callable, Dict, Optional
+
+from config.settings import MONITOR_SHARDS, MONITOR_SOCKET, MONITOR_INTERVAL, SHARD_VNODES, SHARD_CONCURRENCY
+from services.hash_ring import HashRing
+from services.metrics import MONITOR_WORKERS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_STREAM_LIMIT = 16 * 1024 * 1024  # 单条消息上限 (含 base64 图表)
+
+
+async def _send(writer: asyncio.StreamWriter, lock: asyncio.Lock, message: dict):
+    async with lock:
+        writer.write(json.dumps(message).encode("utf-8") + b"\n")
+        await writer.drain()
+
+
+class _Worker:
+    __slots__ = ("worker_id", "reader", "writer", "lock", "busy_cycle", "scanned")
+
+    def __init__(self, worker_id, reader, writer):
+        self.worker_id = worker_id
+        self.reader = reader
+        self.writer = writer
+        self.lock = asyncio.Lock()
+        self.busy_cycle: Optional[int] = None  # 正在扫描的轮次, 完成前不再派发新分片
+        self.scanned: set = set()  # busy_cycle 内已扫完 (含已上报告警) 的 (symbol, interval)
+
+
+# ================== 协调者 (bot 进程) ==================
+
+class Coordinator:
+    def __init__(self, socket_path: str = MONITOR_SOCKET, local_workers: int = MONITOR_SHARDS):
+        self.socket_path = socket_path
+        self.local_workers = local_workers
+        self.ring = HashRing(vnodes=SHARD_VNODES)
+        self._workers: Dict[str, _Worker] = {}
+        self._procs: Dict[str, asyncio.subprocess.Process] = {}
+        self._waiting: Dict[tuple, asyncio.Future] = {}
+        self._server = None
+        self._cycle = 0
+        self._on_alert: Optional[Callable] = None
+
+    def active(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self, on_alert: Callable):
+        """Listen on the socket and spawn the local workers. on_alert(sym, interval, caption, report, png)."""
+        self._on_alert = on_alert
+        os.makedirs(os.path.dirname(os.path.abspath(self.socket_path)), exist_ok=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # 上次异常退出留下的 socket 文件
+        self._server = await asyncio.start_unix_server(self._on_connect, path=self.socket_path, limit=_STREAM_LIMIT)
+        for i in range(self.local_workers):
+            await self._spawn(f"local-{i}")
+        logging.info(f"Monitor coordinator listening on {self.socket_path} with {self.local_workers} local workers")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for worker in list(self._workers.values()):
+            worker.writer.close()
+        for proc in self._procs.values():
+            if proc.returncode is None:
+                proc.terminate()
+        for proc in self._procs.values():
+            try:
+                await asyncio.wait_for(proc.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                proc.kill()
+        self._procs.clear()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def _spawn(self, worker_id: str):
+        env = dict(os.environ)
+        # worker 本身就是并行单元, 不再各自起计算进程池
+        env["COMPUTE_BACKEND"] = "thread"
+        self._procs[worker_id] = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "tasks.shards", "--socket", self.socket_path, "--id", worker_id,
+            cwd=ROOT, env=env,
+        )
+
+    async def _respawn_dead(self):
+        for worker_id, proc in list(self._procs.items()):
+            if proc.returncode is not None:
+                logging.warning(f"Monitor worker {worker_id} exited with {proc.returncode}; restarting")
+                await self._spawn(worker_id)
+
+    async def _on_connect(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        worker = None
+        try:
+            hello = json.loads(await reader.readline() or b"{}")
+            if hello.get("type") != "hello" or not hello.get("worker"):
+                writer.close()
+                return
+            worker = _Worker(hello["worker"], reader, writer)
+            old = self._workers.get(worker.worker_id)
+            if old is not None:
+                old.writer.close()
+            self._workers[worker.worker_id] = worker
+            self.ring.add(worker.worker_id)
+            MONITOR_WORKERS.set(len(self._workers))
+            logging.info(f"Monitor worker {worker.worker_id} joined ({len(self._workers)} active)")
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._handle(worker, json.loads(line))
+        except (ConnectionError, json.JSONDecodeError, asyncio.IncompleteReadError, ValueError) as e:
+            logging.warning(f"Monitor worker connection error: {e}")
+        finally:
+            if worker is not None and self._workers.get(worker.worker_id) is worker:
+                del self._workers[worker.worker_id]
+                self.ring.remove(worker.worker_id)
+                MONITOR_WORKERS.set(len(self._workers))
+                logging.warning(f"Monitor worker {worker.worker_id} left ({len(self._workers)} active)")
+                for (wid, _), fut in self._waiting.items():
+                    if wid == worker.worker_id and not fut.done():
+                        fut.set_result(False)
+            writer.close()
+
+    def _handle(self, worker: _Worker, msg: dict):
+        kind = msg.get("type")
+        if kind in ("alert", "progress") and msg.get("cycle") == worker.busy_cycle:
+            worker.scanned.add((msg.get("symbol"), msg.get("interval")))
+        if kind == "alert":
+            chart = base64.b64decode(msg["chart"]) if msg.get("chart") else None
+            try:
+                self._on_alert(msg["symbol"], msg["interval"], msg.get("caption"), msg.get("full_report"), chart)
+            except Exception as e:
+                logging.exception(f"Failed to deliver sharded alert {msg.get('symbol')}: {e}")
+        elif kind == "done":
+            if msg.get("cycle") == worker.busy_cycle:
+                worker.busy_cycle = None
+                worker.scanned = set()
+            fut = self._waiting.get((worker.worker_id, msg.get("cycle")))
+            if fut is not None and not fut.done():
+                fut.set_result(True)
+
+    async def run_cycle(self, pairs, timeout: float = MONITOR_INTERVAL) -> list:
+        """
+        Send every idle worker its shard and wait for them to finish (up to `timeout`).
+        Returns the pairs that a worker disconnected before scanning so the caller can scan them itself;
+        pairs the worker already reported (alerted or progressed) are left out so nobody is alerted twice.
+        A worker still busy with an earlier cycle gets nothing this cycle rather than a queue of stale scans.
+        """
+        await self._respawn_dead()
+        self._cycle += 1
+        cycle = self._cycle
+        loop = asyncio.get_running_loop()
+        orphans, pending = [], {}
+
+        for worker_id, shard in self.ring.assign(pairs).items():
+            worker = self._workers.get(worker_id)
+            if not shard or worker is None:
+                continue
+            if worker.busy_cycle is not None:
+                # 上一轮还没扫完; 它仍在扫同一批交易对, 本轮跳过而不是排队
+                logging.warning(f"Monitor worker {worker_id} still busy with cycle {worker.busy_cycle}; "
+                                f"skipping its {len(shard)} pairs in cycle {cycle}")
+                continue
+            worker.busy_cycle = cycle
+            worker.scanned = set()
+            fut = loop.create_future()
+            self._waiting[(worker_id, cycle)] = fut
+            try:
+                await _send(worker.writer, worker.lock, {"type": "scan", "cycle": cycle, "pairs": shard})
+                pending[worker_id] = (fut, shard, worker)
+            except (ConnectionError, RuntimeError) as e:
+                logging.warning(f"Could not send shard to {worker_id}: {e}")
+                worker.busy_cycle = None
+                orphans.extend(shard)
+
+        try:
+            if pending:
+                _, not_done = await asyncio.wait([f for f, _, _ in pending.values()], timeout=timeout)
+                if not_done:
+                    # 超时的 worker 仍在扫描, 告警稍后照常送达, 这里不重复补扫; 它忙完之前不会再收到新分片
+                    logging.warning(f"{len(not_done)} monitor workers did not finish cycle {cycle} in {timeout}s")
+            for worker_id, (fut, shard, worker) in pending.items():
+                if fut.done() and fut.result() is False:
+                    # 掉线前已扫完的交易对 (告警已转发) 不再补扫
+                    orphans.extend(p for p in shard if tuple(p) not in worker.scanned)
+        finally:
+            for worker_id in pending:
+                self._waiting.pop((worker_id, cycle), None)
+        return orphans
+
+
+coordinator = Coordinator()
+
+
+# ================== 扫描 worker (独立进程) ==================
+
+async def _scan_shard(cycle, pairs, send):
+    from services.bars import bar_cache
+    from tasks.monitor import reversal_monitor
+
+    bar_cache.use_pairs(pairs)
+    sem = asyncio.Semaphore(SHARD_CONCURRENCY)
+
+    async def one(sym, interval):
+        async with sem:
+            try:
+                caption, full_report, chart_buf = await reversal_monitor(sym, interval)
+            except Exception as e:
+                logging.exception(f"[{sym} {interval}] Monitor loop error: {e}")
+                caption = full_report = None
+            if caption or full_report:
+                chart = base64.b64encode(chart_buf.getvalue()).decode("ascii") if chart_buf is not None else None
+                await send({"type": "alert", "cycle": cycle, "symbol": sym, "interval": interval,
+                            "caption": caption, "full_report": full_report, "chart": chart})
+            else:
+                # 逐对上报进度, 掉线时协调者只补扫没扫过的交易对
+                await send({"type": "progress", "cycle": cycle, "symbol": sym, "interval": interval})
+
+    await asyncio.gather(*(one(sym, interval) for sym, interval in pairs))
+
+
+async def run_worker(socket_path: str, worker_id: str):
+    """Connect to the coordinator (retrying until it is up) and scan whatever shard it sends each cycle."""
+    while True:
+        try:
+            reader, writer = await asyncio.open_unix_connection(socket_path, limit=_STREAM_LIMIT)
+        except (FileNotFoundError, ConnectionError):
+            await asyncio.sleep(2)
+            continue
+
+        lock = asyncio.Lock()
+        send = lambda message: _send(writer, lock, message)  # noqa: E731
+        try:
+            await send({"type": "hello", "worker": worker_id, "pid": os.getpid()})
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                if msg.get("type") == "scan":
+                    await _scan_shard(msg["cycle"], [tuple(p) for p in msg["pairs"]], send)
+                    await send({"type": "done", "cycle": msg["cycle"], "scanned": len(msg["pairs"])})
+        except ConnectionError as e:
+            logging.warning(f"Lost coordinator connection: {e}")
+        finally:
+            writer.close()
+        logging.info("Coordinator went away; reconnecting")
+        await asyncio.sleep(2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sharded monitor scan worker")
+    parser.add_argument("--socket", default=MONITOR_SOCKET)
+    parser.add_argument("--id", default=f"{os.uname().nodename}-{os.getpid()}")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format=f'%(asctime)s - worker[{args.id}] - %(levelname)s - %(message)s', level=logging.INFO)
+    try:
+        asyncio.run(run_worker(args.socket, args.id))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
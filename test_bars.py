@@ -0,0 +1,55 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.bars import BarCache, resample_ohlcv
+
+
+def _klines(n, freq, start="2024-01-01"):
+    idx = pd.date_range(start, periods=n, freq=freq, name="open_time")
+    close = 100 + np.arange(n, dtype=float)
+    return pd.DataFrame({
+        "open": close - 0.5, "high": close + 1, "low": close - 1, "close": close, "volume": np.ones(n),
+    }, index=idx)
+
+
+class _Fetcher:
+    def __init__(self):
+        self.calls = []
+
+    async def get_klines(self, symbol, interval, limit):
+        self.calls.append((symbol, interval, limit))
+        freq = {"15m": "15min", "1h": "h", "1w": "7D"}[interval]
+        return _klines(limit, freq)
+
+
+def test_resample_covered_interval():
+    out = resample_ohlcv(_klines(8, "15min"), "1h")
+    assert len(out) == 2
+    first = out.iloc[0]
+    assert (first["open"], first["high"], first["low"], first["close"], first["volume"]) == (99.5, 104, 99, 103, 4)
+
+
+def test_resample_uncovered_interval():
+    with pytest.raises(ValueError):
+        resample_ohlcv(_klines(8, "D"), "1w")
+
+
+def test_bar_cache_derives_covered_interval():
+    cache = BarCache()
+    cache.use_pairs([("BTCUSDT", "15m"), ("BTCUSDT", "1h")])
+    fetcher = _Fetcher()
+    df = asyncio.run(cache.get(fetcher, "BTCUSDT", "1h", 10))
+    assert len(df) == 10
+    assert [c[1] for c in fetcher.calls] == ["15m"]
+
+
+def test_bar_cache_passes_uncovered_interval_through():
+    cache = BarCache()
+    cache.use_pairs([("BTCUSDT", "1h")])
+    fetcher = _Fetcher()
+    df = asyncio.run(cache.get(fetcher, "BTCUSDT", "1w", 10))
+    assert len(df) == 10
+    assert fetcher.calls == [("BTCUSDT", "1w", 10)]
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from services.bar_buffer import BarBuffer
+from services.indicators import ewm_array, rolling_mean_array, shift_array, rsi_ewm_array
+
+
+def _series(n=300, seed=7):
+    rng = np.random.default_rng(seed)
+    return pd.Series(100 + np.cumsum(rng.standard_normal(n)))
+
+
+def _frame(n=50):
+    close = _series(n).to_numpy()
+    index = pd.date_range("2024-01-01", periods=n, freq="h", name="open_time")
+    return pd.DataFrame({
+        "open": close - 0.5, "high": close + 1, "low": close - 1, "close": close,
+        "volume": np.arange(n, dtype=float), "oi": np.linspace(1, 2, n),
+        "number_of_trades": np.arange(n),  # 非热路径列, 不进 BarBuffer
+    }, index=index)
+
+
+def test_ewm_array_matches_pandas():
+    s = _series()
+    np.testing.assert_allclose(ewm_array(s.to_numpy(), span=12), s.ewm(span=12, adjust=False).mean())
+    np.testing.assert_allclose(ewm_array(s.to_numpy(), alpha=1 / 14), s.ewm(alpha=1 / 14, adjust=False).mean())
+
+
+def test_rolling_mean_array_matches_pandas():
+    s = _series()
+    for window in (1, 5, 10):
+        np.testing.assert_allclose(rolling_mean_array(s.to_numpy(), window), s.rolling(window).mean())
+    np.testing.assert_array_equal(rolling_mean_array(s.to_numpy()[:3], 5), np.full(3, np.nan))
+
+
+def test_shift_array_matches_pandas():
+    s = _series(20)
+    for n in (0, 1, 5, 25):
+        np.testing.assert_array_equal(shift_array(s.to_numpy(), n), s.shift(n).to_numpy())
+
+
+def test_rsi_ewm_array_matches_pandas():
+    close = _series()
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).ewm(alpha=1 / 14, adjust=False).mean()
+    loss = (-delta.where(delta < 0, 0)).ewm(alpha=1 / 14, adjust=False).mean()
+    expected = 100 - (100 / (1 + gain / loss))
+    np.testing.assert_allclose(rsi_ewm_array(close.to_numpy(), 14), expected)
+
+
+def test_bar_buffer_slicing():
+    df = _frame()
+    bars = BarBuffer.from_frame(df, float32=False)
+    assert bars.columns == ("open", "high", "low", "close", "volume", "oi")
+    assert len(bars) == len(df)
+
+    tail = bars[-10:]
+    assert len(tail) == 10 and len(bars.tail(0)) == 0
+    assert np.shares_memory(tail.values, bars.values)
+    np.testing.assert_array_equal(tail["close"], df["close"].to_numpy()[-10:])
+    np.testing.assert_array_equal(tail.close, tail.column("close"))
+    assert tail[-1] == {c: float(df[c].iloc[-1]) for c in bars.columns}
+    assert tail.timestamp(0) == df.index[-10]
+    assert "oi" in bars and "number_of_trades" not in bars
+
+
+def test_bar_buffer_to_frame_round_trip():
+    df = _frame()
+    bars = BarBuffer.from_frame(df, float32=False)
+    out = bars.to_frame({"ema": np.ones(len(df))})
+    pd.testing.assert_frame_equal(out[list(bars.columns)], df[list(bars.columns)], check_freq=False)
+    assert out.index.name == "open_time"
+    np.testing.assert_array_equal(out["ema"], np.ones(len(df)))
+
+    again = BarBuffer.from_frame(out, float32=False)
+    np.testing.assert_array_equal(again.values, bars.values)
+    np.testing.assert_array_equal(again.times, bars.times)
@@ -0,0 +1,75 @@
+import asyncio
+
+from services.profiler import Profiler
+
+
+async def _work():
+    await asyncio.sleep(0.01)
+    return sum(range(1000))
+
+
+def test_disarm_mid_capture():
+    for mode in ("cprofile", "sample"):
+        profiler = Profiler()
+        profiler.arm("ai", 2, chat_id=None, mode=mode)
+
+        async def run():
+            async with profiler.capture("ai"):
+                await _work()
+                profiler.disarm()  # /profile off while the analysis is running
+                await _work()
+            # 被打断的采集不影响后续调用
+            async with profiler.capture("ai"):
+                await _work()
+
+        asyncio.run(run())
+        assert profiler.status() == "Profiler disarmed"
+        assert not profiler._active
+
+
+def test_rearm_mid_capture():
+    profiler = Profiler()
+    profiler.arm("ai", 1, chat_id=None)
+
+    async def run():
+        async with profiler.capture("ai"):
+            profiler.arm("ai", 1, chat_id=None, mode="sample")
+            await _work()
+        # 新会话不受旧采集影响, 完整采集一次后上报并解除
+        assert profiler.status() == "Profiler armed: ai (sample), 0/1 captured"
+        async with profiler.capture("ai"):
+            await _work()
+
+    asyncio.run(run())
+    assert profiler.status() == "Profiler disarmed"
+
+
+def _hot_path():
+    return sum(i * i for i in range(20000))
+
+
+def test_capture_sees_compute_jobs():
+    import pstats
+
+    from services import compute
+    from services.profiler import profiler
+
+    profiler.arm("ai", 2, chat_id=None)
+    session = profiler._profile
+
+    async def run():
+        async with profiler.capture("ai"):
+            await compute.run_job("test", _hot_path)
+
+    asyncio.run(run())
+    names = {func[2] for func in pstats.Stats(session).stats}
+    profiler.disarm()
+    compute.shutdown_compute_pool()
+    assert "_hot_path" in names
+
+
+if __name__ == "__main__":
+    test_disarm_mid_capture()
+    test_rearm_mid_capture()
+    test_capture_sees_compute_jobs()
+    print("ok")
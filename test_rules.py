@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from services.model import ReversalModel
+from services.rules import load_rules
+
+
+def _seeded_frame(n=300, seed=11):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n)
+    close = 100 + 8 * np.sin(t / 20) + np.cumsum(rng.normal(0, 0.6, n))
+    open_ = close + rng.normal(0, 0.4, n)
+    return pd.DataFrame({
+        "open": open_,
+        "high": np.maximum(open_, close) + rng.exponential(0.5, n),
+        "low": np.minimum(open_, close) - rng.exponential(0.5, n),
+        "close": close,
+        "volume": rng.lognormal(5, 0.6, n),
+        "oi": 1e4 + np.cumsum(rng.normal(0, 80, n)),
+        "long_ratio": rng.uniform(0.2, 0.8, n),
+        "funding": rng.normal(0, 0.0006, n),
+    }, index=pd.date_range("2024-01-01", periods=n, freq="h"))
+
+
+# rules/reversal.json 在上面数据上的得分; 改动默认规则集导致告警变化时这里会失败
+EXPECTED = {
+    40: ("short_reversal", 5), 60: ("long_reversal", 25), 80: ("long_reversal", 40),
+    100: ("long_reversal", 15), 120: ("short_reversal", 40), 140: ("short_reversal", 30),
+    160: ("short_reversal", 30), 180: ("short_reversal", 10), 200: ("long_reversal", 45),
+    220: ("long_reversal", 15), 240: ("long_reversal", 25), 260: ("short_reversal", 35),
+    280: ("short_reversal", 25),
+}
+
+
+def test_score_matches_score_at_and_evaluate():
+    model = ReversalModel(_seeded_frame())
+    rules = load_rules()
+    scores = rules.score(model.features)
+    for i in range(len(model.bars)):
+        at = scores.at(i)
+        assert at == rules.score_at(model.features, i)
+        result = model.evaluate(i)
+        assert (result["signal_type"], result["total_score"], result["details"], result["trend"]) == \
+            (at["signal_type"], at["total_score"], at["details"], at["trend"])
+
+
+def test_default_rules_fixed_scores():
+    scores = ReversalModel(_seeded_frame()).score_history()
+    for i, (signal, total) in EXPECTED.items():
+        at = scores.at(i)
+        assert (at["signal_type"], at["total_score"]) == (signal, total), i
+        assert sum(at["details"].values()) == total
@@ -1,5 +1,5 @@
 from functools import wraps
-from config.settings import ALLOWED_USER_IDS
+from config.settings import ALLOWED_USER_IDS, ADMIN_USER_IDS
 
 def restricted(func):
     @wraps(func)
@@ -7,3 +7,10 @@ def restricted(func):
         if update.effective_user.id not in ALLOWED_USER_IDS: return
         return await func(update, context, *args, **kwargs)
     return wrapped
+
+def admin_only(func):
+    @wraps(func)
+    async def wrapped(update, context, *args, **kwargs):
+        if update.effective_user.id not in ADMIN_USER_IDS: return
+        return await func(update, context, *args, **kwargs)
+    return wrapped